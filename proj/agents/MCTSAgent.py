@@ -1,14 +1,22 @@
 from abc import abstractmethod
+from concurrent.futures import ProcessPoolExecutor
 import math
 from optparse import OptionParser
 import time
 from typing import Callable
 import random
+from proj.agents.helper_files.arrayTree import ArrayTree
 from proj.agents.helper_files.gameTreeNode import GameTreeNode
+from proj.agents.helper_files.searchBudget import SearchBudget
+from proj.agents.helper_files.transpositionTable import ReplacementPolicy, TranspositionTable
 from dataclasses import dataclass
 
 from proj.agents.template import AgentTemplate
-from proj.gameEngine.state import Action, GameStateTemplate, ThudGameState
+from proj.gameEngine.batchPlayout import BatchPlayout
+from proj.gameEngine.enums import HistoryPolicy, Piece
+from proj.gameEngine.notation import from_bytes, to_bytes
+from proj.gameEngine.rollout import RolloutEngine
+from proj.gameEngine.state import Action, GameStateTemplate, ThudGameState, as_action, move_key
 import traceback
 
 class MCTS:
@@ -20,23 +28,59 @@ class MCTS:
     2) EXPAND: add a new child of that leaf node to the tree
     3) SIMULATE: using the rollout policy defined, simulate a game and record the results
     4) BACK-PROPOGATE: back propogate the results up the tree
+
+    With RAVE (rave > 0) each node also keeps all moves as first stats (see AmafStats): a result
+    counts for every move the side to move at a node plays after it in the iteration, in the tree or
+    in the simulation, as if it had been played first. Selection blends them into the value of a child
+    (see GameTreeNode.ucb_child), so a move gets a useful value from few iterations.
+    A node isn't expanded fully before its children are selected: the untried action with the best AMAF
+    value (see GameTreeNode.best_untried_action) is only expanded if it scores at least as well as the
+    best child, otherwise the search goes down to that child.
+    The moves of a simulation are read from the recent_history of the end state: simulations are run
+    on a copy keeping a HistoryPolicy.RING history long enough for the rest of the game, which
+    simulation policies playing on the state (and RolloutEngine) fill in.
+    Batches and leaf_rollouts > 1 only count the moves in the tree.
     """
 
-    def __init__(self, save_file_path, max_time, simulation_policy: Callable[[GameStateTemplate], GameStateTemplate], UCB_CONSTANT, max_depth=math.inf) -> None:
+    def __init__(self, save_file_path, max_time, simulation_policy: Callable[[GameStateTemplate], GameStateTemplate], UCB_CONSTANT, max_depth=math.inf,
+                 transposition_table: TranspositionTable = None,
+                 batch_simulation_policy: Callable[[list, list], list] = None, batch_size=1,
+                 leaf_rollouts=1, budget: SearchBudget = None, rave=0) -> None:
         """
-        @param max_time: maximum time allowed per simulation
+        @param max_time: maximum time allowed per search, used if no budget is given
         @param max_depth: maximum depth to be sampled
         @param rollout_policy: rollout function taking a state 
         as an argument and returning the next state
         @param UCB_CONSTANT: constant in the UCB calculation
+        @param transposition_table: if given, the stats of every node are stored by position,
+        and a new node whose position has been searched before (through another move order
+        or in an earlier search) starts with those stats instead of from nothing
+        @param batch_simulation_policy: function taking a list of states and a list of pieces and
+        returning the result of a simulation from each state for the matching piece
+        @param batch_size: if > 1 (and there's a batch_simulation_policy), this many leaves are selected
+        and expanded before they are all simulated in one call to batch_simulation_policy
+        @param leaf_rollouts: number of simulations from each leaf (leaf parallel), run together by
+        batch_simulation_policy. The leaf is backed up once, with the average result
+        @param budget: the SearchBudget of each search. An iteration is a leaf simulated, and
+        a node is a node added to the tree
+        @param rave: RAVE equivalence constant, the number of visits at which a child's own value and its
+        all moves as first value count the same. 0 = no RAVE
         """
         self.save_file_path = save_file_path
         self.max_time = max_time
         self.max_depth = max_depth
         self.simulation_policy = simulation_policy
         self.UCB_CONSTANT = UCB_CONSTANT
+        self.transposition_table = transposition_table
+        self.batch_simulation_policy = batch_simulation_policy
+        self.batch_size = batch_size
+        self.leaf_rollouts = leaf_rollouts
+        self.budget = budget if budget is not None else SearchBudget(wall_time=max_time)
+        self.rave = rave
         self.depth_offset = 0
-        print(self.max_time)
+        # nodes added to the tree by select_unvisited, the node count of the budget
+        self.nodes_added = 0
+        print(self.budget)
 
     def search(self, root) -> 'GameTreeNode':
         """
@@ -48,48 +92,128 @@ class MCTS:
         @return: the best child node
         """
         self.stats = SearchStats()
+        # a root kept from an earlier search is deeper than 0, max_depth counts from the root
+        self.depth_offset = root.depth
+        # the tree is walked on a single state, moving it down with make and back with unmake
+        state = root.state.deepcopy()
+        budget = self.budget
+        budget.start()
         start_search = time.time()
-        while time.time() - start_search < self.max_time:
-            node = self.traverse(root)
+        while not budget.exhausted():
+            nodes_added = self.nodes_added
+            if self.batch_simulation_policy is not None and self.batch_size > 1:
+                self.batch_iteration(root, state)
+                budget.spend(iterations=self.batch_size, nodes=self.nodes_added - nodes_added)
+                continue
+            node = self.traverse(root, state)
             start_simulation = time.time()
-            results = self.simulate(node)
+            results, rollout_moves = self.simulate(node, state)
             self.stats.update(simulation_time=time.time()
                               - start_simulation, depth=node.depth)
-            self.back_propogate_results(results, node)
+            self.back_propogate_results(results, node, rollout_moves)
+            for _ in range(node.depth - root.depth):
+                state.unmake()
+            # a terminal leaf or one at max_depth is simulated without adding a node
+            budget.spend(iterations=1, nodes=self.nodes_added - nodes_added)
 
         self.stats.update(search_time=time.time()
                           - start_search)
         self.save_stats_to_file()
         return self.select_best_child(root)
 
+    def batch_iteration(self, root, state):
+        """
+        Select and expand batch_size leaves, simulate from all of them in one call
+        and then back propagate each result
+        """
+        leaves = []
+        leaf_states = []
+        rollouts = self.leaf_rollouts
+        for _ in range(self.batch_size):
+            node = self.traverse(root, state)
+            leaves.append(node)
+            leaf_states.extend(state.deepcopy() for _ in range(rollouts))
+            for _ in range(node.depth - root.depth):
+                state.unmake()
+        start_simulation = time.time()
+        results = self.batch_simulation_policy(leaf_states, [node.turn for node in leaves for _ in range(rollouts)])
+        simulation_time = (time.time() - start_simulation) / len(leaves)
+        for i, node in enumerate(leaves):
+            self.stats.update(simulation_time=simulation_time, depth=node.depth)
+            self.back_propogate_results(sum(results[i * rollouts:(i + 1) * rollouts]) / rollouts, node)
+
     @property
     def nodes_searched(self):
         return self.stats.iterations
 
-    def traverse(self, node):
-        while node.is_fully_expanded and node.depth < self.max_depth + self.depth_offset and not node.is_terminal():
-            node = self.best_child(node)
-
-        return self.select_unvisited(node) if len(node.unvisited_actions) > 0 else node
+    def traverse(self, node, state):
+        """
+        Select a node to simulate from, making the actions on the way on the search state
+        """
+        while not node.is_terminal() and node.depth < self.max_depth + self.depth_offset:
+            # a node's actions are only generated the first time the search reaches it
+            if node.has_untried_actions(state):
+                if not self.rave or node.amaf is None:
+                    return self.select_unvisited(node, state)
+                # with RAVE, a new child is only added if its move looks better than the children so far
+                index, score = node.best_untried_action(self.UCB_CONSTANT)
+                if len(node.children) == 0 or score >= node.ucb_scores(self.UCB_CONSTANT, self.rave).max():
+                    return self.select_unvisited(node, state, index)
+            child = self.best_child(node)
+            if child is node:
+                break
+            state.make(child.action)
+            node = child
+        return node
 
     def best_child(self, node):
-        try:
-            return max(node.children, key=lambda child: self.ucb(child))
-        except:
-            return node
+        child = node.ucb_child(self.UCB_CONSTANT, self.rave)
+        return node if child is None else child
 
     def ucb(self, node: 'GameTreeNode'):
+        if node.n == 0:
+            # only while a batch is waiting to be simulated: visit the new node first
+            return math.inf
         return node.q + self.UCB_CONSTANT * math.sqrt(math.log(node.parent.n) / node.n)
 
-    def simulate(self, node):
-        state = self.simulation_policy(node.state.deepcopy())
-        return state.results(node.state.turn)
+    def simulate(self, node, state):
+        """
+        @return: (result of simulations from the state for the side to move at the node,
+            the actions played in the simulation, only recorded for RAVE)
+        """
+        if self.leaf_rollouts > 1 and self.batch_simulation_policy is not None:
+            results = self.batch_simulation_policy([state.deepcopy() for _ in range(self.leaf_rollouts)],
+                                                   [node.turn] * self.leaf_rollouts)
+            return sum(results) / self.leaf_rollouts, []
+        if not self.rave:
+            return self.simulation_policy(state.deepcopy()).results(node.turn), []
+        turns_left = state.turns_per_game - state.turn_number + 1
+        rollout_state = state.deepcopy(history_policy=HistoryPolicy.RING, history_length=max(turns_left, 1))
+        rollout_state.recent_history.clear()
+        rollout_state = self.simulation_policy(rollout_state)
+        history = rollout_state.recent_history
+        return rollout_state.results(node.turn), [action for _, action in history] if history is not None else []
 
-    def select_unvisited(self, node: 'GameTreeNode'):
-        child = node.expand_new_node()
+    def select_unvisited(self, node: 'GameTreeNode', state, index=None):
+        """
+        @param index: index of the action to expand in node.unvisited_actions, by default the next one
+        """
+        child = node.expand_new_node(state, index)
+        self.nodes_added += 1
+        if self.transposition_table is not None:
+            entry = self.transposition_table.probe(child.key)
+            if entry is not None:
+                child.set_stats(entry.value.n, entry.value.total_results)
+            # the stats object is updated by back propagation, so the table stays current
+            self.transposition_table.store(child.key, child.depth, child.stats)
         return child
 
-    def back_propogate_results(self, result, node):
+    def back_propogate_results(self, result, node, rollout_moves=()):
+        """
+        @param rollout_moves: the actions played in the simulation from the node, for RAVE
+        """
+        if self.rave:
+            self.back_propogate_amaf(result, node, rollout_moves)
         while True:
             node.update_stats(result)
             # break at the root
@@ -98,6 +222,23 @@ class MCTS:
             # print(node)
             node = node.parent
 
+    def back_propogate_amaf(self, result, node, rollout_moves):
+        """
+        Add the result to the all moves as first stats of the node and its ancestors
+        """
+        # keys of the moves played after the node reached, by the side which played them
+        played = {Piece.DWARF: set(), Piece.TROLL: set()}
+        turn = node.turn
+        for action in rollout_moves:
+            played[turn].add(move_key(action))
+            turn = Piece.TROLL if turn == Piece.DWARF else Piece.DWARF
+        while True:
+            node.update_amaf(played[node.turn], result)
+            if node.parent is None:
+                break
+            played[node.parent.turn].add(move_key(node.action))
+            node = node.parent
+
     def select_best_child(self, root):
         if root.is_root():
             return max(root.children, key=lambda child: child.n)
@@ -109,6 +250,78 @@ class MCTS:
         except FileNotFoundError as e:
             print (traceback.print_exc())
 
+class ArrayMCTS(MCTS):
+    """
+    MCTS on an ArrayTree: the same select, expand, simulate and back propagate steps as MCTS,
+    with the tree held in numpy columns instead of GameTreeNode objects.
+    The tree is walked on a single state with make and unmake, so no node keeps a state.
+    Transposition tables, batches of leaves and RAVE aren't supported, leaf_rollouts is.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        unsupported = [name for name, used in (('transposition_table', self.transposition_table is not None),
+                                               ('batch_size', self.batch_size > 1), ('rave', self.rave))
+                       if used]
+        if unsupported:
+            raise ValueError(f"ArrayMCTS doesn't support {', '.join(unsupported)}")
+
+    def search(self, state) -> int:
+        """
+        Build a new tree from the state
+        @return: the packed action of the most visited child of the root
+        """
+        self.stats = SearchStats()
+        tree = self.tree = ArrayTree()
+        state = state.deepcopy()
+        budget = self.budget
+        budget.start()
+        start_search = time.time()
+        while not budget.exhausted():
+            size = len(tree)
+            node = self.traverse(tree, state)
+            start_simulation = time.time()
+            result = self.simulate_state(state)
+            self.stats.update(simulation_time=time.time() - start_simulation, depth=int(tree.depth[node]))
+            tree.backup(node, result)
+            for _ in range(tree.depth[node]):
+                state.unmake()
+            # the nodes are the children allocated by an expansion
+            budget.spend(iterations=1, nodes=len(tree) - size)
+        self.stats.update(search_time=time.time() - start_search)
+        self.save_stats_to_file()
+        return int(tree.action[tree.best_child(0)])
+
+    def traverse(self, tree: ArrayTree, state) -> int:
+        """
+        Walk down from the root to a node to simulate from: the first unvisited node found,
+        or a terminal node or a node at max_depth. The actions are made on the state.
+        @return: the node
+        """
+        node = 0
+        while not state.game_over() and tree.depth[node] < self.max_depth:
+            if not tree.is_expanded(node):
+                actions = state.valid_packed_actions()
+                # so that unvisited children are tried in a different order each search
+                random.shuffle(actions)
+                tree.add_children(node, actions)
+            if tree.num_children[node] == 0:
+                break
+            node = tree.select_child(node, self.UCB_CONSTANT)
+            state.make(int(tree.action[node]))
+            if tree.n[node] == 0:
+                break
+        return node
+
+    def simulate_state(self, state) -> float:
+        """ @return: the result of simulations from the state, for the side to move """
+        if self.leaf_rollouts > 1 and self.batch_simulation_policy is not None:
+            results = self.batch_simulation_policy([state.deepcopy() for _ in range(self.leaf_rollouts)],
+                                                   [state.turn] * self.leaf_rollouts)
+            return sum(results) / self.leaf_rollouts
+        return self.simulation_policy(state.deepcopy()).results(state.turn)
+
+
 @dataclass(init=False)
 class SearchStats:
     iterations: int = 0
@@ -132,11 +345,62 @@ class SearchStats:
 
 
 class MCTSAgentTemplate(AgentTemplate):
-    def __init__(self, name, agentClassName, save_file_path='results.txt', max_time=10, max_depth=math.inf) -> None:
+    # the search class, constructed with the agent's parameters
+    search_type = MCTS
+
+    def __init__(self, name, agentClassName, save_file_path='results.txt', max_time=None, max_depth=math.inf,
+                 transposition_table_size=0, batch_size=1, max_captures_only=False, reuse_tree=True,
+                 workers=1, leaf_rollouts=1, fast_rollouts=False, iterations=0, nodes=0, cpu_time=0,
+                 check_every=1, seed=None, rave=0, incremental=False) -> None:
+        """
+        @param max_time, iterations, nodes, cpu_time: the SearchBudget of a move: seconds, MCTS iterations,
+            tree nodes added or seconds of CPU time, whichever runs out first. 0 = no limit.
+            max_time is 10 seconds unless it or another limit is given
+        @param check_every: number of iterations between clock checks
+        @param seed: seed of the search and simulations, for repeatable searches with an iteration budget
+        @param transposition_table_size: number of positions kept in a transposition table
+            shared by every search of this agent. 0 = no table
+        @param batch_size: number of leaves simulated together by batch_simulation_policy. 1 = no batches
+        @param max_captures_only: search (and simulate) with only the largest troll captures,
+            see ThudGameState.max_captures_only
+        @param reuse_tree: keep the subtree of the position reached after the agent's move and the
+            opponent's reply, so the next search carries on from it instead of starting again
+        @param workers: number of searches run at once (root parallel). The agent searches its own tree
+            while workers - 1 processes each search a new tree from the same position with a different
+            seed, then the visits and results of the root's children are added up to choose the action
+        @param leaf_rollouts: number of simulations run together from each leaf, see MCTS
+        @param fast_rollouts: simulate with a RolloutEngine (see rollout_policy) instead of simulation_policy
+        @param rave: RAVE equivalence constant of the search, see MCTS. 0 = no RAVE
+        @param incremental: generate the actions of a node one at a time as it's expanded, biggest captures
+            first, instead of all at once in a random order (see GameTreeNode)
+        """
         super().__init__(name, agentClassName)
-        self.MCTS = MCTS(save_file_path=save_file_path, max_time=max_time, max_depth=max_depth,
-                         simulation_policy=self.simulation_policy, UCB_CONSTANT=2)
+        self.max_captures_only = bool(max_captures_only)
+        self.reuse_tree = bool(reuse_tree)
+        self.workers = int(workers)
+        self.incremental = bool(incremental)
+        self.pool = None
+        self.rollout_engine = None
+        self.rollout_key = None
+        self.rollout_seed = None
+        transposition_table = None
+        if transposition_table_size > 0:
+            transposition_table = TranspositionTable(
+                transposition_table_size, policy=ReplacementPolicy.ALWAYS_REPLACE)
+        budget = SearchBudget.from_params(max_time=max_time, iterations=iterations, nodes=nodes,
+                                          cpu_time=cpu_time, check_every=check_every)
+        # the policy each leaf is simulated with, also by the default batch_simulation_policy
+        self.simulate = self.rollout_policy if fast_rollouts else self.simulation_policy
+        self.MCTS = self.search_type(save_file_path=save_file_path, max_time=budget.wall_time, max_depth=max_depth,
+                         simulation_policy=self.simulate,
+                         UCB_CONSTANT=2,
+                         transposition_table=transposition_table,
+                         batch_simulation_policy=self.batch_simulation_policy, batch_size=int(batch_size),
+                         leaf_rollouts=int(leaf_rollouts), budget=budget, rave=float(rave))
         self.root = None
+        self.game_number = None
+        if seed is not None:
+            self.seed(int(seed))
 
     @abstractmethod
     def simulation_policy(self, state: GameStateTemplate) -> GameStateTemplate:
@@ -146,40 +410,237 @@ class MCTSAgentTemplate(AgentTemplate):
         """
         pass
 
+    def rollout_policy(self, state: GameStateTemplate) -> GameStateTemplate:
+        """
+        Simulation policy playing the game out with a RolloutEngine, which samples one action a ply
+        on a raw board instead of listing them
+        @param state: A clean state (ie not one in the game tree) to run simulation on.
+        @return: the end state after running a simulation of a game.
+        """
+        # the engine is built for a board layout and a set of rules
+        key = (board_layout(state.grid), state.max_captures_only)
+        if self.rollout_engine is None or self.rollout_key != key:
+            self.rollout_engine = RolloutEngine(board=state.grid.board, seed=self.rollout_seed,
+                                                max_captures_only=state.max_captures_only)
+            self.rollout_key = key
+        return self.rollout_engine(state)
+
+    def batch_simulation_policy(self, states: 'list[GameStateTemplate]', pieces: list) -> list:
+        """
+        @param states: clean states to run simulations on
+        @param pieces: the piece to give the result of each simulation for
+        @return: the result of a simulation from each state.
+        By default each state is simulated in turn with the agent's policy (rollout_policy with fast_rollouts).
+        """
+        return [self.simulate(state).results(piece) for state, piece in zip(states, pieces)]
+
     def act(self, state: GameStateTemplate, game_number: int, wins: dict, stats) -> Action:
-        # currently, a new root is created each calll.
-        # this can be improved by saving the root as a class variable
-        # and finding the new node each time an action is taken
-        # if self.root == None:
-        self.root = GameTreeNode(
-            state=state, action=None, depth=0, parent=None)
+        # the tree doesn't need the game's history
+        state = state.deepcopy(history_policy=HistoryPolicy.NONE)
+        if self.max_captures_only:
+            state.max_captures_only = True
+        self.root = self.find_root(state, game_number)
+        futures = self.start_workers(state)
         best_child = self.MCTS.search(self.root)
         nodes_searched = self.MCTS.nodes_searched
+        if len(futures) > 0:
+            root_stats = [root_child_stats(self.root)]
+            for future in futures:
+                child_stats, iterations = future.result()
+                root_stats.append(child_stats)
+                nodes_searched += iterations
+            action = select_best_action(merge_root_stats(root_stats))
+            # the chosen move may not be in this process's tree
+            best_child = next((child for child in self.root.children if child.action == action), None)
+        else:
+            action = best_child.action
         stats.update_stats(self.name, add_nodes=nodes_searched)
-        # self.root = self.root.find_node(best_child.action)
-        return best_child.action
+        # keep the subtree of our move, the opponent's reply is looked for in it next turn
+        self.root = best_child if self.reuse_tree else None
+        if self.root is not None:
+            self.root.set_as_root()
+        return as_action(action)
 
+    def start_workers(self, state: GameStateTemplate) -> list:
+        """
+        Start a search of the state in each of the workers - 1 worker processes
+        @return: futures of the worker results, see _worker_search
+        """
+        if self.workers <= 1:
+            return []
+        if self.pool is None:
+            # each worker gets its own copy of the agent once, a search only sends the position
+            self.pool = ProcessPoolExecutor(self.workers - 1, initializer=_init_worker, initargs=(self,))
+        position = to_bytes(state)
+        return [self.pool.submit(_worker_search, position, type(state.grid), random.getrandbits(32))
+                for _ in range(self.workers - 1)]
+
+    def seed(self, seed) -> None:
+        """
+        Seed the random choices of the search and of the simulations, so each worker plays differently
+        """
+        random.seed(seed)
+        self.rollout_seed = seed
+        self.rollout_engine = None
+
+    def close(self) -> None:
+        """ shut down the worker processes """
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __getstate__(self) -> dict:
+        # the tree and the worker pool stay in this process
+        state = self.__dict__.copy()
+        state['root'] = None
+        state['pool'] = None
+        return state
+
+    def find_root(self, state: GameStateTemplate, game_number: int) -> GameTreeNode:
+        """
+        @return: the node of the kept tree for the state after the opponent's reply, detached from
+            the rest of the tree, or a new root if there's no such node
+        """
+        node = None
+        if self.root is not None and game_number == self.game_number:
+            node = self.root if self.root.key == state.zobrist_key else self.root.find_node(state.zobrist_key)
+        self.game_number = game_number
+        if node is None:
+            return GameTreeNode(state=state, action=None, depth=0, parent=None, incremental=self.incremental)
+        node.set_as_root(state)
+        return node
+
+
+def board_layout(grid) -> tuple:
+    """
+    @return: (dimensions, non playable locations) of the grid, which simulation engines are built for
+    """
+    return tuple(grid.dimensions), tuple(grid.get_piece_list(Piece.NON_PLAYABLE))
+
+
+def root_child_stats(root: GameTreeNode) -> dict:
+    """
+    @return: packed action -> (visits, total results) of each child of the root
+    """
+    return {child.action: (child.n, child.stats.total_results) for child in root.children}
+
+
+def merge_root_stats(root_stats: 'list[dict]') -> dict:
+    """
+    @param root_stats: the root_child_stats of several searches of the same position
+    @return: packed action -> (visits, total results) added up over the searches
+    """
+    merged = {}
+    for child_stats in root_stats:
+        for action, (n, total_results) in child_stats.items():
+            merged_n, merged_total = merged.get(action, (0, 0))
+            merged[action] = (merged_n + n, merged_total + total_results)
+    return merged
+
+
+def select_best_action(merged: dict):
+    """
+    @return: the most visited action, like MCTS.select_best_child
+    """
+    return max(merged, key=lambda action: merged[action][0])
+
+
+# the agent searching in a worker process, set by _init_worker
+_worker_agent = None
 
-class MCTSRandAgent(MCTSAgentTemplate):
-    def __init__(self, name, agentClassName, save_file_path='results.txt', max_time=10, max_depth=math.inf) -> None:
-        super().__init__(name, agentClassName, save_file_path, max_time=max_time, max_depth=max_depth)
 
+def _init_worker(agent: MCTSAgentTemplate) -> None:
+    global _worker_agent
+    _worker_agent = agent
+
+
+def _worker_search(position: bytes, grid_type, seed) -> 'tuple[dict, int]':
+    """
+    Search a new tree from the position with the worker's agent
+    @param position: the state in binary notation
+    @return: (root_child_stats of the tree, iterations of the search)
+    """
+    agent = _worker_agent
+    agent.seed(seed)
+    state = from_bytes(position, grid_type=grid_type, max_captures_only=agent.max_captures_only)
+    root = GameTreeNode(state=state, action=None, depth=0, parent=None, incremental=agent.incremental)
+    agent.MCTS.search(root)
+    return root_child_stats(root), agent.MCTS.nodes_searched
+
+
+class MCTSRandAgent(MCTSAgentTemplate):
     def simulation_policy(self, state: GameStateTemplate) -> GameStateTemplate:
         while not state.game_over():
             state = state.take_action_on_state(
-                random.choice(state.valid_actions()))
+                random.choice(state.valid_packed_actions()))
         return state
 
 
 class MCTSUnequalAgent(MCTSAgentTemplate):
-    def __init__(self, name, agentClassName, save_file_path='results.txt', max_time=10, max_depth=math.inf) -> None:
-        super().__init__(name, agentClassName, save_file_path, max_time=max_time, max_depth=max_depth)
-
     def simulation_policy(self, state: GameStateTemplate) -> GameStateTemplate:
         while not state.game_over():
-            actions = []
-            while(actions == []):
-                actions = state.get_actions_from_loc(
-                    *random.choice(state.get_locations(state.turn)))
-            state = state.take_action_on_state(random.choice(actions))
+            # choose a piece first, then one of its actions
+            loc = random.choice(state.get_locations(state.turn))
+            while not state.has_any_action(loc):
+                loc = random.choice(state.get_locations(state.turn))
+            state = state.take_action_on_state(random.choice(state.get_actions_from_loc(*loc)))
         return state
+
+
+class MCTSBatchAgent(MCTSRandAgent):
+    """
+    Random rollouts like MCTSRandAgent, but batch_size leaves are played out together by a
+    numpy BatchPlayout engine
+    """
+
+    def __init__(self, name, agentClassName, save_file_path='results.txt', batch_size=64, **kwargs) -> None:
+        """
+        @param kwargs: the other MCTSAgentTemplate parameters
+        """
+        # set before the template's __init__, which may seed the agent
+        self.playout_engine = None
+        self.playout_key = None
+        self.playout_seed = None
+        super().__init__(name, agentClassName, save_file_path, batch_size=batch_size, **kwargs)
+
+    def seed(self, seed) -> None:
+        super().seed(seed)
+        self.playout_seed = seed
+        self.playout_engine = None
+
+    def batch_simulation_policy(self, states: 'list[GameStateTemplate]', pieces: list) -> list:
+        turns_per_game = states[0].turns_per_game
+        key = (board_layout(states[0].grid), turns_per_game, states[0].max_captures_only)
+        if self.playout_engine is None or self.playout_key != key:
+            self.playout_engine = BatchPlayout(board=states[0].grid.board, turns_per_game=turns_per_game,
+                                               max_captures_only=states[0].max_captures_only, seed=self.playout_seed)
+            self.playout_key = key
+        return self.playout_engine.simulate(states, pieces).tolist()
+
+
+class MCTSArrayAgent(MCTSRandAgent):
+    """
+    Random rollouts like MCTSRandAgent, searching an ArrayTree (see ArrayMCTS) so much larger
+    trees fit in memory. A new tree is built each move and searched in this process only.
+    """
+    search_type = ArrayMCTS
+
+    def __init__(self, name, agentClassName, save_file_path='results.txt', reuse_tree=False, workers=1,
+                 incremental=False, **kwargs) -> None:
+        """
+        @param kwargs: the other MCTSAgentTemplate parameters. ArrayMCTS raises a ValueError for a
+            transposition table, batches or RAVE
+        """
+        unsupported = [name for name, used in (('reuse_tree', reuse_tree), ('workers', int(workers) > 1),
+                                               ('incremental', incremental)) if used]
+        if unsupported:
+            raise ValueError(f"MCTSArrayAgent doesn't support {', '.join(unsupported)}")
+        super().__init__(name, agentClassName, save_file_path, reuse_tree=False, **kwargs)
+
+    def act(self, state: GameStateTemplate, game_number: int, wins: dict, stats) -> Action:
+        state = state.deepcopy(history_policy=HistoryPolicy.NONE)
+        if self.max_captures_only:
+            state.max_captures_only = True
+        action = self.MCTS.search(state)
+        stats.update_stats(self.name, add_nodes=self.MCTS.nodes_searched)
+        return as_action(action)
@@ -0,0 +1,116 @@
+import numpy as np
+
+"""
+Struct of arrays game tree for MCTS.
+Instead of a GameTreeNode object per node, a node is an index into numpy columns:
+- parent: index of the parent node, -1 for the root
+- first_child: index of the first child, -1 until the node is expanded
+- num_children: number of children
+- n: number of visits
+- total: sum of the results backed up through the node
+- action: packed action (see pack_action) reaching the node from its parent
+- depth: depth of the node below the root (the root is 0)
+
+All the children of a node are added together when it is first expanded, one per valid action,
+so they are a contiguous slice of the columns and can be scored in one numpy operation.
+Nodes don't keep states: the search makes the actions along the path on a single state.
+"""
+
+
+class ArrayTree:
+    COLUMNS = {
+        'parent': (np.int32, -1),
+        'first_child': (np.int32, -1),
+        'num_children': (np.int32, 0),
+        'n': (np.int32, 0),
+        'total': (np.float64, 0),
+        'action': (np.int64, 0),
+        'depth': (np.int16, 0),
+    }
+
+    def __init__(self, capacity=1024) -> None:
+        """
+        @param capacity: number of nodes allocated at first, the columns double in size when full
+        """
+        self.capacity = capacity
+        for name, (dtype, fill) in ArrayTree.COLUMNS.items():
+            setattr(self, name, np.full(capacity, fill, dtype=dtype))
+        # the root is node 0
+        self.size = 1
+
+    def _grow(self, needed) -> None:
+        capacity = max(2 * self.capacity, needed)
+        for name, (dtype, fill) in ArrayTree.COLUMNS.items():
+            column = np.full(capacity, fill, dtype=dtype)
+            column[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, column)
+        self.capacity = capacity
+
+    def is_expanded(self, node) -> bool:
+        return self.first_child[node] >= 0
+
+    def add_children(self, node, actions) -> None:
+        """
+        Expand the node with a child per action
+        @param actions: packed actions, in the order unvisited children are tried
+        """
+        start, end = self.size, self.size + len(actions)
+        if end > self.capacity:
+            self._grow(end)
+        self.parent[start:end] = node
+        self.action[start:end] = actions
+        self.depth[start:end] = self.depth[node] + 1
+        # a node with no actions is expanded (first_child >= 0) but has no children
+        self.first_child[node] = start
+        self.num_children[node] = len(actions)
+        self.size = end
+
+    def children(self, node) -> range:
+        start = self.first_child[node]
+        return range(start, start + self.num_children[node]) if start >= 0 else range(0)
+
+    def select_child(self, node, ucb_constant) -> int:
+        """
+        @return: the first unvisited child of the node, or if all of them have been visited
+            the child with the highest UCB score
+        """
+        start = int(self.first_child[node])
+        end = start + int(self.num_children[node])
+        n = self.n[start:end]
+        unvisited = np.flatnonzero(n == 0)
+        if len(unvisited) > 0:
+            return start + int(unvisited[0])
+        ucb = self.total[start:end] / n + ucb_constant * np.sqrt(np.log(self.n[node]) / n)
+        return start + int(np.argmax(ucb))
+
+    def backup(self, node, result) -> None:
+        """ add a visit and the result to the node and all its ancestors """
+        while node >= 0:
+            self.n[node] += 1
+            self.total[node] += result
+            node = self.parent[node]
+
+    def best_child(self, node) -> int:
+        """ @return: the most visited child of the node """
+        start = int(self.first_child[node])
+        return start + int(np.argmax(self.n[start:start + self.num_children[node]]))
+
+    def q(self, node) -> float:
+        """ @return: the average result of the node """
+        return self.total[node] / self.n[node]
+
+    def path(self, node) -> 'list[int]':
+        """ @return: the packed actions from the root to the node """
+        actions = []
+        while self.parent[node] >= 0:
+            actions.append(int(self.action[node]))
+            node = self.parent[node]
+        return actions[::-1]
+
+    @property
+    def nbytes(self) -> int:
+        """ memory used by the columns """
+        return sum(getattr(self, name).nbytes for name in ArrayTree.COLUMNS)
+
+    def __len__(self) -> int:
+        return self.size
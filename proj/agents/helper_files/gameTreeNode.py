@@ -1,54 +1,270 @@
 
 import random
 import math
+from itertools import islice
 from typing import Callable, Generator
 
 from dataclasses import dataclass
 
 import time
-from proj.gameEngine.state import Action, GameStateTemplate
+import numpy as np
+from proj.gameEngine.state import Action, GameStateTemplate, move_key, pack_action
 
 
 class GameTreeNode:
 
-    def __init__(self, state: GameStateTemplate, action, depth, parent) -> None:
+    def __init__(self, state: GameStateTemplate, action, depth, parent, keep_state=True,
+                 incremental=False) -> None:
+        """
+        @param state: the state at this node
+        @param keep_state: if False the node only reads the state when it's created,
+            which lets a search walk the tree on a single state using make/unmake
+        @param incremental: if True the untried actions are taken one at a time from state.iter_actions(),
+            biggest captures first, instead of from a shuffled list. The children are incremental too.
+            A node without its own state reads the actions from the search state, which must be at
+            this node's position whenever the node is asked for its actions or expanded
+        """
         self.children = []
-        self.state = state
+        self.state = state if keep_state else None
         self.action = action
         self.parent = parent
-        self.unvisited_actions = state.valid_actions()
-        # shuffle so that nodes are explored differently each time 
-        # otherwise each time the same state is explored, the children 
-        # will be explored in the same order
-        random.shuffle(self.unvisited_actions)
+        self.turn = state.turn
+        self.key = state.zobrist_key
+        self.terminal = state.game_over()
+        self.incremental = incremental
+        # the untried actions aren't generated until the node is first expanded,
+        # most nodes are leaves which are only simulated from
+        self._untried_actions = None
+        self._action_iter = None
+        # the state _action_iter reads from
+        self._action_state = None
         self.stats = NodeStats(depth)
+        # visits and total results of the children, child i of self.children at index i,
+        # kept alongside their NodeStats so UCB can be computed for all of them at once
+        self.child_n = None
+        self.child_total = None
+        # index of this node in its parent's child arrays, None if it isn't in them
+        self.index = None
+        # all moves as first stats (see AmafStats), only kept by a RAVE search, and the slot of each child in them
+        self.amaf = None
+        self.child_slots = None
+        # AMAF slot of each untried action, kept in step with _untried_actions once computed
+        self._untried_slots = None
+
+    def _generate_actions(self, state: GameStateTemplate) -> None:
+        if self.incremental:
+            # one action is kept ready, so whether any are left is known.
+            # iter_actions copies the piece lists, so a search state which has been moved away and back
+            # with make and unmake carries on from the same position
+            self._action_iter = map(pack_action, state.iter_actions())
+            self._action_state = state
+            self._untried_actions = list(islice(self._action_iter, 1))
+        else:
+            self._untried_actions = state.valid_packed_actions()
+            # shuffle so that nodes are explored differently each time
+            # otherwise each time the same state is explored, the children
+            # will be explored in the same order
+            random.shuffle(self._untried_actions)
+
+    def has_untried_actions(self, state: GameStateTemplate = None) -> bool:
+        """
+        @param state: the state at this node, needed the first time if the node doesn't keep one
+        @return: True if some actions haven't been expanded into children yet
+        """
+        if state is None:
+            state = self.state
+        if self._untried_actions is None:
+            self._generate_actions(state)
+        elif self._action_iter is not None and state is not None and state is not self._action_state:
+            self._rebind_actions(state)
+        return len(self._untried_actions) > 0
+
+    def _rebind_actions(self, state: GameStateTemplate) -> None:
+        """
+        Carry on generating the actions from another state at this node's position,
+        eg. the state of a new search of a kept tree, skipping the actions already taken
+        """
+        taken = {child.action for child in self.children}
+        taken.update(self._untried_actions)
+        self._action_iter = (action for action in map(pack_action, state.iter_actions()) if action not in taken)
+        self._action_state = state
+
+    @property
+    def unvisited_actions(self) -> 'list[int]':
+        """ the untried actions generated so far (all of them unless the node is incremental) """
+        if self._untried_actions is None:
+            self._generate_actions(self.state)
+        return self._untried_actions
 
-    def expand_new_node(self) -> 'GameTreeNode':
-        action = self.unvisited_actions.pop()
-        child = GameTreeNode(state=self.state.take_action(action), action=action,
-                             depth=self.depth+1, parent=self)
+    def expand_new_node(self, state: GameStateTemplate = None, index=None) -> 'GameTreeNode':
+        """
+        Add the child reached by one of the unvisited actions to the tree
+        @param state: the search state at this node. If given, the action is made on it
+            and the child doesn't keep a state of its own.
+            Otherwise the child gets a new copy of this node's state.
+        @param index: index of the action in unvisited_actions, by default the last one
+        """
+        self.has_untried_actions(state)
+        action = self._untried_actions.pop() if index is None else self._untried_actions.pop(index)
+        if self._untried_slots is not None:
+            self._untried_slots = np.delete(self._untried_slots, -1 if index is None else index)
+        if self._action_iter is not None:
+            self._untried_actions.extend(islice(self._action_iter, 1))
+            if self.amaf is not None:
+                self.amaf.add_actions(self._untried_actions)
+            self._untried_slots = None
+        if state is None:
+            child = GameTreeNode(state=self.state.take_action(action), action=action,
+                                 depth=self.depth+1, parent=self, incremental=self.incremental)
+        else:
+            state.make(action)
+            child = GameTreeNode(state=state, action=action, depth=self.depth+1,
+                                 parent=self, keep_state=False, incremental=self.incremental)
+        self._add_child_stats(child)
         self.children.append(child)
         return child
 
+    def _add_child_stats(self, child: 'GameTreeNode') -> None:
+        index = len(self.children)
+        if self.child_n is None or index == len(self.child_n):
+            # room for every untried action, or double the size when they're generated one at a time
+            capacity = max(index + 1 + len(self._untried_actions), 2 * index, 4)
+            child_n, child_total = np.zeros(capacity), np.zeros(capacity)
+            if self.child_n is not None:
+                child_n[:index] = self.child_n
+                child_total[:index] = self.child_total
+            self.child_n, self.child_total = child_n, child_total
+            if self.child_slots is not None:
+                child_slots = np.zeros(capacity, dtype=np.int64)
+                child_slots[:index] = self.child_slots
+                self.child_slots = child_slots
+        self.child_n[index] = child.stats.n
+        self.child_total[index] = child.stats.total_results
+        if self.child_slots is not None:
+            self.child_slots[index] = self.amaf.add(child.action)
+        child.index = index
+
+    def update_amaf(self, keys, result) -> None:
+        """
+        Add a result to the all moves as first stats of the moves played after this node by its side to move.
+        Nothing is kept until the node's actions have been generated.
+        @param keys: the move_key of each move, each once
+        """
+        if self.amaf is None:
+            if self._untried_actions is None:
+                return
+            self.amaf = AmafStats()
+            self.amaf.add_actions(self._untried_actions)
+            self.child_slots = np.zeros(len(self.child_n) if self.child_n is not None else 0, dtype=np.int64)
+            for child in self.children:
+                self.child_slots[child.index] = self.amaf.add(child.action)
+        self.amaf.update(keys, result)
+
+    def set_stats(self, n, total_results) -> None:
+        """ replace the visits and total results of the node, eg. with ones found in a transposition table """
+        self.stats.n = n
+        self.stats.total_results = total_results
+        if self.index is not None:
+            self.parent.child_n[self.index] = n
+            self.parent.child_total[self.index] = total_results
+
+    def ucb_scores(self, ucb_constant, rave=0) -> np.ndarray:
+        """
+        @param rave: RAVE equivalence constant k, 0 for plain UCB. The value of a child is blended
+            with the all moves as first value of its move as (1 - beta) * q + beta * amaf q,
+            beta = sqrt(k / (3n + k)), so the AMAF value counts for less as the child gets more visits
+            and for half at about k visits
+        @return: the UCB score of each child, inf for a child with no visits (only while it
+            waits in a batch to be simulated)
+        """
+        count = len(self.children)
+        n = self.child_n[:count]
+        visited = n > 0
+        # unvisited children are scored as if visited once, then replaced by inf
+        n = np.where(visited, n, 1)
+        # log(parent n) is the same for every child
+        log_n = math.log(max(self.stats.n, 1))
+        q = self.child_total[:count] / n
+        if rave and self.amaf is not None:
+            slots = self.child_slots[:count]
+            amaf_n = self.amaf.n[slots]
+            # a move never played after this node keeps its own value
+            amaf_q = np.divide(self.amaf.total[slots], amaf_n, out=q.copy(), where=amaf_n > 0)
+            beta = np.sqrt(rave / (3 * n + rave))
+            q = (1 - beta) * q + beta * amaf_q
+        ucb = q + ucb_constant * np.sqrt(log_n / n)
+        ucb[~visited] = math.inf
+        return ucb
+
+    def ucb_child(self, ucb_constant, rave=0) -> 'GameTreeNode':
+        """
+        @param rave: RAVE equivalence constant, see ucb_scores
+        @return: the child with the highest UCB score, a child with no visits first (only while it
+            waits in a batch to be simulated), or None if the node has no children
+        """
+        if len(self.children) == 0:
+            return None
+        return self.children[int(np.argmax(self.ucb_scores(ucb_constant, rave)))]
+
+    def best_untried_action(self, ucb_constant) -> 'tuple[int, float]':
+        """
+        With RAVE, the untried actions are scored by the all moves as first value of their move, like a
+        child with a single visit and the AMAF value. An action whose move hasn't been played after this
+        node is taken to be as good as the node's average.
+        Needs the AMAF stats, see update_amaf
+        @return: (index of the best untried action in unvisited_actions, its score)
+        """
+        untried = self._untried_actions
+        if self._untried_slots is None:
+            self._untried_slots = np.fromiter((self.amaf.add(action) for action in untried), dtype=np.int64,
+                                              count=len(untried))
+        slots = self._untried_slots
+        amaf_n = self.amaf.n[slots]
+        prior = np.full(len(untried), self.q if self.n > 0 else 0.0)
+        values = np.divide(self.amaf.total[slots], amaf_n, out=prior, where=amaf_n > 0)
+        index = int(np.argmax(values))
+        return index, values[index] + ucb_constant * math.sqrt(math.log(max(self.n, 1)))
+
     def is_terminal(self) -> bool:
-        return self.state.game_over()
+        return self.terminal
 
     def get_all_children_gen(self) -> 'Generator[GameTreeNode]':
-        for action in self.state.valid_actions():
-            yield GameTreeNode(state=self.state.take_action(action), action=action, depth=self.depth+1, parent=self)
+        for action in self.state.iter_actions():
+            yield GameTreeNode(state=self.state.take_action(action), action=action, depth=self.depth+1, parent=self,
+                               incremental=self.incremental)
 
-    def set_as_root(self):
-        self.parent == None
+    def set_as_root(self, state: GameStateTemplate = None):
+        """
+        Detach this node from its parent, so the rest of the tree can be freed
+        @param state: the state at this node, kept if given (a search starts from the root's state)
+        """
+        self.parent = None
+        self.index = None
+        if state is not None:
+            self.state = state
 
-    @property
-    def is_fully_expanded(self):
-        return self.unvisited_actions == []
+    def find_node(self, key) -> 'GameTreeNode':
+        """
+        @param key: zobrist key of a position
+        @return: the child of this node with that position, or None if it hasn't been expanded
+        """
+        for child in self.children:
+            if child.key == key:
+                return child
+        return None
+
+    def is_fully_expanded(self, state: GameStateTemplate = None) -> bool:
+        """ @param state: the state at this node, if the node doesn't keep one """
+        return not self.has_untried_actions(state)
 
     def is_root(self):
-        return self.depth == 0
+        return self.parent is None
 
     def update_stats(self, result):
         self.stats.update(result)
+        if self.index is not None:
+            self.parent.child_n[self.index] += 1
+            self.parent.child_total[self.index] += result
 
     @property
     def n(self): return self.stats.n
@@ -80,3 +296,51 @@ class NodeStats:
         Return avg score over n simulations
         """
         return self.total_results / self.n
+
+
+class AmafStats:
+    """
+    All moves as first (AMAF) stats of a node: for each move of the node, the number of iterations
+    through the node in which its side to move played the move later on, in the tree or in the
+    simulation, and the total of their results.
+    Moves are keyed by move_key, so every capture choice of a move shares its stats.
+    """
+
+    def __init__(self) -> None:
+        # move key -> index in n and total
+        self.slots = {}
+        self.n = np.zeros(8)
+        self.total = np.zeros(8)
+
+    def add(self, action) -> int:
+        """
+        @return: the slot of the action's move, added if it's new
+        """
+        key = move_key(action)
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = self.slots[key] = len(self.slots)
+            if slot == len(self.n):
+                self.n = np.concatenate((self.n, np.zeros(slot)))
+                self.total = np.concatenate((self.total, np.zeros(slot)))
+        return slot
+
+    def add_actions(self, actions) -> None:
+        for action in actions:
+            self.add(action)
+
+    def update(self, keys, result) -> None:
+        """
+        Count a result for the moves, ignoring moves which aren't moves of the node
+        @param keys: move keys, each once
+        """
+        slots = [self.slots[key] for key in keys if key in self.slots]
+        self.n[slots] += 1
+        self.total[slots] += result
+
+    def q(self, action) -> float:
+        """ @return: the average result of the action's move, None if it hasn't been played """
+        slot = self.slots.get(move_key(action))
+        if slot is None or self.n[slot] == 0:
+            return None
+        return self.total[slot] / self.n[slot]
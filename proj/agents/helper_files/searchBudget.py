@@ -0,0 +1,88 @@
+import time
+
+
+class SearchBudget:
+    """
+    How much work a search may do before it stops. Any of the limits can be set, the search
+    stops as soon as one of them is reached:
+    - iterations: units of work, eg. MCTS iterations or minimax nodes
+    - nodes: nodes added to (or visited in) the tree
+    - wall_time: seconds of real time
+    - cpu_time: seconds of CPU time of this process
+
+    The iteration and node limits don't depend on the machine or its load, so a search with
+    them (and a seeded random generator) gives the same result every run.
+    Reading a clock costs more than a minimax node, so the clocks are only read once every
+    check_every calls to exhausted().
+    """
+
+    def __init__(self, iterations=None, nodes=None, wall_time=None, cpu_time=None, check_every=1) -> None:
+        """
+        @param iterations, nodes, wall_time, cpu_time: the limits, None (or 0) for no limit
+        @param check_every: number of calls to exhausted() between clock checks
+        """
+        self.iterations = iterations or None
+        self.nodes = nodes or None
+        self.wall_time = wall_time or None
+        self.cpu_time = cpu_time or None
+        self.check_every = max(int(check_every), 1)
+        self.start()
+
+    @staticmethod
+    def from_params(max_time=None, iterations=0, nodes=0, cpu_time=0, check_every=1,
+                    default_time=10) -> 'SearchBudget':
+        """
+        Build the budget of an agent from its parameters
+        @param max_time: wall time limit. If None, default_time is used unless another limit is set,
+            so eg. iterations=1000 alone gives a search which doesn't depend on the clock
+        """
+        if max_time is None and not (iterations or nodes or cpu_time):
+            max_time = default_time
+        return SearchBudget(iterations=iterations, nodes=nodes, wall_time=max_time,
+                            cpu_time=cpu_time, check_every=check_every)
+
+    def start(self) -> None:
+        """ reset the counts and start the clocks """
+        self.iterations_used = 0
+        self.nodes_used = 0
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        self.out_of_time = False
+        self._until_check = self.check_every
+
+    def spend(self, iterations=1, nodes=0) -> None:
+        """ count work done """
+        self.iterations_used += iterations
+        self.nodes_used += nodes
+
+    def exhausted(self) -> bool:
+        """
+        @return: True once a limit has been reached
+        """
+        if self.iterations is not None and self.iterations_used >= self.iterations:
+            return True
+        if self.nodes is not None and self.nodes_used >= self.nodes:
+            return True
+        if self.out_of_time:
+            return True
+        self._until_check -= 1
+        if self._until_check > 0:
+            return False
+        self._until_check = self.check_every
+        self.out_of_time = ((self.wall_time is not None and self.wall_elapsed >= self.wall_time)
+                            or (self.cpu_time is not None and self.cpu_elapsed >= self.cpu_time))
+        return self.out_of_time
+
+    @property
+    def wall_elapsed(self) -> float:
+        return time.perf_counter() - self.wall_start
+
+    @property
+    def cpu_elapsed(self) -> float:
+        return time.process_time() - self.cpu_start
+
+    def __repr__(self) -> str:
+        limits = [f'{name}={value}' for name, value in (('iterations', self.iterations), ('nodes', self.nodes),
+                                                        ('wall_time', self.wall_time), ('cpu_time', self.cpu_time))
+                  if value is not None]
+        return f"SearchBudget({', '.join(limits)})"
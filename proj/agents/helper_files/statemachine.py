@@ -42,10 +42,9 @@ class FromLocState(State):
     
 class ToLocState(State):
     def act_on_event(self, action, game_state, gui, event):
-        valid_actions = game_state.valid_actions()
         state = self
         fx, fy = action.from_loc
-        acceptable_moves = [a for a in filter(lambda action: action.from_loc == (fx, fy), valid_actions)]
+        acceptable_moves = self.acceptable_moves
         if event.type != pg.MOUSEBUTTONUP:
             return action, state
         mouse_position = pg.mouse.get_pos()
@@ -65,12 +64,12 @@ class ToLocState(State):
     
         
     def init_state(self, action, game_state, gui):
-        valid_actions = game_state.valid_actions()
         fx, fy = action.from_loc
-        acceptable_moves = (a for a in filter(lambda action: action.from_loc == (fx,fy), valid_actions))
+        # only the moves of the selected piece, found once rather than on every event
+        self.acceptable_moves = game_state.get_actions_from_loc(fx, fy)
         gui.display_grid(game_state)
         gui.highlight_squares(
-            [x.to_loc for x in acceptable_moves], ((176, 173, 5)))
+            [x.to_loc for x in self.acceptable_moves], ((176, 173, 5)))
         gui.highlight_squares([action.from_loc], (176, 0, 5))
 
 
@@ -78,13 +77,16 @@ class CaptureListState(State):
     def act_on_event(self, action, game_state, gui, event):
         state = self
         if event.type == pg.KEYDOWN and event.key == K_RETURN:
-            state = CompleteState(action, game_state, gui)
+            if game_state.is_legal(action):
+                state = CompleteState(action, game_state, gui)
             return action, state
         if event.type != pg.MOUSEBUTTONUP and event.type:
             return action, state
         mouse_position = pg.mouse.get_pos()
         if gui.ok_button_click(mouse_position):
-            state = CompleteState(action, game_state, gui)
+            # eg. a shove needs at least one dwarf selected before it can be played
+            if game_state.is_legal(action):
+                state = CompleteState(action, game_state, gui)
         else:
             x, y = gui.get_coordinates(mouse_position)
             if (x, y) == action.from_loc:
@@ -0,0 +1,96 @@
+from dataclasses import dataclass
+from enum import Enum
+
+
+class Bound(Enum):
+    """
+    What a stored search value means:
+    - EXACT: the value of the position
+    - LOWER: the value is at least this (the search failed high)
+    - UPPER: the value is at most this (the search failed low)
+    """
+    EXACT = 1
+    LOWER = 2
+    UPPER = 3
+
+
+class ReplacementPolicy(Enum):
+    """
+    - DEPTH_PREFERRED: each slot has a depth-preferred entry, only replaced by an entry searched
+      at least as deep, and an always-replace entry for everything else
+    - ALWAYS_REPLACE: each slot keeps only the most recent entry
+    """
+    DEPTH_PREFERRED = 1
+    ALWAYS_REPLACE = 2
+
+
+@dataclass
+class TableEntry:
+    key: int
+    depth: int
+    value: object
+    bound: Bound = Bound.EXACT
+    action: object = None
+
+
+class TranspositionTable:
+    """
+    Fixed size table from zobrist keys (see ThudGameState.zobrist_key) to search results,
+    so a position reached again, by another move order or in a later search, isn't searched again.
+    The table has a power of 2 number of slots, a key is stored in slot key % size.
+    """
+
+    def __init__(self, size=2**16, policy=ReplacementPolicy.DEPTH_PREFERRED) -> None:
+        """
+        @param size: number of slots, rounded up to a power of 2
+        @param policy: the ReplacementPolicy used when a slot is full
+        """
+        size = 1 << max(int(size) - 1, 0).bit_length()
+        self.size = size
+        self.mask = size - 1
+        self.policy = policy
+        self.depth_entries = [None] * size
+        self.recent_entries = [None] * size
+        self.probes = 0
+        self.hits = 0
+
+    def probe(self, key) -> 'TableEntry | None':
+        """
+        @return: the entry stored for this key or None
+        """
+        self.probes += 1
+        index = key & self.mask
+        entry = self.depth_entries[index]
+        if entry is None or entry.key != key:
+            entry = self.recent_entries[index]
+            if entry is None or entry.key != key:
+                return None
+        self.hits += 1
+        return entry
+
+    def store(self, key, depth, value, bound=Bound.EXACT, action=None) -> None:
+        """
+        Store the result of a search of the position with this key
+        @param depth: how deep the search below the position was
+        @param value: the result
+        @param bound: whether value is exact or a bound
+        @param action: the best action found
+        """
+        index = key & self.mask
+        entry = TableEntry(key, depth, value, bound, action)
+        if self.policy == ReplacementPolicy.DEPTH_PREFERRED:
+            current = self.depth_entries[index]
+            if current is None or depth >= current.depth:
+                self.depth_entries[index] = entry
+                return
+        self.recent_entries[index] = entry
+
+    def clear(self) -> None:
+        self.depth_entries = [None] * self.size
+        self.recent_entries = [None] * self.size
+        self.probes = 0
+        self.hits = 0
+
+    def __len__(self) -> int:
+        return (sum(entry is not None for entry in self.depth_entries)
+                + sum(entry is not None for entry in self.recent_entries))
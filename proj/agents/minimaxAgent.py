@@ -1,18 +1,32 @@
 
 from proj.prog.matchStats import MatchStats
-from proj.agents.helper_files. gameTreeNode import GameTreeNode
 from typing import Generator
-from proj.gameEngine.enums import Piece
-from proj.gameEngine.state import Action, GameStateTemplate
+from proj.gameEngine.enums import HistoryPolicy, Piece
+from proj.gameEngine.state import Action, GameStateTemplate, as_action
 from proj.agents.template import AgentTemplate
+from proj.agents.helper_files.searchBudget import SearchBudget
+from proj.agents.helper_files.transpositionTable import Bound, TableEntry, TranspositionTable
 
 import math
-import time
 
 
 class MiniMaxAgent(AgentTemplate):
-    def __init__(self, name, agentClassName) -> None:
+    def __init__(self, name, agentClassName, max_captures_only=False, max_depth=4, max_time=None,
+                 nodes=0, cpu_time=0, check_every=256) -> None:
+        """
+        @param max_captures_only: search with only the largest troll captures, see ThudGameState.max_captures_only
+        @param max_depth: depth of the search
+        @param max_time, nodes, cpu_time: the SearchBudget of a move: seconds, nodes visited or seconds of
+            CPU time, whichever runs out first. 0 = no limit. max_time is 10 seconds unless a limit is given
+        @param check_every: number of nodes between clock checks
+        """
         super().__init__(name, agentClassName)
+        self.transposition_table = TranspositionTable()
+        self.table_piece = None
+        self.max_captures_only = bool(max_captures_only)
+        self.max_depth = int(max_depth)
+        self.budget = SearchBudget.from_params(max_time=max_time, nodes=nodes, cpu_time=cpu_time,
+                                               check_every=check_every)
 
     def act(self, state: GameStateTemplate, game_number: int,
             wins: dict, stats) -> Action:
@@ -20,21 +34,38 @@ class MiniMaxAgent(AgentTemplate):
         offset = 1 if state.turn == Piece.DWARF else -1
 
         def value_fn(state: GameStateTemplate):
-            return offset * (state.score(Piece.DWARF) - state.score(Piece.TROLL))
+            return offset * state.material
 
-        tree = MiniMaxSearch(value_fn=value_fn, state=state, max_depth=4,
-                    max_time=10, optimisation=[], display_process=False)
+        # values in the table are from the point of view of the piece playing
+        if piece != self.table_piece:
+            self.transposition_table.clear()
+            self.table_piece = piece
+        tree = MiniMaxSearch(value_fn=value_fn, state=state, max_depth=self.max_depth,
+                    max_time=self.budget.wall_time, optimisation=['TranspositionTable'], display_process=False,
+                    transposition_table=self.transposition_table, max_captures_only=self.max_captures_only,
+                    budget=self.budget)
         action = tree.get_best_action()
-        if piece == Piece.DWARF:
-            stats.total_nodes_searched_dwarf += tree.nodes_visited
-        else:
-            stats.total_nodes_searched_troll += tree.nodes_visited
+        stats.update_stats(self.name, add_nodes=tree.nodes_visited)
         return action
 
 
 class MiniMaxABAgent(AgentTemplate):
-    def __init__(self, name, agentClassName) -> None:
+    def __init__(self, name, agentClassName, max_captures_only=False, max_depth=2, max_time=None,
+                 nodes=0, cpu_time=0, check_every=256) -> None:
+        """
+        @param max_captures_only: search with only the largest troll captures, see ThudGameState.max_captures_only
+        @param max_depth: depth of the search
+        @param max_time, nodes, cpu_time: the SearchBudget of a move: seconds, nodes visited or seconds of
+            CPU time, whichever runs out first. 0 = no limit. max_time is 10 seconds unless a limit is given
+        @param check_every: number of nodes between clock checks
+        """
         super().__init__(name, agentClassName)
+        self.transposition_table = TranspositionTable()
+        self.table_piece = None
+        self.max_captures_only = bool(max_captures_only)
+        self.max_depth = int(max_depth)
+        self.budget = SearchBudget.from_params(max_time=max_time, nodes=nodes, cpu_time=cpu_time,
+                                               check_every=check_every)
 
     def act(self, state: GameStateTemplate, game_number: int,
             wins: dict, stats: MatchStats) -> Action:
@@ -42,10 +73,16 @@ class MiniMaxABAgent(AgentTemplate):
         offset = 1 if state.turn == Piece.DWARF else -1
 
         def value_fn(state: GameStateTemplate):
-            return offset * (state.score(Piece.DWARF) - state.score(Piece.TROLL))
+            return offset * state.material
 
-        tree = MiniMaxSearch(value_fn=value_fn, state=state, max_depth=2,
-                    max_time=10, optimisation=['AlphaBeta'], display_process=False)
+        # values in the table are from the point of view of the piece playing
+        if piece != self.table_piece:
+            self.transposition_table.clear()
+            self.table_piece = piece
+        tree = MiniMaxSearch(value_fn=value_fn, state=state, max_depth=self.max_depth,
+                    max_time=self.budget.wall_time, optimisation=['AlphaBeta', 'TranspositionTable'],
+                    display_process=False, transposition_table=self.transposition_table,
+                    max_captures_only=self.max_captures_only, budget=self.budget)
         action = tree.get_best_action()
         stats.update_stats(self.name, add_nodes=tree.nodes_visited)
         return action
@@ -53,85 +90,167 @@ class MiniMaxABAgent(AgentTemplate):
 
 class MiniMaxSearch:
     def __init__(self, value_fn, state, max_depth, max_time,
-                 optimisation, display_process=False) -> None:
+                 optimisation, display_process=False, transposition_table=None, max_captures_only=False,
+                 budget=None) -> None:
         """
         Optimisation methods available: 
             1. 'AlphaBeta' (default enabled)
-            2. 
+            2. 'TranspositionTable': positions already searched deep enough aren't searched again
 
         @param value_fn: function taking state as a parameter to evaluate the value of the state and returning float
         @param state: the state acting as root
         @param max_depth: max depth to dig into tree
         @param max_time: max time to spent searching tree
         @param optimisation: list of optimisation techniques to use.
+        @param transposition_table: table to share between searches. If None and
+            'TranspositionTable' is in the optimisations, a new table is used for this search
+        @param max_captures_only: search with only the largest troll captures, see ThudGameState.max_captures_only
+        @param budget: the SearchBudget of the search, every node visited is an iteration and a node.
+            By default max_time seconds, with the clock read every 256 nodes
 
+        The tree is walked on one copy of the state using make/unmake and packed actions,
+        so no nodes, states or Action objects are created while searching.
         """
-        self.root = GameTreeNode(state=state, action=None, depth=0, parent=None)
+        self.state = state.deepcopy(history_policy=HistoryPolicy.NONE)
+        self.state.max_captures_only = max_captures_only or self.state.max_captures_only
         self.value_fn = value_fn
         self.max_depth = max_depth
         self.max_time = max_time
+        self.budget = budget if budget is not None else SearchBudget(wall_time=max_time, check_every=256)
         self.optimisation = optimisation
         self.display_process = display_process
         self.ab_pruning = 'AlphaBeta' in optimisation
+        self.table = None
+        if 'TranspositionTable' in optimisation:
+            self.table = transposition_table if transposition_table is not None else TranspositionTable()
 
     def get_best_action(self) -> Action:
         self.nodes_visited = 0
         self.pruned = 0
-        self.start = time.time()
+        self.budget.start()
         self.timeout = False
-        _, node = self.get_maxi(self.root, alpha=-math.inf, beta=math.inf)
+        _, action = self.get_maxi(0, alpha=-math.inf, beta=math.inf)
         print(f'timeout = {self.timeout}')
         print(f'nodes visited = {self.nodes_visited}')
         print(f'pruned = {self.pruned}')
-        return node.action
+        return as_action(action) if action is not None else None
 
-    def get_mini(self, node: GameTreeNode, alpha, beta) -> 'tuple[float, GameTreeNode]':
+    def get_mini(self, depth, alpha, beta) -> 'tuple[float, int]':
+        """
+        @param depth: depth of the search state below the root
+        @return: the minimum value reachable and the (packed) action leading to it
+        """
         self.nodes_visited += 1
-        if time.time()-self.start > self.max_time:
+        state = self.state
+        self.budget.spend(iterations=1, nodes=1)
+        if self.budget.exhausted():
             self.timeout = True
-            return self.value_fn(node.state), node
+            return self.value_fn(state), None
 
-        if node.depth == self.max_depth or node.is_terminal():
-            return self.value_fn(node.state), node
+        if depth == self.max_depth or state.game_over():
+            return self.value_fn(state), None
+        entry, cutoff = self.probe_table(depth, alpha, beta)
+        if cutoff:
+            return entry.value, entry.action
         else:
-            children = node.get_all_children_gen()
+            window = alpha, beta
             mini_value = math.inf
-            mini_child = node
-            for child in children:
-                child_value, _ = self.get_maxi(child,  alpha=alpha, beta=beta)
+            mini_action = None
+            for action in self.ordered_actions(entry):
+                state.make(action)
+                child_value, _ = self.get_maxi(depth + 1, alpha=alpha, beta=beta)
+                state.unmake()
+                if self.timeout and mini_action is not None:
+                    # out of budget, the rest of the actions would only be evaluated statically
+                    break
                 if child_value < mini_value:
                     mini_value = child_value
-                    mini_child = child
+                    mini_action = action
                 if self.ab_pruning:
                     beta = min(beta, child_value)
                     if alpha >= beta:
                         self.pruned += 1
                         break
-            return mini_value, mini_child
+            self.store_in_table(depth, mini_value, window, mini_action)
+            return mini_value, mini_action
 
-    def get_maxi(self, node: GameTreeNode, alpha, beta) -> 'tuple[float, GameTreeNode]':
+    def get_maxi(self, depth, alpha, beta) -> 'tuple[float, int]':
+        """
+        @param depth: depth of the search state below the root
+        @return: the maximum value reachable and the (packed) action leading to it
+        """
         self.nodes_visited += 1
-        if time.time()-self.start > self.max_time:
+        state = self.state
+        self.budget.spend(iterations=1, nodes=1)
+        if self.budget.exhausted():
             self.timeout = True
-            return self.value_fn(node.state), node
+            return self.value_fn(state), None
 
-        if node.depth == self.max_depth or node.is_terminal():
-            return self.value_fn(node.state), node
+        if depth == self.max_depth or state.game_over():
+            return self.value_fn(state), None
+        entry, cutoff = self.probe_table(depth, alpha, beta)
+        if cutoff:
+            return entry.value, entry.action
         else:
-            children = node.get_all_children_gen()
+            window = alpha, beta
             maxi_value = -math.inf
-            maxi_child = node
-            for child in children:
-                child_value, _ = self.get_mini(child, alpha=alpha, beta=beta)
+            maxi_action = None
+            for action in self.ordered_actions(entry):
+                state.make(action)
+                child_value, _ = self.get_mini(depth + 1, alpha=alpha, beta=beta)
+                state.unmake()
+                if self.timeout and maxi_action is not None:
+                    # out of budget, the rest of the actions would only be evaluated statically
+                    break
                 if child_value > maxi_value:
                     maxi_value = child_value
-                    maxi_child = child
+                    maxi_action = action
                 if self.ab_pruning:
                     alpha = max(alpha, child_value)
                     if alpha >= beta:
                         self.pruned += 1
                         break
-        return maxi_value, maxi_child
+            self.store_in_table(depth, maxi_value, window, maxi_action)
+        return maxi_value, maxi_action
+
+    def probe_table(self, depth, alpha, beta) -> 'tuple[TableEntry, bool]':
+        """
+        Look the search state up in the transposition table
+        @return: (entry, cutoff): the entry found or None,
+            and whether the entry's value can be used instead of searching the state
+        """
+        if self.table is None:
+            return None, False
+        entry = self.table.probe(self.state.zobrist_key)
+        # the root is always searched so that an action is found
+        if entry is None or depth == 0 or entry.depth < self.max_depth - depth:
+            return entry, False
+        cutoff = (entry.bound == Bound.EXACT
+                  or (entry.bound == Bound.LOWER and entry.value >= beta)
+                  or (entry.bound == Bound.UPPER and entry.value <= alpha))
+        return entry, cutoff
+
+    def ordered_actions(self, entry) -> 'list[int]':
+        """
+        @return: valid packed actions of the search state, starting with the best action stored in the table
+        """
+        actions = self.state.valid_packed_actions()
+        if entry is not None and entry.action in actions:
+            actions.remove(entry.action)
+            actions.insert(0, entry.action)
+        return actions
+
+    def store_in_table(self, depth, value, window, action):
+        """
+        Store the value of the search state, searched with the (alpha, beta) window, in the table
+        """
+        if self.table is None or self.timeout:
+            return
+        alpha, beta = window
+        bound = (Bound.UPPER if value <= alpha
+                 else Bound.LOWER if value >= beta
+                 else Bound.EXACT)
+        self.table.store(self.state.zobrist_key, self.max_depth - depth, value, bound, action)
 
 
 class Display:
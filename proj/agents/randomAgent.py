@@ -2,6 +2,7 @@
 from ..gameEngine.state import GameStateTemplate, Action
 from ..agents.template import AgentTemplate
 
+from itertools import islice
 import random
 
 
@@ -15,9 +16,10 @@ class RandomAgent(AgentTemplate):
 
     def act(self, state: GameStateTemplate, game_number: int,
             wins: dict, stats) -> Action:
-        actions = state.valid_actions()
+        # count the actions and only build them up to the chosen one
+        index = random.randrange(state.count_actions())
         # time.sleep(0.5)
-        return random.choice(actions)
+        return next(islice(state.iter_actions(), index, None))
 
 
 class BetterRandomAgent(AgentTemplate):
@@ -33,10 +35,10 @@ class BetterRandomAgent(AgentTemplate):
             wins: dict, stats) -> Action:
         # time.sleep(0.5)
 
-        actions = state.valid_actions()
-        best_action = max(actions, key=lambda x: len(x.capture))
+        # iter_actions yields the biggest captures first
+        best_action = next(state.iter_actions())
         # if best action doesn't do any capturing, choose a random choice instead
         if len(best_action.capture) == 0:
-            return random.choice(actions)
+            return random.choice(state.valid_actions())
         else:
             return best_action
@@ -29,3 +29,7 @@ class AgentTemplate:
             wins: dict, stats) -> Action:
         """ select an action according to the gameState and return it """
         pass
+
+    def close(self) -> None:
+        """ release anything the agent keeps between moves, eg. worker processes. Called when a match ends """
+        pass
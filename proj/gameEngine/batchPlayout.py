@@ -0,0 +1,275 @@
+import numpy as np
+
+from .boardTables import DIRECTIONS
+from .enums import Piece
+from .grid import STANDARD_BOARD
+
+"""
+Batched random playouts.
+Plays many games of thud to the end at once, choosing uniformly between the valid actions
+of each game like MCTSRandAgent.simulation_policy does, but with the move generation and
+move making of all the games done together with numpy.
+
+The boards are held as one (games, squares) int8 array: 1 = dwarf, -1 = troll, 0 = empty.
+The board is padded with a ring of non playable squares and flattened, so square (x, y)
+(1 indexed) is x * (columns + 2) + y and a step in direction (ix, iy) is a fixed offset
+which can't wrap onto another row without crossing the padding.
+
+For every game the engine builds a (direction, distance, piece) array of weights: the
+number of actions which move that piece that distance in that direction.
+Drawing a random number below the total weight picks an action uniformly.
+- dwarf moves and hurls have weight 1, a hurl lands on the first square after the empty ray
+- a troll move to a square with m adjacent dwarves has weight 1 + m (capture one of them or none)
+- a troll shove to a square with m > 0 adjacent dwarves has weight 2^m - 1 (one per non empty subset captured)
+With max_captures_only (see ThudGameState) these are max(m, 1) and 1.
+"""
+
+
+class BatchPlayout:
+
+    def __init__(self, board=None, turns_per_game=70, seed=None, max_captures_only=False) -> None:
+        """
+        @param board: 2d list of pieces giving the layout of the board, defaults to the standard board
+        @param turns_per_game: turns after which a game is over
+        @param seed: seed of the random generator
+        @param max_captures_only: play with the actions of ThudGameState(max_captures_only=True)
+        """
+        if board is None:
+            board = [[Piece(s) for s in row] for row in STANDARD_BOARD]
+        self.dimensions = len(board), len(board[0])
+        self.turns_per_game = turns_per_game
+        self.max_captures_only = max_captures_only
+        self.rng = np.random.default_rng(seed)
+        rows, columns = self.dimensions
+        self.width = columns + 2
+        self.squares = (rows + 2) * self.width
+        self.steps = max(rows, columns) - 1
+
+        self.playable = np.zeros(self.squares, dtype=bool)
+        for x, row in enumerate(board):
+            for y, piece in enumerate(row):
+                self.playable[self._index(x + 1, y + 1)] = piece != Piece.NON_PLAYABLE
+
+        # rays[d, k, s]: the square k + 1 steps from s in direction d.
+        # squares off the array are sent to square 0, which is padding
+        offsets = np.array([ix * self.width + iy for ix, iy in DIRECTIONS])
+        squares = np.arange(self.squares)
+        distances = np.arange(1, self.steps + 1)
+        rays = squares[None, None, :] + offsets[:, None, None] * distances[None, :, None]
+        rays[(rays < 0) | (rays >= self.squares)] = 0
+        self.rays = rays
+        self.neighbours = rays[:, 0, :]
+        # ray of each direction in the opposite direction, to measure lines behind a piece
+        reverse = [DIRECTIONS.index((-ix, -iy)) for ix, iy in DIRECTIONS]
+        self.reverse_rays = rays[reverse]
+
+    def _index(self, x, y) -> int:
+        """ @return: the square of location (x, y) """
+        return x * self.width + y
+
+    def load(self, states) -> 'tuple[np.ndarray, np.ndarray]':
+        """
+        @param states: game states on a board with this layout
+        @return: (boards, turn numbers) arrays for the states
+        """
+        boards = np.zeros((len(states), self.squares), dtype=np.int8)
+        turns = np.empty(len(states), dtype=np.int64)
+        for i, state in enumerate(states):
+            for x, y in state.get_locations(Piece.DWARF):
+                boards[i, self._index(x, y)] = 1
+            for x, y in state.get_locations(Piece.TROLL):
+                boards[i, self._index(x, y)] = -1
+            turns[i] = state.turn_number
+        return boards, turns
+
+    def game_over(self, boards, turns) -> np.ndarray:
+        """ @return: bool array, True for the games which are over (see ThudGameState.game_over) """
+        return ((turns > self.turns_per_game)
+                | ~(boards == 1).any(axis=1) | ~(boards == -1).any(axis=1))
+
+    def results(self, boards, piece=Piece.DWARF) -> np.ndarray:
+        """ @return: ThudGameState.results(piece) of every board """
+        dwarf_score = (boards == 1).sum(axis=1)
+        troll_score = (boards == -1).sum(axis=1) * 4
+        return piece.value * (dwarf_score - troll_score)
+
+    def _sources(self, boards, piece) -> np.ndarray:
+        """
+        @return: (games, pieces) array of the squares holding the piece on each board.
+        Boards with fewer pieces are padded with square 0, which never holds a piece
+        """
+        pieces = boards == piece.value
+        counts = pieces.sum(axis=1)
+        order = np.argsort(~pieces, axis=1, kind='stable')[:, :max(counts.max(), 1)]
+        return np.where(np.arange(order.shape[1])[None, :] < counts[:, None], order, 0)
+
+    def _empty_rays(self, boards, sources) -> 'tuple[np.ndarray, np.ndarray, np.ndarray]':
+        """
+        @return: (squares, rays, lengths): squares[g, d, k, p] is the square k + 1 steps from
+        source p in direction d, rays[g, d, k, p] is True if the first k + 1 squares are empty
+        and lengths[g, d, p] is the number of empty squares in that direction
+        """
+        squares = self.rays[:, :, sources].transpose(2, 0, 1, 3)
+        empty = (boards == 0) & self.playable
+        games = np.arange(len(boards))[:, None, None, None]
+        rays = np.logical_and.accumulate(empty[games, squares], axis=2)
+        return squares, rays, rays.sum(axis=2)
+
+    def _line_lengths(self, boards, sources, piece) -> np.ndarray:
+        """
+        @return: lengths[g, d, p] = 1 + the number of consecutive pieces behind source p,
+        ie. in the direction opposite to d. Only meaningful for sources holding the piece
+        """
+        squares = self.reverse_rays[:, :, sources].transpose(2, 0, 1, 3)
+        games = np.arange(len(boards))[:, None, None, None]
+        behind = np.logical_and.accumulate(boards[games, squares] == piece.value, axis=2)
+        return 1 + behind.sum(axis=2)
+
+    def dwarf_weights(self, boards, sources) -> 'tuple[np.ndarray, np.ndarray]':
+        """
+        @param sources: the squares of the dwarves (see _sources)
+        @return: (weights, squares): (games, directions, distances, sources) weights of the dwarf
+        actions and the square each entry lands on
+        """
+        squares, rays, lengths = self._empty_rays(boards, sources)
+        dwarves = boards[np.arange(len(boards))[:, None], sources] == 1
+        weights = rays & dwarves[:, None, None, :]
+        # as in ThudGameState, a dwarf can only hurl if it can also move
+        can_move = weights.any(axis=(1, 2))
+        # the square after the empty ray, a hurl lands there if it holds a troll
+        landing = np.take_along_axis(
+            squares, np.minimum(lengths, self.steps - 1)[:, :, None, :], axis=2)[:, :, 0, :]
+        games = np.arange(len(boards))[:, None, None]
+        hurls = ((boards[games, landing] == -1) & (lengths < self.steps)
+                 & (lengths < self._line_lengths(boards, sources, Piece.DWARF))
+                 & (dwarves & can_move)[:, None, :])
+        weights = weights.astype(np.int32)
+        weights += (hurls[:, :, None, :]
+                    & (np.arange(self.steps)[None, None, :, None] == lengths[:, :, None, :]))
+        return weights, squares
+
+    def troll_weights(self, boards, sources) -> 'tuple[np.ndarray, np.ndarray, np.ndarray]':
+        """
+        @param sources: the squares of the trolls (see _sources)
+        @return: (weights, move weights, squares). weights[g, d, k, p] is the weight of the troll
+        actions, move_weights[g, d, p] the part of weights[g, d, 0, p] due to (non shove) troll moves
+        and squares the square each entry lands on
+        """
+        squares, rays, _ = self._empty_rays(boards, sources)
+        trolls = boards[np.arange(len(boards))[:, None], sources] == -1
+        adjacent_dwarves = (boards == 1)[:, self.neighbours].sum(axis=1)
+        # adjacent dwarves of the square each action lands on
+        landing_dwarves = adjacent_dwarves[np.arange(len(boards))[:, None, None, None], squares]
+        if self.max_captures_only:
+            captures = np.maximum(landing_dwarves[:, :, 0, :], 1)
+        else:
+            captures = 1 + landing_dwarves[:, :, 0, :]
+        move_weights = ((rays[:, :, 0, :] & trolls[:, None, :]) * captures).astype(np.int32)
+        line_lengths = self._line_lengths(boards, sources, Piece.TROLL)
+        shoves = (rays & (trolls[:, None, :] & (line_lengths >= 2))[:, :, None, :]
+                  & (np.arange(self.steps)[None, None, :, None] < line_lengths[:, :, None, :])
+                  & (landing_dwarves > 0))
+        if self.max_captures_only:
+            weights = shoves.astype(np.int32)
+        else:
+            weights = (shoves * ((1 << landing_dwarves) - 1)).astype(np.int32)
+        weights[:, :, 0, :] += move_weights
+        return weights, move_weights, squares
+
+    def _choose(self, weights) -> 'tuple[np.ndarray, np.ndarray, np.ndarray]':
+        """
+        Choose an action of each game uniformly.
+        @return: (chosen, position, remainder): chosen is True for games with an action,
+        position is the flat index of its (direction, distance, source) entry and remainder
+        picks which of the actions of that entry it is (0 <= remainder < weight)
+        """
+        flat = weights.reshape(len(weights), -1)
+        cumulative = flat.cumsum(axis=1)
+        totals = cumulative[:, -1]
+        chosen = totals > 0
+        draws = (self.rng.random(len(weights)) * totals).astype(np.int64)
+        position = (cumulative > draws[:, None]).argmax(axis=1)
+        remainder = draws - (cumulative[np.arange(len(weights)), position]
+                             - flat[np.arange(len(weights)), position])
+        return chosen, position, remainder
+
+    def step(self, boards, turns) -> np.ndarray:
+        """
+        Make a random valid action on each board (in place) and move on the turn numbers.
+        Boards with no valid action are left as they are.
+        @return: bool array, True for the boards an action was made on
+        """
+        made = np.zeros(len(boards), dtype=bool)
+        dwarf_turn = turns % 2 > 0
+        for games, step in ((np.flatnonzero(dwarf_turn), self._dwarf_step),
+                            (np.flatnonzero(~dwarf_turn), self._troll_step)):
+            if len(games) > 0:
+                sub_boards = boards[games]
+                made[games] = step(sub_boards)
+                boards[games] = sub_boards
+        turns[made] += 1
+        return made
+
+    def _dwarf_step(self, boards) -> np.ndarray:
+        sources = self._sources(boards, Piece.DWARF)
+        weights, squares = self.dwarf_weights(boards, sources)
+        chosen, position, _ = self._choose(weights)
+        games = np.flatnonzero(chosen)
+        d, k, p = np.unravel_index(position[games], weights.shape[1:])
+        # landing on a troll captures it
+        boards[games, squares[games, d, k, p]] = 1
+        boards[games, sources[games, p]] = 0
+        return chosen
+
+    def _troll_step(self, boards) -> np.ndarray:
+        sources = self._sources(boards, Piece.TROLL)
+        weights, move_weights, squares = self.troll_weights(boards, sources)
+        chosen, position, remainder = self._choose(weights)
+        games = np.flatnonzero(chosen)
+        remainder = remainder[games]
+        d, k, p = np.unravel_index(position[games], weights.shape[1:])
+        target = squares[games, d, k, p]
+        # the chosen entry holds the moves (first) then the shoves landing on target
+        move_weight = np.where(k == 0, move_weights[games, d, p], 0)
+        is_move = remainder < move_weight
+
+        adjacent = self.neighbours[:, target].T
+        is_dwarf = boards[games[:, None], adjacent] == 1
+        rank = np.cumsum(is_dwarf, axis=1) - 1
+        if self.max_captures_only:
+            subset = (1 << is_dwarf.sum(axis=1)) - 1
+        else:
+            subset = remainder - move_weight + 1
+        # a move captures the remainder'th adjacent dwarf (none if remainder = number of dwarves),
+        # a shove captures the dwarves whose bit is set in subset
+        captured = is_dwarf & np.where(is_move[:, None], rank == remainder[:, None],
+                                       (subset[:, None] >> np.maximum(rank, 0)) & 1 > 0)
+        capture_games, capture_directions = np.nonzero(captured)
+        boards[games[capture_games], adjacent[capture_games, capture_directions]] = 0
+        boards[games, target] = -1
+        boards[games, sources[games, p]] = 0
+        return chosen
+
+    def playout(self, boards, turns) -> 'tuple[np.ndarray, np.ndarray]':
+        """
+        Play every game to the end with random actions (changes the arrays in place)
+        @return: the final (boards, turns)
+        """
+        active = ~self.game_over(boards, turns)
+        while active.any():
+            games = np.flatnonzero(active)
+            sub_boards, sub_turns = boards[games], turns[games]
+            made = self.step(sub_boards, sub_turns)
+            boards[games], turns[games] = sub_boards, sub_turns
+            active[games] = made & ~self.game_over(sub_boards, sub_turns)
+        return boards, turns
+
+    def simulate(self, states, pieces) -> np.ndarray:
+        """
+        Play random games from every state and return their results.
+        @param states: the states to start from, they aren't changed
+        @param pieces: the piece to give the result of each game for
+        @return: array of state.results(piece) of the end of each game
+        """
+        boards, turns = self.playout(*self.load(states))
+        return self.results(boards) * np.array([piece.value for piece in pieces])
@@ -0,0 +1,362 @@
+from typing import Generator
+
+import numpy as np
+
+from .boardTables import DIRECTIONS
+from .enums import Piece
+from .grid import STANDARD_BOARD
+from .zobrist import board_key, piece_key
+
+"""
+Bitboard grid for game of thud.
+The board is stored as python ints, one bit per square:
+- dwarves: squares holding a dwarf
+- trolls: squares holding a troll
+- playable: squares a piece can stand on
+
+Each row of the board is followed by a guard bit that is never playable,
+so shifting a bitboard one square sideways can't wrap onto the next row.
+Square (x, y) (1 indexed) is bit (x - 1) * width + (y - 1) where width = columns + 1.
+
+BitboardGrid has the same accessor methods as Grid so it can be used by ThudGameState,
+eg. ThudGameState(grid_type=BitboardGrid)
+
+The per square accessors (get_empty_ray, get_line_length, ...) still look at one square per step.
+rays, lines and adjacent_planes work on every piece at once, one shift per direction and step,
+and are what ThudGameState.valid_packed_actions uses with this grid.
+"""
+
+class BitboardGrid:
+    def __init__(self, **kwargs) -> None:
+        """
+        possible args are:
+        "dwarves", "trolls", "playable", "dimensions", "zobrist_key", "counts"
+
+        counts holds the number of dwarves and trolls, updated by set_piece
+        """
+        if len(kwargs) < 1:
+            self.dwarves = 0
+            self.trolls = 0
+            self.playable = 0
+            self.dimensions = (0, 0)
+            self.width = 1
+            self.zobrist_key = 0
+            self.counts = {Piece.DWARF: 0, Piece.TROLL: 0}
+        else:
+            self.init_args(**kwargs)
+
+    def init_args(self, **kwargs) -> None:
+        self.dwarves = kwargs['dwarves']
+        self.trolls = kwargs['trolls']
+        self.playable = kwargs['playable']
+        self.dimensions = kwargs['dimensions']
+        self.width = self.dimensions[1] + 1
+        self.zobrist_key = kwargs.get('zobrist_key')
+        if self.zobrist_key is None:
+            self.zobrist_key = board_key(self._locations(self.dwarves), self._locations(self.trolls))
+        self.counts = kwargs.get('counts') or self._count_bits()
+
+    def create_start_standard_board(self):
+        """ set up a standard board"""
+        self.board_from_template([[Piece(s) for s in row] for row in STANDARD_BOARD])
+
+    def board_from_template(self, template):
+        """
+        create a grid with input board
+        - board = N*M array containing pieces in given location
+        """
+        self.dimensions = len(template), len(template[0])
+        self.width = self.dimensions[1] + 1
+        self.dwarves = self.trolls = self.playable = 0
+        for x, row in enumerate(template):
+            for y, content in enumerate(row):
+                bit = 1 << (x * self.width + y)
+                if content != Piece.NON_PLAYABLE:
+                    self.playable |= bit
+                if content == Piece.DWARF:
+                    self.dwarves |= bit
+                elif content == Piece.TROLL:
+                    self.trolls |= bit
+        self.zobrist_key = board_key(self._locations(self.dwarves), self._locations(self.trolls))
+        self.counts = self._count_bits()
+
+    def _count_bits(self) -> dict:
+        return {Piece.DWARF: bin(self.dwarves).count('1'), Piece.TROLL: bin(self.trolls).count('1')}
+
+    def _index(self, x, y) -> int:
+        """ return the bit index of (x, y) or -1 if (x, y) isn't on the board """
+        x_dimension, y_dimension = self.dimensions
+        if x < 1 or x > x_dimension or y < 1 or y > y_dimension:
+            return -1
+        return (x - 1) * self.width + (y - 1)
+
+    def _location(self, index) -> tuple:
+        """ return the (x, y) location of a bit index """
+        x, y = divmod(index, self.width)
+        return (x + 1, y + 1)
+
+    def _locations(self, bitboard) -> 'list[tuple]':
+        """ return the locations of all set bits in a bitboard, lowest bit first """
+        return [self._location(index) for index in self.indices(bitboard)]
+
+    @staticmethod
+    def indices(bitboard) -> 'list[int]':
+        """ return the bit indices of all set bits in a bitboard, lowest bit first """
+        indices = []
+        while bitboard:
+            lowest = bitboard & -bitboard
+            indices.append(lowest.bit_length() - 1)
+            bitboard ^= lowest
+        return indices
+
+    def step(self, ix, iy) -> int:
+        """ @return: the difference in bit index of one square in direction (ix, iy) """
+        return ix * self.width + iy
+
+    def shift(self, bitboard, ix, iy) -> int:
+        """
+        Move every set bit of the bitboard one square in direction (ix, iy).
+        Bits which leave the playable area are dropped.
+        """
+        step = ix * self.width + iy
+        shifted = bitboard << step if step > 0 else bitboard >> -step
+        return shifted & self.playable
+
+    def neighbours(self, bitboard) -> int:
+        """ return the bitboard of all playable squares adjacent to a set bit of the input """
+        result = 0
+        for ix, iy in DIRECTIONS:
+            result |= self.shift(bitboard, ix, iy)
+        return result
+
+    def rays(self, sources, ix, iy, length=None) -> 'list[int]':
+        """
+        Shift every source in direction (ix, iy) at once, for as long as it lands on empty squares.
+        @param length: most squares to shift by, no limit if None
+        @return: list of bitboards, element k - 1 holds the empty squares k squares from a source
+        with only empty squares in between. The list stops at the first empty bitboard.
+        """
+        empty = self.empty
+        step = ix * self.width + iy
+        rays = []
+        ray = (sources << step if step > 0 else sources >> -step) & empty
+        while ray and (length is None or len(rays) < length):
+            rays.append(ray)
+            ray = (ray << step if step > 0 else ray >> -step) & empty
+        return rays
+
+    def lines(self, pieces, ix, iy) -> 'list[int]':
+        """
+        @return: list of bitboards, element j - 1 holds the pieces followed by at least j - 1 more
+        pieces in direction (ix, iy), ie. the pieces starting a line of j or more.
+        The list stops at the first empty bitboard.
+        """
+        lines = []
+        line = pieces
+        while line:
+            lines.append(line)
+            line = pieces & self.shift(line, -ix, -iy)
+        return lines
+
+    def adjacent_planes(self, piece) -> 'list[int]':
+        """
+        @return: list of 8 bitboards, one per direction in DIRECTIONS. Element i holds the squares
+        whose neighbour in direction DIRECTIONS[i] contains the given piece, so bit i of
+        get_adjacent_mask(x, y, piece) is bit (x, y) of element i.
+        """
+        pieces = self._bitboard(piece)
+        return [self.shift(pieces, -ix, -iy) for ix, iy in DIRECTIONS]
+
+    @property
+    def empty(self) -> int:
+        """ bitboard of the playable squares with no piece on them """
+        return self.playable & ~(self.dwarves | self.trolls)
+
+    def _bitboard(self, piece) -> int:
+        if piece == Piece.DWARF:
+            return self.dwarves
+        elif piece == Piece.TROLL:
+            return self.trolls
+        elif piece == Piece.EMPTY:
+            return self.empty
+        else:
+            return 0
+
+    def get_piece(self, x, y):
+        """
+        return the piece at (x, y)
+        if x, y not on the board, return NON_PLAYABLE type
+        """
+        index = self._index(x, y)
+        if index < 0:
+            return Piece.NON_PLAYABLE
+        bit = 1 << index
+        if self.dwarves & bit:
+            return Piece.DWARF
+        elif self.trolls & bit:
+            return Piece.TROLL
+        elif self.playable & bit:
+            return Piece.EMPTY
+        return Piece.NON_PLAYABLE
+
+    def get_adj(self, x, y) -> Generator:
+        return ((x + ix, y + iy) for ix, iy in DIRECTIONS)
+
+    def get_empty_ray(self, x, y, ix, iy) -> 'list[tuple]':
+        """
+        Shift the bit at (x, y) in direction (ix, iy) until it no longer lands on an empty square
+        @return: list of the empty locations passed over (not including (x, y))
+        """
+        index = self._index(x, y)
+        if index < 0:
+            return []
+        empty = self.empty
+        width = self.width
+        step = ix * width + iy
+        ray = []
+        # shifting by a negative step is done with a right shift
+        bit = (1 << index << step if step > 0 else 1 << index >> -step) & empty
+        while bit:
+            x, y = divmod(bit.bit_length() - 1, width)
+            ray.append((x + 1, y + 1))
+            bit = (bit << step if step > 0 else bit >> -step) & empty
+        return ray
+
+    def get_line_length(self, x, y, ix, iy, piece) -> int:
+        """
+        @return: number of consecutive pieces of type piece starting at (x, y) in direction (ix, iy)
+        """
+        index = self._index(x, y)
+        pieces = self._bitboard(piece)
+        if index < 0 or pieces == 0:
+            return 0
+        step = ix * self.width + iy
+        length = 0
+        bit = (1 << index) & pieces
+        while bit:
+            length += 1
+            bit = (bit << step if step > 0 else bit >> -step) & pieces
+        return length
+
+    def get_adjacent(self, x, y, piece) -> 'list[tuple]':
+        """
+        @return: list of locations adjacent to (x, y) containing the given piece
+        """
+        index = self._index(x, y)
+        if index < 0:
+            return []
+        return self._locations(self.neighbours(1 << index) & self._bitboard(piece))
+
+    def get_adjacent_mask(self, x, y, piece) -> int:
+        """
+        @return: neighbour mask (see boardTables) of the locations adjacent to (x, y) containing the given piece
+        """
+        index = self._index(x, y)
+        if index < 0:
+            return 0
+        pieces = self._bitboard(piece) & self.playable
+        mask = 0
+        for i, (ix, iy) in enumerate(DIRECTIONS):
+            neighbour = index + ix * self.width + iy
+            if neighbour >= 0 and pieces >> neighbour & 1:
+                mask |= 1 << i
+        return mask
+
+    def set_piece(self, x, y, piece):
+        """
+        Set the piece at location to the input piece.
+        If (x,y) isn't on the board or the piece is the non_playable piece, return NON_PLAYABLE
+        @return the replaced piece
+        """
+        if piece == Piece.NON_PLAYABLE:
+            return Piece.NON_PLAYABLE
+        returnPiece = self.get_piece(x, y)
+        if returnPiece == Piece.NON_PLAYABLE:
+            return returnPiece
+        bit = 1 << self._index(x, y)
+        self.dwarves &= ~bit
+        self.trolls &= ~bit
+        if piece == Piece.DWARF:
+            self.dwarves |= bit
+        elif piece == Piece.TROLL:
+            self.trolls |= bit
+        if returnPiece in self.counts:
+            self.counts[returnPiece] -= 1
+        if piece in self.counts:
+            self.counts[piece] += 1
+        self.zobrist_key ^= piece_key(returnPiece, x, y) ^ piece_key(piece, x, y)
+        return returnPiece
+
+    def remove_piece(self, x, y):
+        """ replace piece at x,y with empty and return piece.
+        if x,y is not playable, return NON_PLAYABLE piece """
+        return self.set_piece(x, y, Piece.EMPTY)
+
+    def move_piece(self, from_x, from_y, to_x, to_y) -> Piece:
+        """
+        Move piece at (from_x, from_y) to (to_x, to_y)
+        Provided both are valid locations and theres a piece to move
+        If the move is invalid, return NON_PLAYABLE piece
+        @return the old piece at to_x, to_Y
+        """
+        move_piece = self.get_piece(from_x, from_y)
+        return_piece = self.get_piece(to_x, to_y)
+        if move_piece == Piece.EMPTY or move_piece == Piece.NON_PLAYABLE or return_piece == Piece.NON_PLAYABLE:
+            return Piece.NON_PLAYABLE
+        self.set_piece(to_x, to_y, move_piece)
+        self.remove_piece(from_x, from_y)
+        return return_piece
+
+    def count(self, piece) -> int:
+        """
+        @return: number of locations holding the piece, O(1) for dwarves and trolls
+        """
+        if piece in self.counts:
+            return self.counts[piece]
+        return len(self.get_piece_list(piece))
+
+    def get_piece_list(self, piece):
+        if piece == Piece.NON_PLAYABLE:
+            x_dimension, y_dimension = self.dimensions
+            return [(x, y) for x in range(1, x_dimension + 1) for y in range(1, y_dimension + 1)
+                    if not self.playable & (1 << self._index(x, y))]
+        return self._locations(self._bitboard(piece))
+
+    @property
+    def pieces(self) -> dict:
+        """ piece lists in the same format as Grid.pieces """
+        return {piece: self.get_piece_list(piece) for piece in Piece}
+
+    @property
+    def board(self) -> 'list[list[Piece]]':
+        """ the board as a 2d list of pieces, in the same format as Grid.board """
+        x_dimension, y_dimension = self.dimensions
+        return [[self.get_piece(x, y) for y in range(1, y_dimension + 1)]
+                for x in range(1, x_dimension + 1)]
+
+    def get_representation(self, out=None) -> np.ndarray:
+        """ dwarf and troll planes in the same format as Grid.get_representation """
+        if out is None:
+            out = np.zeros((2, *self.dimensions), dtype=np.int8)
+        else:
+            out[:] = 0
+        for plane, bitboard in enumerate((self.dwarves, self.trolls)):
+            locations = self._locations(bitboard)
+            if len(locations) > 0:
+                xs, ys = np.array(locations).T
+                out[plane, xs - 1, ys - 1] = 1
+        return out
+
+    def __eq__(self, o: object) -> bool:
+        if not isinstance(o, BitboardGrid):
+            return False
+        else:
+            return (self.dwarves == o.dwarves and
+                    self.trolls == o.trolls and
+                    self.playable == o.playable and
+                    self.dimensions == o.dimensions)
+
+    def deepcopy(self) -> 'BitboardGrid':
+        return BitboardGrid(dwarves=self.dwarves, trolls=self.trolls,
+                            playable=self.playable, dimensions=tuple(self.dimensions),
+                            zobrist_key=self.zobrist_key, counts=dict(self.counts))
@@ -0,0 +1,76 @@
+from .enums import Piece
+
+"""
+Precomputed move generation tables for a board layout.
+Which squares are playable never changes during a game, so the squares a piece could
+reach in each direction only depend on the board template. They're built once per
+template and shared by every grid using that template.
+"""
+
+# the 8 (ix, iy) directions a piece can move in
+DIRECTIONS = [(ix, iy) for ix in (1, 0, -1) for iy in (1, 0, -1) if (ix, iy) != (0, 0)]
+# direction -> index of its ray in BoardTables.rays
+DIRECTION_INDEX = {direction: i for i, direction in enumerate(DIRECTIONS)}
+
+"""
+Neighbour masks: bit i of a mask is set for the neighbour in direction DIRECTIONS[i].
+A troll shove can capture any non empty subset of the dwarves next to where it lands,
+so the subsets only depend on the 8 bit mask of those dwarves.
+"""
+# mask -> the directions of its set bits
+MASK_DIRECTIONS = tuple(tuple(d for i, d in enumerate(DIRECTIONS) if mask >> i & 1) for mask in range(256))
+# mask -> its non empty submasks, largest first
+SUBSETS = tuple(tuple(sub for sub in range(mask, 0, -1) if sub & mask == sub) for mask in range(256))
+
+
+class BoardTables:
+    """
+    For every location (x, y) on the board:
+    - rays[(x, y)]: list of 8 rays, one per direction in DIRECTIONS. A ray is the tuple of playable
+      locations walking from (x, y) (not included) until a non playable location or the edge of the board.
+    - adjacent[(x, y)]: tuple of the playable locations next to (x, y)
+    - adjacent_bits[(x, y)]: tuple of (location, neighbour mask bit) for the same locations
+    """
+
+    def __init__(self, playable) -> None:
+        """
+        @param playable: 2d list, playable[x][y] is True if location (x + 1, y + 1) is playable
+        """
+        self.dimensions = len(playable), len(playable[0])
+        self.rays = {}
+        self.adjacent = {}
+        self.adjacent_bits = {}
+
+        def is_playable(x, y):
+            return (1 <= x <= self.dimensions[0] and 1 <= y <= self.dimensions[1]
+                    and playable[x - 1][y - 1])
+
+        for x in range(1, self.dimensions[0] + 1):
+            for y in range(1, self.dimensions[1] + 1):
+                rays = []
+                for ix, iy in DIRECTIONS:
+                    ray = []
+                    nx, ny = x + ix, y + iy
+                    while is_playable(nx, ny):
+                        ray.append((nx, ny))
+                        nx, ny = nx + ix, ny + iy
+                    rays.append(tuple(ray))
+                self.rays[(x, y)] = rays
+                self.adjacent[(x, y)] = tuple(ray[0] for ray in rays if len(ray) > 0)
+                self.adjacent_bits[(x, y)] = tuple((ray[0], 1 << i) for i, ray in enumerate(rays) if len(ray) > 0)
+
+
+# playable layout -> tables built for it
+_tables = {}
+
+
+def tables_for(board) -> BoardTables:
+    """
+    @param board: 2d list of pieces
+    @return: the tables for the layout of this board, building them the first time a layout is seen
+    """
+    playable = tuple(tuple(piece != Piece.NON_PLAYABLE for piece in row) for row in board)
+    tables = _tables.get(playable)
+    if tables is None:
+        tables = _tables[playable] = BoardTables(playable)
+    return tables
@@ -6,3 +6,15 @@ class Piece(Enum):
     TROLL = -1
     EMPTY = 0
     NON_PLAYABLE = '-'
+
+
+class HistoryPolicy(Enum):
+    """
+    How much of the game leading to a state the state keeps:
+    - NONE: nothing
+    - RING: the zobrist keys and actions of the last few turns (ThudGameState.recent_history)
+    - FULL: the chain of previous states (ThudGameState.previous_state)
+    """
+    NONE = 1
+    RING = 2
+    FULL = 3
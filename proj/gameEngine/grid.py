@@ -2,7 +2,29 @@ from typing import Generator
 
 import numpy as np
 
+from .boardTables import DIRECTION_INDEX, DIRECTIONS, tables_for
 from .enums import Piece
+from .zobrist import board_key, piece_key
+
+# layout of the standard thud board: 1 = dwarf, -1 = troll, 0 = empty, '-' = non playable
+STANDARD_BOARD = [
+    ['-','-','-','-','-',  1,  1,  0,  1,  1,'-','-','-','-','-'],
+    ['-','-','-','-',  1,  0,  0,  0,  0,  0,  1,'-','-','-','-'],
+    ['-','-','-',  1,  0,  0,  0,  0,  0,  0,  0,  1,'-','-','-'],
+    ['-','-',  1,  0,  0,  0,  0,  0,  0,  0,  0,  0,  1,'-','-'],
+    ['-',  1,  0,  0,  0,  0,  0,  0,  0,  0,  0,  0,  0,  1,'-'],
+    [  1,  0,  0,  0,  0,  0,  0,  0,  0,  0,  0,  0,  0,  0,  1],
+    [  1,  0,  0,  0,  0,  0, -1, -1, -1,  0,  0,  0,  0,  0,  1],
+    [  0,  0,  0,  0,  0,  0, -1,'-', -1,  0,  0,  0,  0,  0,  0],
+    [  1,  0,  0,  0,  0,  0, -1, -1, -1,  0,  0,  0,  0,  0,  1],
+    [  1,  0,  0,  0,  0,  0,  0,  0,  0,  0,  0,  0,  0,  0,  1],
+    ['-',  1,  0,  0,  0,  0,  0,  0,  0,  0,  0,  0,  0,  1,'-'],
+    ['-','-',  1,  0,  0,  0,  0,  0,  0,  0,  0,  0,  1,'-','-'],
+    ['-','-','-',  1,  0,  0,  0,  0,  0,  0,  0,  1,'-','-','-'],
+    ['-','-','-','-',  1,  0,  0,  0,  0,  0,  1,'-','-','-','-'],
+    ['-','-','-','-','-',  1,  1,  0,  1,  1,'-','-','-','-','-'],
+]
+
 
 """
 Hexagonal grid for game of thud
@@ -13,7 +35,11 @@ class Grid:
     def __init__(self, **kwargs) -> None:
         """
         possible args are:
-        "board", "pieces", "dimensions"
+        "board", "pieces", "slots", "dimensions", "zobrist_key", "tables"
+
+        pieces[piece] is the list of locations holding piece, in no particular order.
+        slots[piece] maps each of those locations to its index in pieces[piece],
+        so set_piece can remove a location by swapping the last location into its place.
         """
         if len(kwargs) < 1:
             self.board = []
@@ -24,8 +50,11 @@ class Grid:
 
                 Piece.NON_PLAYABLE: []
             }
+            self.slots = {piece: {} for piece in self.pieces}
 
             self.dimensions = 0
+            self.zobrist_key = 0
+            self.tables = None
         else:
             self.init_args(**kwargs)
 
@@ -33,43 +62,43 @@ class Grid:
 
         self.board = kwargs['board']
         self.pieces = kwargs['pieces']
+        self.slots = kwargs.get('slots') or self.index_pieces(self.pieces)
         self.dimensions = kwargs['dimensions']
+        self.zobrist_key = kwargs.get('zobrist_key')
+        if self.zobrist_key is None:
+            self.zobrist_key = board_key(self.pieces[Piece.DWARF], self.pieces[Piece.TROLL])
+        self.tables = kwargs.get('tables') or tables_for(self.board)
 
-    def get_representation(self) -> np.ndarray:
-        dx, dy = self.dimensions
-        dwarves = [[1 if (x, y) in self.pieces[Piece.DWARF]
-                    else 0 for x in range(dx)] for y in range(dy)]
-        trolls = [[1 if (x, y) in self.pieces[Piece.TROLL]
-                   else 0 for x in range(dx)] for y in range(dy)]
-        return [dwarves, trolls]
+    def get_representation(self, out=None) -> np.ndarray:
+        """
+        @param out: (2, x dimension, y dimension) array to write into, a new int8 array if not given
+        @return: out, with out[0] the dwarf plane and out[1] the troll plane:
+            out[0][x - 1, y - 1] is 1 if there's a dwarf at (x, y), else 0
+        """
+        if out is None:
+            out = np.zeros((2, *self.dimensions), dtype=np.int8)
+        else:
+            out[:] = 0
+        for plane, piece in enumerate((Piece.DWARF, Piece.TROLL)):
+            locations = self.pieces[piece]
+            if len(locations) > 0:
+                xs, ys = np.array(locations).T
+                out[plane, xs - 1, ys - 1] = 1
+        return out
 
     def create_start_standard_board(self):
         """ set up a standard board"""
-        board = [
-            ['-','-','-','-','-',  1,  1,  0,  1,  1,'-','-','-','-','-'],
-            ['-','-','-','-',  1,  0,  0,  0,  0,  0,  1,'-','-','-','-'],
-            ['-','-','-',  1,  0,  0,  0,  0,  0,  0,  0,  1,'-','-','-'],
-            ['-','-',  1,  0,  0,  0,  0,  0,  0,  0,  0,  0,  1,'-','-'],
-            ['-',  1,  0,  0,  0,  0,  0,  0,  0,  0,  0,  0,  0,  1,'-'],
-            [  1,  0,  0,  0,  0,  0,  0,  0,  0,  0,  0,  0,  0,  0,  1],
-            [  1,  0,  0,  0,  0,  0, -1, -1, -1,  0,  0,  0,  0,  0,  1],
-            [  0,  0,  0,  0,  0,  0, -1,'-', -1,  0,  0,  0,  0,  0,  0],
-            [  1,  0,  0,  0,  0,  0, -1, -1, -1,  0,  0,  0,  0,  0,  1],
-            [  1,  0,  0,  0,  0,  0,  0,  0,  0,  0,  0,  0,  0,  0,  1],
-            ['-',  1,  0,  0,  0,  0,  0,  0,  0,  0,  0,  0,  0,  1,'-'],
-            ['-','-',  1,  0,  0,  0,  0,  0,  0,  0,  0,  0,  1,'-','-'],
-            ['-','-','-',  1,  0,  0,  0,  0,  0,  0,  0,  1,'-','-','-'],
-            ['-','-','-','-',  1,  0,  0,  0,  0,  0,  1,'-','-','-','-'],
-            ['-','-','-','-','-',  1,  1,  0,  1,  1,'-','-','-','-','-'],
-        ]
 
         self.board = list(map(lambda row: list(
-            map(lambda s: Piece(s), row)), board))
+            map(lambda s: Piece(s), row)), STANDARD_BOARD))
 
         for x, row in enumerate(self.board):
             for y, content in enumerate(row):
                 self.pieces[content].append((x + 1, y + 1))
+        self.slots = self.index_pieces(self.pieces)
         self.dimensions = (len(self.board), len(self.board[0]))
+        self.zobrist_key = board_key(self.pieces[Piece.DWARF], self.pieces[Piece.TROLL])
+        self.tables = tables_for(self.board)
 
     def board_from_template(self, template):
         """
@@ -87,6 +116,14 @@ class Grid:
         for x, row in enumerate(self.board):
             for y, content in enumerate(row):
                 self.pieces[content].append((x + 1, y + 1))
+        self.slots = self.index_pieces(self.pieces)
+        self.zobrist_key = board_key(self.pieces[Piece.DWARF], self.pieces[Piece.TROLL])
+        self.tables = tables_for(self.board)
+
+    @staticmethod
+    def index_pieces(pieces) -> dict:
+        """ @return: piece -> {location: index of location in pieces[piece]} """
+        return {piece: {loc: i for i, loc in enumerate(locs)} for piece, locs in pieces.items()}
 
     def __normalise(self, x, y):
         """ return normalised 0-indexed x & y """
@@ -105,7 +142,56 @@ class Grid:
             return self.board[x][y]
 
     def get_adj(self, x, y) -> Generator:
-        return ((x + ix, y + iy) for ix in (1, 0, -1) for iy in (1, 0, -1) if (ix, iy) != (0, 0))
+        return ((x + ix, y + iy) for ix, iy in DIRECTIONS)
+
+    def get_empty_ray(self, x, y, ix, iy) -> 'list[tuple]':
+        """
+        Walk the precomputed ray from (x, y) in direction (ix, iy) until a non-empty location is found
+        @return: list of the empty locations passed over (not including (x, y))
+        """
+        rays = self.tables.rays.get((x, y))
+        if rays is None:
+            return []
+        board = self.board
+        ray = []
+        for a, b in rays[DIRECTION_INDEX[(ix, iy)]]:
+            if board[a - 1][b - 1] is not Piece.EMPTY:
+                break
+            ray.append((a, b))
+        return ray
+
+    def get_line_length(self, x, y, ix, iy, piece) -> int:
+        """
+        @return: number of consecutive pieces of type piece starting at (x, y) in direction (ix, iy)
+        """
+        rays = self.tables.rays.get((x, y))
+        if rays is None or self.board[x - 1][y - 1] is not piece:
+            return 0
+        board = self.board
+        length = 1
+        for a, b in rays[DIRECTION_INDEX[(ix, iy)]]:
+            if board[a - 1][b - 1] is not piece:
+                break
+            length += 1
+        return length
+
+    def get_adjacent(self, x, y, piece) -> 'list[tuple]':
+        """
+        @return: list of playable locations adjacent to (x, y) containing the given piece
+        """
+        board = self.board
+        return [(a, b) for (a, b) in self.tables.adjacent.get((x, y), ()) if board[a - 1][b - 1] is piece]
+
+    def get_adjacent_mask(self, x, y, piece) -> int:
+        """
+        @return: neighbour mask (see boardTables) of the locations adjacent to (x, y) containing the given piece
+        """
+        board = self.board
+        mask = 0
+        for (a, b), bit in self.tables.adjacent_bits.get((x, y), ()):
+            if board[a - 1][b - 1] is piece:
+                mask |= bit
+        return mask
 
     def set_piece(self, x, y, piece):
         """
@@ -121,9 +207,20 @@ class Grid:
             return returnPiece
         else:
             nx, ny = self.__normalise(x, y)
-            self.pieces[returnPiece].remove((x, y))
+            loc = (x, y)
+            # swap the last location of the old piece's list into the removed slot
+            old_locs = self.pieces[returnPiece]
+            old_slots = self.slots[returnPiece]
+            slot = old_slots.pop(loc)
+            last = old_locs.pop()
+            if last != loc:
+                old_locs[slot] = last
+                old_slots[last] = slot
             self.board[nx][ny] = piece
-            self.pieces[piece].append((x, y))
+            new_locs = self.pieces[piece]
+            self.slots[piece][loc] = len(new_locs)
+            new_locs.append(loc)
+            self.zobrist_key ^= piece_key(returnPiece, x, y) ^ piece_key(piece, x, y)
             return returnPiece
 
     def remove_piece(self, x, y):
@@ -146,19 +243,31 @@ class Grid:
         self.remove_piece(from_x, from_y)
         return return_piece
 
+    def count(self, piece) -> int:
+        """
+        @return: number of locations holding the piece. The piece lists are kept up to date by set_piece, so this is O(1)
+        """
+        return len(self.pieces[piece])
+
     def get_piece_list(self, piece):
+        """
+        The returned list is changed in place by set_piece,
+        copy it before iterating if the grid is changed during the iteration.
+        """
         return self.pieces[piece]
 
     def __eq__(self, o: object) -> bool:
         if not isinstance(o, Grid):
             return False
         else:
+            # the piece lists index the board, so only their order can differ
             return (self.board == o.board and
-                    self.dimensions == o.dimensions and
-                    self.pieces == o.pieces)
+                    self.dimensions == o.dimensions)
 
     def deepcopy(self) -> 'Grid':
         new_board = [x[:] for x in self.board]
         new_pieces = {x: y[:] for x, y in self.pieces.items()}
+        new_slots = {x: y.copy() for x, y in self.slots.items()}
         new_dimensions = tuple(self.dimensions)
-        return Grid(board=new_board, pieces=new_pieces, dimensions=new_dimensions)
+        return Grid(board=new_board, pieces=new_pieces, slots=new_slots, dimensions=new_dimensions,
+                    zobrist_key=self.zobrist_key, tables=self.tables)
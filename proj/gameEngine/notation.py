@@ -0,0 +1,148 @@
+import struct
+
+from .enums import Piece
+from .grid import Grid
+from .state import ThudGameState
+
+"""
+Text and binary notation for thud positions: the board, the side to move, the turn number
+and the number of turns in the game. The history of the game isn't saved.
+
+Text notation, like FEN in chess: 4 space separated fields
+- the board, rows separated by '/', each row a string of d = dwarf, T = troll,
+  - = non playable and digits for a run of that many empty squares
+- the side to move, d or T
+- the turn number
+- the turns per game
+eg. the start position is
+-----dd1dd-----/----d5d----/ ... /-----dd1dd----- d 1 70
+
+Binary notation, a fixed size for a board size:
+- header: rows, columns (1 byte each), turn number, turns per game (2 bytes each, big endian)
+- 2 bits per square, row by row: 0 = empty, 1 = dwarf, 2 = troll, 3 = non playable
+The side to move is given by the turn number. A 15x15 board takes 63 bytes.
+"""
+
+_HEADER = struct.Struct('>BBHH')
+
+_TEXT_SYMBOLS = {Piece.DWARF: 'd', Piece.TROLL: 'T', Piece.NON_PLAYABLE: '-'}
+_TEXT_PIECES = {symbol: piece for piece, symbol in _TEXT_SYMBOLS.items()}
+
+_CODES = {Piece.EMPTY: 0, Piece.DWARF: 1, Piece.TROLL: 2, Piece.NON_PLAYABLE: 3}
+_CODE_PIECES = [Piece.EMPTY, Piece.DWARF, Piece.TROLL, Piece.NON_PLAYABLE]
+
+
+def _board(grid) -> 'list[list[Piece]]':
+    """ @return: the board of any grid type as a 2d list of pieces """
+    rows, columns = grid.dimensions
+    board = [[Piece.EMPTY] * columns for _ in range(rows)]
+    for piece in (Piece.DWARF, Piece.TROLL, Piece.NON_PLAYABLE):
+        for x, y in grid.get_piece_list(piece):
+            board[x - 1][y - 1] = piece
+    return board
+
+
+def _state(board, turn_number, turns_per_game, grid_type, **kwargs) -> ThudGameState:
+    grid = grid_type()
+    grid.board_from_template(board)
+    return ThudGameState(grid=grid, turn_number=turn_number, turns_per_game=turns_per_game,
+                         grid_type=grid_type, **kwargs)
+
+
+def to_text(state) -> str:
+    """
+    @return: the position in text notation
+    """
+    rows = []
+    for row in _board(state.grid):
+        text = []
+        empty = 0
+        for piece in row:
+            if piece == Piece.EMPTY:
+                empty += 1
+                continue
+            if empty:
+                text.append(str(empty))
+                empty = 0
+            text.append(_TEXT_SYMBOLS[piece])
+        if empty:
+            text.append(str(empty))
+        rows.append(''.join(text))
+    side = _TEXT_SYMBOLS[state.turn]
+    return f"{'/'.join(rows)} {side} {state.turn_number} {state.turns_per_game}"
+
+
+def from_text(text, grid_type=Grid, **kwargs) -> ThudGameState:
+    """
+    @param text: a position in text notation
+    @param grid_type: the grid class of the new state
+    @param kwargs: other ThudGameState arguments, eg. max_captures_only or history_policy
+    @return: a new state with the position
+    """
+    try:
+        board_text, side, turn_number, turns_per_game = text.split()
+        turn_number, turns_per_game = int(turn_number), int(turns_per_game)
+    except ValueError:
+        raise ValueError(f"can't read position '{text}': expected board, side to move, turn and turns per game")
+    board = []
+    for row_text in board_text.split('/'):
+        row = []
+        digits = ''
+        for symbol in row_text:
+            if symbol.isdigit():
+                digits += symbol
+                continue
+            if digits:
+                row.extend([Piece.EMPTY] * int(digits))
+                digits = ''
+            if symbol not in _TEXT_PIECES:
+                raise ValueError(f"can't read position '{text}': unknown piece '{symbol}'")
+            row.append(_TEXT_PIECES[symbol])
+        if digits:
+            row.extend([Piece.EMPTY] * int(digits))
+        board.append(row)
+    if any(len(row) != len(board[0]) for row in board):
+        raise ValueError(f"can't read position '{text}': rows have different lengths")
+    if _TEXT_PIECES.get(side) != (Piece.DWARF if turn_number % 2 > 0 else Piece.TROLL):
+        raise ValueError(f"can't read position '{text}': side to move '{side}' doesn't match turn {turn_number}")
+    return _state(board, turn_number, turns_per_game, grid_type, **kwargs)
+
+
+def to_bytes(state) -> bytes:
+    """
+    @return: the position in binary notation
+    """
+    rows, columns = state.grid.dimensions
+    squares = rows * columns
+    bits = 0
+    for piece in (Piece.DWARF, Piece.TROLL, Piece.NON_PLAYABLE):
+        code = _CODES[piece]
+        for x, y in state.grid.get_piece_list(piece):
+            bits |= code << 2 * ((x - 1) * columns + y - 1)
+    return (_HEADER.pack(rows, columns, state.turn_number, state.turns_per_game)
+            + bits.to_bytes((squares + 3) // 4, 'little'))
+
+
+def from_bytes(data, grid_type=Grid, **kwargs) -> ThudGameState:
+    """
+    @param data: a position in binary notation
+    @param grid_type: the grid class of the new state
+    @param kwargs: other ThudGameState arguments, eg. max_captures_only or history_policy
+    @return: a new state with the position
+    """
+    if len(data) < _HEADER.size:
+        raise ValueError(f'a position takes at least {_HEADER.size} bytes, got {len(data)}')
+    rows, columns, turn_number, turns_per_game = _HEADER.unpack_from(data)
+    size = _HEADER.size + (rows * columns + 3) // 4
+    if len(data) != size:
+        raise ValueError(f'a {rows}x{columns} position takes {size} bytes, got {len(data)}')
+    bits = int.from_bytes(data[_HEADER.size:], 'little')
+    board = [[_CODE_PIECES[bits >> 2 * (x * columns + y) & 3] for y in range(columns)] for x in range(rows)]
+    return _state(board, turn_number, turns_per_game, grid_type, **kwargs)
+
+
+def size_in_bytes(dimensions=(15, 15)) -> int:
+    """
+    @return: the size of the binary notation of a position on a board of these dimensions
+    """
+    return _HEADER.size + (dimensions[0] * dimensions[1] + 3) // 4
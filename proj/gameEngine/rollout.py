@@ -0,0 +1,280 @@
+import random
+
+from .boardTables import DIRECTIONS, SUBSETS
+from .enums import Piece
+from .grid import STANDARD_BOARD
+from .state import MoveType, capture_bit, pack_locations
+
+"""
+Single game random playouts without building actions.
+RolloutEngine plays a game to the end on a bytearray board, so a ply doesn't create Action
+objects, action lists or new states. Each ply samples one valid action directly:
+- the pieces of the side to move are tried from a random one onwards, skipping pieces that can't move
+- the directions of that piece are tried from a random one onwards, skipping directions with no actions
+- one of the actions of the piece in that direction is chosen uniformly
+So every valid action can be played, but unlike MCTSRandAgent.simulation_policy the choice isn't
+uniform over all the actions: like MCTSUnequalAgent it picks a piece first.
+
+The board is padded with a ring of non playable squares and flattened like BatchPlayout's,
+square (x, y) (1 indexed) is x * (columns + 2) + y.
+
+A RolloutEngine is a simulation policy: engine(state) plays the state to the end and returns it.
+If the state keeps a HistoryPolicy.RING history, the packed actions played are added to its
+recent_history like ThudGameState.make does, with None for the zobrist keys, which the engine doesn't compute.
+"""
+
+EMPTY = 0
+DWARF = 1
+TROLL = 2
+BLOCKED = 3
+
+
+class RolloutEngine:
+
+    def __init__(self, board=None, seed=None, max_captures_only=False) -> None:
+        """
+        @param board: 2d list of pieces giving the layout of the board, defaults to the standard board
+        @param seed: seed of the random generator
+        @param max_captures_only: play with the actions of ThudGameState(max_captures_only=True)
+        """
+        if board is None:
+            board = [[Piece(s) for s in row] for row in STANDARD_BOARD]
+        self.dimensions = len(board), len(board[0])
+        self.max_captures_only = max_captures_only
+        self.rng = random.Random(seed)
+        rows, columns = self.dimensions
+        self.width = columns + 2
+        self.empty_board = bytearray([BLOCKED]) * ((rows + 2) * self.width)
+        for x, row in enumerate(board):
+            for y, piece in enumerate(row):
+                if piece != Piece.NON_PLAYABLE:
+                    self.empty_board[self._index(x + 1, y + 1)] = EMPTY
+        # step of each direction, in the order of DIRECTIONS so neighbour masks match boardTables
+        self.offsets = tuple(ix * self.width + iy for ix, iy in DIRECTIONS)
+        # number of captures choices in a shove landing next to the dwarves of a neighbour mask
+        self.shove_choices = tuple((1 if mask else 0) if max_captures_only else len(SUBSETS[mask])
+                                   for mask in range(256))
+        self.board = bytearray(self.empty_board)
+        # square -> index of the square in the piece list of the piece on it
+        self.slots = [0] * len(self.board)
+        self.pieces = {DWARF: [], TROLL: []}
+        self.turn_number = 1
+        # (from square, to square, move type, captured squares) of each ply since load, None if not recorded
+        self.moves = None
+        self._captured = []
+
+    def _index(self, x, y) -> int:
+        """ @return: the square of location (x, y) """
+        return x * self.width + y
+
+    def seed(self, seed) -> None:
+        self.rng.seed(seed)
+
+    def load(self, state) -> None:
+        """
+        Set up the board from a state on a board with this layout
+        """
+        self.board = board = bytearray(self.empty_board)
+        slots = self.slots
+        for code, piece in ((DWARF, Piece.DWARF), (TROLL, Piece.TROLL)):
+            squares = [self._index(x, y) for x, y in state.get_locations(piece)]
+            for i, square in enumerate(squares):
+                board[square] = code
+                slots[square] = i
+            self.pieces[code] = squares
+        self.turn_number = state.turn_number
+        self.moves = [] if getattr(state, 'recent_history', None) is not None else None
+        self._captured = []
+
+    def store(self, state) -> None:
+        """
+        Write the board and the turn number back into the state
+        """
+        rows, columns = self.dimensions
+        codes = [Piece.EMPTY, Piece.DWARF, Piece.TROLL, Piece.NON_PLAYABLE]
+        board = self.board
+        state.grid.board_from_template([[codes[board[self._index(x, y)]] for y in range(1, columns + 1)]
+                                        for x in range(1, rows + 1)])
+        state.turn_number = self.turn_number
+        state.turn = Piece.DWARF if self.turn_number % 2 > 0 else Piece.TROLL
+        if self.moves is not None and getattr(state, 'recent_history', None) is not None:
+            state.recent_history.extend((None, self._packed(move)) for move in self.moves)
+
+    def _location(self, square) -> tuple:
+        """ @return: the location (x, y) of the square """
+        return divmod(square, self.width)
+
+    def _packed(self, move) -> int:
+        """ @return: the packed action of a recorded move """
+        from_square, to_square, movetype, captured = move
+        to_loc = self._location(to_square)
+        code = pack_locations(self._location(from_square), to_loc, movetype)
+        for square in captured:
+            code |= capture_bit(to_loc, self._location(square))
+        return code
+
+    def _played(self, from_square, to_square, movetype) -> None:
+        """ record the ply, if the moves are recorded """
+        if self.moves is not None:
+            self.moves.append((from_square, to_square, movetype, self._captured))
+            self._captured = []
+
+    def _remove(self, square) -> None:
+        """ take the piece on the square off the board """
+        pieces = self.pieces[self.board[square]]
+        slot = self.slots[square]
+        if self.moves is not None:
+            self._captured.append(square)
+        last = pieces.pop()
+        if last != square:
+            pieces[slot] = last
+            self.slots[last] = slot
+        self.board[square] = EMPTY
+
+    def _move(self, from_square, to_square) -> None:
+        """ move the piece on from_square to the empty to_square """
+        board = self.board
+        piece = board[from_square]
+        slot = self.slots[from_square]
+        self.pieces[piece][slot] = to_square
+        self.slots[to_square] = slot
+        board[to_square] = piece
+        board[from_square] = EMPTY
+
+    def _line_length(self, square, offset, piece) -> int:
+        """ @return: number of consecutive pieces starting at the square and stepping by offset """
+        board = self.board
+        length = 0
+        while board[square] == piece:
+            length += 1
+            square += offset
+        return length
+
+    def _dwarf_mask(self, square) -> int:
+        """ @return: neighbour mask (see boardTables) of the dwarves next to the square """
+        board = self.board
+        mask = 0
+        for i, offset in enumerate(self.offsets):
+            if board[square + offset] == DWARF:
+                mask |= 1 << i
+        return mask
+
+    def _capture(self, square, mask) -> None:
+        """ remove the dwarves next to the square in the neighbour mask """
+        for i, offset in enumerate(self.offsets):
+            if mask >> i & 1:
+                self._remove(square + offset)
+
+    def _dwarf_direction(self, square, offset) -> bool:
+        """ make a random dwarf action from the square in the direction, if there is one """
+        board = self.board
+        target = square + offset
+        moves = 0
+        while board[target] == EMPTY:
+            moves += 1
+            target += offset
+        hurl = board[target] == TROLL and moves + 1 <= self._line_length(square, -offset, DWARF)
+        choices = moves + hurl
+        if choices == 0:
+            return False
+        choice = int(self.rng.random() * choices)
+        if choice < moves:
+            self._move(square, square + (choice + 1) * offset)
+            self._played(square, square + (choice + 1) * offset, MoveType.DWARF_MOVE)
+        else:
+            self._remove(target)
+            self._move(square, target)
+            self._played(square, target, MoveType.DWARF_HURL)
+        return True
+
+    def _troll_direction(self, square, offset) -> bool:
+        """ make a random troll action from the square in the direction, if there is one """
+        board = self.board
+        target = square + offset
+        if board[target] != EMPTY:
+            # the troll can neither step nor be shoved this way
+            return False
+        mask = self._dwarf_mask(target)
+        captures = bin(mask).count('1')
+        choices = captures + (1 if captures == 0 or not self.max_captures_only else 0)
+        line_length = self._line_length(square, -offset, TROLL)
+        shoves = 0
+        if line_length >= 2:
+            landing = target
+            for _ in range(line_length):
+                if board[landing] != EMPTY:
+                    break
+                shoves += self.shove_choices[self._dwarf_mask(landing)]
+                landing += offset
+        choice = int(self.rng.random() * (choices + shoves))
+        if choice < choices:
+            # step one square, capturing the choice-th adjacent dwarf (or none)
+            if choice < captures:
+                for i in range(8):
+                    if mask >> i & 1:
+                        if choice == 0:
+                            self._remove(target + self.offsets[i])
+                            break
+                        choice -= 1
+            self._move(square, target)
+            self._played(square, target, MoveType.TROLL_MOVE)
+            return True
+        choice -= choices
+        landing = target
+        while True:
+            landing_mask = self._dwarf_mask(landing)
+            landing_choices = self.shove_choices[landing_mask]
+            if choice < landing_choices:
+                self._capture(landing, landing_mask if self.max_captures_only else SUBSETS[landing_mask][choice])
+                self._move(square, landing)
+                self._played(square, landing, MoveType.TROLL_SHOVE)
+                return True
+            choice -= landing_choices
+            landing += offset
+
+    def step(self) -> bool:
+        """
+        Make a random valid action for the side to move and move on the turn
+        @return: False if the side to move has no valid action (nothing is changed)
+        """
+        board = self.board
+        piece = DWARF if self.turn_number % 2 > 0 else TROLL
+        act = self._dwarf_direction if piece == DWARF else self._troll_direction
+        pieces = self.pieces[piece]
+        offsets = self.offsets
+        count = len(pieces)
+        rng = self.rng
+        first_piece = int(rng.random() * count)
+        for i in range(count):
+            square = pieces[(first_piece + i) % count]
+            # a piece with no empty neighbour can't move, hurl or shove
+            if all(board[square + offset] != EMPTY for offset in offsets):
+                continue
+            first_direction = int(rng.random() * 8)
+            for j in range(8):
+                if act(square, offsets[(first_direction + j) & 7]):
+                    self.turn_number += 1
+                    return True
+        return False
+
+    def playout(self, turns_per_game) -> int:
+        """
+        Play random actions until the game is over
+        @return: the material balance at the end, dwarf score - troll score
+        """
+        pieces = self.pieces
+        while self.turn_number <= turns_per_game and pieces[DWARF] and pieces[TROLL]:
+            if not self.step():
+                break
+        return len(pieces[DWARF]) - 4 * len(pieces[TROLL])
+
+    def __call__(self, state):
+        """
+        Simulation policy: play the state to the end
+        @param state: a clean state (not one in a search tree), changed in place
+        @return: the state at the end of the game
+        """
+        self.load(state)
+        self.playout(state.turns_per_game)
+        self.store(state)
+        return state
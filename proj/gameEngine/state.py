@@ -2,11 +2,15 @@ from typing import Generator
 from dataclasses import dataclass
 from enum import Enum
 from abc import abstractmethod
+from collections import deque
+from itertools import combinations
 import numpy as np
-from Powerset import powerset
 
-from .enums import Piece
+from .boardTables import DIRECTION_INDEX, DIRECTIONS, MASK_DIRECTIONS, SUBSETS
+from .bitboardGrid import BitboardGrid
+from .enums import HistoryPolicy, Piece
 from .grid import Grid
+from .zobrist import SIDE_KEY
 
 
 class MoveType(Enum):
@@ -23,7 +27,7 @@ class MoveType(Enum):
     TROLL_SHOVE = 4
 
 
-@dataclass(unsafe_hash=True)
+@dataclass
 class Action:
     """
     An action consists of:
@@ -44,6 +48,171 @@ class Action:
     def __repr__(self) -> str:
         return str(self)
 
+    def __hash__(self) -> int:
+        # hash as the packed action so an Action and an equal PackedAction hash the same
+        try:
+            return hash(pack_action(self))
+        except (ValueError, TypeError, AttributeError):
+            return hash((self.from_loc, self.to_loc, frozenset(self.capture), self.movetype))
+
+
+"""
+Packed actions.
+An action can be packed into a single int:
+- bits 0-19: from x, from y, to x, to y (5 bits each, so boards up to 31x31)
+- bits 20-21: move type
+- bits 22-30: capture mask. bit 22 + i is set if the location next to the end location
+  in direction DIRECTIONS[i] is captured, bit 30 if the end location itself is captured
+Every capture in thud is next to or on the end location, so any valid action can be packed.
+"""
+_LOC_BITS = 5
+_LOC_MASK = (1 << _LOC_BITS) - 1
+_TYPE_SHIFT = 4 * _LOC_BITS
+_CAPTURE_SHIFT = _TYPE_SHIFT + 2
+_CAPTURE_END = 1 << (_CAPTURE_SHIFT + len(DIRECTIONS))
+_MOVETYPES = list(MoveType)
+_MOVE_KEY_MASK = (1 << _TYPE_SHIFT) - 1
+_TYPE_BITS = {movetype: (movetype.value - 1) << _TYPE_SHIFT for movetype in MoveType}
+
+
+def pack_locations(from_loc, to_loc, movetype: MoveType) -> int:
+    """ @return: packed action with no captures """
+    (from_x, from_y), (to_x, to_y) = from_loc, to_loc
+    return (from_x | from_y << _LOC_BITS | to_x << 2 * _LOC_BITS | to_y << 3 * _LOC_BITS
+            | (movetype.value - 1) << _TYPE_SHIFT)
+
+
+def capture_bit(to_loc, capture_loc) -> int:
+    """ @return: the bit of the capture mask for capturing capture_loc when landing on to_loc """
+    direction = (capture_loc[0] - to_loc[0], capture_loc[1] - to_loc[1])
+    if direction == (0, 0):
+        return _CAPTURE_END
+    try:
+        return 1 << (_CAPTURE_SHIFT + DIRECTION_INDEX[direction])
+    except KeyError:
+        raise ValueError(f'{capture_loc} is not next to {to_loc} so the capture can\'t be packed')
+
+
+def pack_action(action: Action) -> int:
+    """ @return: the action packed into an int """
+    code = pack_locations(action.from_loc, action.to_loc, action.movetype)
+    for capture_loc in action.capture:
+        code |= capture_bit(action.to_loc, capture_loc)
+    return code
+
+
+def unpack_locations(code: int) -> 'tuple[tuple, tuple, list[tuple]]':
+    """ @return: (from location, to location, list of captured locations) of a packed action """
+    from_loc = (code & _LOC_MASK, code >> _LOC_BITS & _LOC_MASK)
+    to_x, to_y = to_loc = (code >> 2 * _LOC_BITS & _LOC_MASK, code >> 3 * _LOC_BITS & _LOC_MASK)
+    capture = [(to_x + ix, to_y + iy) for i, (ix, iy) in enumerate(DIRECTIONS)
+               if code >> (_CAPTURE_SHIFT + i) & 1]
+    if code & _CAPTURE_END:
+        capture.append(to_loc)
+    return from_loc, to_loc, capture
+
+
+def unpack_movetype(code: int) -> MoveType:
+    return _MOVETYPES[code >> _TYPE_SHIFT & 3]
+
+
+def unpack_action(code: int) -> Action:
+    """ @return: the Action of a packed action """
+    from_loc, to_loc, capture = unpack_locations(code)
+    return Action(from_loc, to_loc, set(capture), unpack_movetype(code))
+
+
+def as_action(action) -> Action:
+    """ @return: the Action of an Action, PackedAction or packed int """
+    if isinstance(action, int):
+        return unpack_action(action)
+    elif isinstance(action, PackedAction):
+        return action.to_action()
+    return action
+
+
+def move_key(action) -> int:
+    """
+    @return: the from and to locations of an Action, PackedAction or packed int, packed into an int.
+        Every capture choice of a move has the same key
+    """
+    if isinstance(action, PackedAction):
+        action = action.code
+    if isinstance(action, int):
+        return action & _MOVE_KEY_MASK
+    (from_x, from_y), (to_x, to_y) = action.from_loc, action.to_loc
+    return from_x | from_y << _LOC_BITS | to_x << 2 * _LOC_BITS | to_y << 3 * _LOC_BITS
+
+
+# (row width, rows) of a BitboardGrid -> packed location of each bit index
+_index_codes = {}
+
+
+def index_codes(grid: BitboardGrid) -> 'list[int]':
+    """
+    @return: list holding the location of each bit index of the grid packed as a from location,
+        shift it left by 2 * _LOC_BITS for the to location
+    """
+    key = (grid.width, grid.dimensions[0])
+    codes = _index_codes.get(key)
+    if codes is None:
+        codes = _index_codes[key] = [x + 1 | (y + 1) << _LOC_BITS
+                                     for x, y in (divmod(index, grid.width) for index in range(key[0] * key[1]))]
+    return codes
+
+
+class PackedAction:
+    """
+    An action stored as a packed int, with the same attributes as an Action.
+    Equality and hashing only use the int.
+    """
+    __slots__ = ('code',)
+
+    def __init__(self, code: int) -> None:
+        self.code = code
+
+    @classmethod
+    def from_action(cls, action: Action) -> 'PackedAction':
+        return cls(pack_action(action))
+
+    def to_action(self) -> Action:
+        return unpack_action(self.code)
+
+    @property
+    def from_loc(self) -> tuple:
+        return (self.code & _LOC_MASK, self.code >> _LOC_BITS & _LOC_MASK)
+
+    @property
+    def to_loc(self) -> tuple:
+        return (self.code >> 2 * _LOC_BITS & _LOC_MASK, self.code >> 3 * _LOC_BITS & _LOC_MASK)
+
+    @property
+    def capture(self) -> set:
+        return set(unpack_locations(self.code)[2])
+
+    @property
+    def movetype(self) -> MoveType:
+        return unpack_movetype(self.code)
+
+    def __eq__(self, o: object) -> bool:
+        if isinstance(o, PackedAction):
+            return self.code == o.code
+        elif isinstance(o, Action):
+            try:
+                return self.code == pack_action(o)
+            except (ValueError, TypeError, AttributeError):
+                return False
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self.code)
+
+    def __str__(self) -> str:
+        return str(self.to_action())
+
+    def __repr__(self) -> str:
+        return str(self)
+
 
 class GameStateTemplate:
     
@@ -54,6 +223,119 @@ class GameStateTemplate:
     def valid_actions(self) -> 'list[Action]':
         pass
 
+    @abstractmethod
+    def valid_packed_actions(self) -> 'list[int]':
+        """
+        Return all valid actions packed into ints (see pack_action)
+        """
+        pass
+
+    @abstractmethod
+    def _setwise_dwarf_actions(self) -> 'list[int]':
+        """
+        valid_packed_actions for dwarves on a BitboardGrid.
+        The targets of every dwarf are found together, one bitboard per direction and distance,
+        and only turned into actions at the end. The from location is the target less distance steps.
+        @return: packed dwarf moves, then hurls
+        """
+        grid = self.grid
+        codes = index_codes(grid)
+        dwarves, trolls = grid.dwarves, grid.trolls
+        # as in get_actions_from_loc, hurls are only allowed if the dwarf can move
+        movable = dwarves & grid.neighbours(grid.empty)
+        move_type, hurl_type = _TYPE_BITS[MoveType.DWARF_MOVE], _TYPE_BITS[MoveType.DWARF_HURL] | _CAPTURE_END
+        moves = []
+        hurls = []
+        for ix, iy in DIRECTIONS:
+            step = grid.step(ix, iy)
+            for distance, targets in enumerate(grid.rays(dwarves, ix, iy), 1):
+                back = distance * step
+                moves.extend(move_type | codes[to - back] | codes[to] << 2 * _LOC_BITS
+                             for to in grid.indices(targets))
+            # a hurl distance squares away needs a line of that many dwarves behind the thrower
+            for distance, line in enumerate(grid.lines(dwarves, -ix, -iy), 1):
+                sources = line & movable
+                if distance > 1:
+                    rays = grid.rays(sources, ix, iy, distance - 1)
+                    sources = rays[-1] if len(rays) == distance - 1 else 0
+                targets = grid.shift(sources, ix, iy) & trolls
+                back = distance * step
+                hurls.extend(hurl_type | codes[to - back] | codes[to] << 2 * _LOC_BITS
+                             for to in grid.indices(targets))
+        return moves + hurls
+
+    def _setwise_troll_actions(self) -> 'list[int]':
+        """
+        valid_packed_actions for trolls on a BitboardGrid, see _setwise_dwarf_actions.
+        Only targets next to a dwarf need their neighbour mask looked up.
+        @return: packed troll moves, then shoves
+        """
+        grid = self.grid
+        codes = index_codes(grid)
+        trolls, empty = grid.trolls, grid.empty
+        planes = grid.adjacent_planes(Piece.DWARF)
+        near_dwarves = 0
+        for plane in planes:
+            near_dwarves |= plane
+        move_type, shove_type = _TYPE_BITS[MoveType.TROLL_MOVE], _TYPE_BITS[MoveType.TROLL_SHOVE]
+        actions = []
+        for ix, iy in DIRECTIONS:
+            step = grid.step(ix, iy)
+            targets = grid.shift(trolls, ix, iy) & empty
+            actions.extend(move_type | codes[to - step] | codes[to] << 2 * _LOC_BITS
+                           for to in grid.indices(targets & ~near_dwarves))
+            for to in grid.indices(targets & near_dwarves):
+                code = move_type | codes[to - step] | codes[to] << 2 * _LOC_BITS
+                actions.extend(code | 1 << (_CAPTURE_SHIFT + i) for i, plane in enumerate(planes) if plane >> to & 1)
+                if not self.max_captures_only:
+                    actions.append(code)
+        for ix, iy in DIRECTIONS:
+            # a shove needs a line of at least 2 trolls and goes at most as far as the line is long
+            lines = grid.lines(trolls, -ix, -iy)
+            if len(lines) < 2:
+                continue
+            step = grid.step(ix, iy)
+            for distance in range(1, len(lines) + 1):
+                rays = grid.rays(lines[max(distance, 2) - 1], ix, iy, distance)
+                if len(rays) < distance:
+                    break
+                back = distance * step
+                for to in grid.indices(rays[-1] & near_dwarves):
+                    code = shove_type | codes[to - back] | codes[to] << 2 * _LOC_BITS
+                    mask = 0
+                    for i, plane in enumerate(planes):
+                        if plane >> to & 1:
+                            mask |= 1 << i
+                    actions.extend(code | capture << _CAPTURE_SHIFT for capture in self._capture_masks(mask))
+        return actions
+
+    def iter_actions(self) -> 'Generator[Action]':
+        """
+        Lazily yield the valid actions, captures first
+        """
+        pass
+
+    @abstractmethod
+    def count_actions(self) -> int:
+        """
+        @return: the number of valid actions
+        """
+        pass
+
+    @abstractmethod
+    def is_legal(self, action) -> bool:
+        """
+        @return: True if the action is one of the valid actions, without generating them
+        """
+        pass
+
+    @abstractmethod
+    def has_any_action(self, loc=None) -> bool:
+        """
+        @return: True if the piece at loc (or any piece of the player to move) has a valid action
+        """
+        pass
+
     @abstractmethod
     def get_subsequent_states(self) -> 'Generator[GameStateTemplate]':
         pass
@@ -74,9 +356,25 @@ class GameStateTemplate:
         pass
 
     @abstractmethod
-    def deepcopy(self):
+    def make(self, action: Action) -> None:
+        """
+        Act directly on a state, remembering how to undo the action with unmake()
+        """
+        pass
+
+    @abstractmethod
+    def unmake(self) -> Action:
+        """
+        Undo the last action made with make() and return it
+        """
+        pass
+
+    @abstractmethod
+    def deepcopy(self, history_policy=None, history_length=None):
         """
         Return deepcopy of this state
+        @param history_policy: HistoryPolicy of the copy, by default the same as this state's
+        @param history_length: turns remembered by the copy with HistoryPolicy.RING, by default the same as this state's
         """
         pass
 
@@ -114,9 +412,10 @@ class GameStateTemplate:
         pass
 
     @abstractmethod
-    def get_representation(self):
+    def get_representation(self, out=None):
         """
         Return representation of this state as a 4d NUMPY array.
+        @param out: if given, the array to write the representation into
         """
         pass
 
@@ -155,7 +454,8 @@ class ThudGameState(GameStateTemplate):
     """
 
     def __init__(self, grid=None, turn_number=1, previous_state=None, turns_per_game=70,
-                 prev_action=None) -> None:
+                 prev_action=None, grid_type=Grid, max_captures_only=False,
+                 history_policy=HistoryPolicy.NONE, history_length=8, recent_history=()) -> None:
         """
         @param grid: the grid of this state. by default a new thud start grid is created
         @param turn_number: what turn game is up to. default=1
@@ -163,31 +463,77 @@ class ThudGameState(GameStateTemplate):
         @param captured: dictionary of how many pieces have been captured
         @param turns_per_game: the total turns to be played
         @param prev_action: the action taken to reach this state
+        @param grid_type: the grid class used to create the start grid when no grid is given,
+            eg. Grid (the reference list-based grid) or BitboardGrid
+        @param max_captures_only: if True, a troll move or shove landing next to dwarves only captures
+            as many as it can: shoves capture every adjacent dwarf and troll moves must capture one.
+            This cuts the branching factor for search engines, it isn't the full game.
+        @param history_policy: the HistoryPolicy deciding what this state (and the states
+            reached from it) remember of the game. previous_state is only kept with FULL
+        @param history_length: number of turns remembered with HistoryPolicy.RING
+        @param recent_history: (zobrist key, action) of the last turns, oldest first, for HistoryPolicy.RING
         """
         super().__init__(prev_action=prev_action)
         if grid == None:
-            self.grid = Grid()
+            self.grid = grid_type()
             self.grid.create_start_standard_board()
         else:
             self.grid = grid
-        self.previous_state = previous_state
+        self.history_policy = history_policy
+        self.history_length = history_length
+        self.previous_state = previous_state if history_policy == HistoryPolicy.FULL else None
+        # (key of the position, action taken from it) for the last history_length turns
+        self.recent_history = (deque(recent_history, maxlen=history_length)
+                               if history_policy == HistoryPolicy.RING else None)
         self.turn_number = turn_number
         self.turn = Piece.DWARF if self.turn_number % 2 > 0 else Piece.TROLL
         self.turns_per_game = turns_per_game
+        self.max_captures_only = max_captures_only
+        # undo records of the actions performed with make()
+        self._undo_stack = []
+
+    @property
+    def zobrist_key(self) -> int:
+        """
+        64 bit hash of the position: the pieces on the board and the side to move.
+        The grid keeps its key up to date as pieces are set, so this is O(1)
+        """
+        return self.grid.zobrist_key ^ (SIDE_KEY if self.turn == Piece.TROLL else 0)
 
     @property
     def _dwarf_score(self) -> int:
         """
         @return: the dwarf score
         """
-        return len(self._dwarves())
+        return self.grid.count(Piece.DWARF)
 
     @property
     def _troll_score(self) -> int:
         """
         @return: the troll score
         """
-        return len(self._trolls()) * 4
+        return self.grid.count(Piece.TROLL) * 4
+
+    @property
+    def material(self) -> int:
+        """
+        @return: the material balance, dwarf score - troll score
+        """
+        return self.grid.count(Piece.DWARF) - 4 * self.grid.count(Piece.TROLL)
+
+    def features(self) -> dict:
+        """
+        Counters for evaluation functions, all read in O(1)
+        @return: dict of 'dwarves', 'trolls' (pieces left), 'material' (dwarf score - troll score),
+            'turns_left' and 'to_move' (the Piece to move)
+        """
+        return {
+            'dwarves': self.grid.count(Piece.DWARF),
+            'trolls': self.grid.count(Piece.TROLL),
+            'material': self.material,
+            'turns_left': self.turns_per_game - self.turn_number + 1,
+            'to_move': self.turn
+        }
 
     def valid_actions(self) -> 'list[Action]':
         """
@@ -201,6 +547,235 @@ class ThudGameState(GameStateTemplate):
             ret_list.extend(self.get_actions_from_loc(x, y))
         return ret_list
 
+    def valid_packed_actions(self) -> 'list[int]':
+        """
+        Return all valid actions for this state packed into ints (see pack_action).
+        These are the same actions as valid_actions() but no Action objects are created,
+        which matters for troll shoves where there is an action per set of dwarves captured.
+        The packed actions can be passed straight to make, take_action and take_action_on_state.
+        @return: list of packed actions
+        """
+        if isinstance(self.grid, BitboardGrid):
+            if self.turn is Piece.DWARF:
+                return self._setwise_dwarf_actions()
+            return self._setwise_troll_actions()
+        ret_list = []
+        if self.turn is Piece.DWARF:
+            for x, y in self._dwarves():
+                ret_list.extend(self._packed_dwarf_actions_from_loc(x, y))
+        else:
+            for x, y in self._trolls():
+                ret_list.extend(self._packed_troll_actions_from_loc(x, y))
+        return ret_list
+
+    def _packed_dwarf_actions_from_loc(self, x, y) -> 'list[int]':
+        """
+        @return: packed dwarf moves and hurls from location (x, y), see _dwarf_moves_from_location
+        and _dwarf_hurls_from_location for the rules
+        """
+        grid = self.grid
+        move_base = x | y << _LOC_BITS | _TYPE_BITS[MoveType.DWARF_MOVE]
+        hurl_base = x | y << _LOC_BITS | _TYPE_BITS[MoveType.DWARF_HURL] | _CAPTURE_END
+        moves = []
+        hurls = []
+        for ix, iy in DIRECTIONS:
+            ray = grid.get_empty_ray(x, y, ix, iy)
+            moves.extend(move_base | nx << 2 * _LOC_BITS | ny << 3 * _LOC_BITS for nx, ny in ray)
+            steps = len(ray) + 1
+            nx, ny = x + steps * ix, y + steps * iy
+            if (grid.get_piece(nx, ny) == Piece.TROLL
+                    and steps <= self._get_line_length(x, y, -ix, -iy, Piece.DWARF)):
+                hurls.append(hurl_base | nx << 2 * _LOC_BITS | ny << 3 * _LOC_BITS)
+        # as in get_actions_from_loc, hurls are only allowed if the dwarf can move
+        return moves + hurls if len(moves) > 0 else moves
+
+    def _packed_troll_actions_from_loc(self, x, y) -> 'list[int]':
+        """
+        @return: packed troll moves and shoves from location (x, y), see _troll_moves_from_location
+        and _troll_hurls_from_location for the rules
+        """
+        grid = self.grid
+        move_base = x | y << _LOC_BITS | _TYPE_BITS[MoveType.TROLL_MOVE]
+        shove_base = x | y << _LOC_BITS | _TYPE_BITS[MoveType.TROLL_SHOVE]
+        actions = []
+        for ix, iy in DIRECTIONS:
+            nx, ny = x + ix, y + iy
+            if grid.get_piece(nx, ny) == Piece.EMPTY:
+                code = move_base | nx << 2 * _LOC_BITS | ny << 3 * _LOC_BITS
+                mask = grid.get_adjacent_mask(nx, ny, Piece.DWARF)
+                actions.extend(code | 1 << (_CAPTURE_SHIFT + i) for i in range(8) if mask >> i & 1)
+                if not self.max_captures_only or mask == 0:
+                    actions.append(code)
+        if len(actions) == 0:
+            return actions
+        for ix, iy in DIRECTIONS:
+            line_length = self._get_line_length(x, y, -ix, -iy, Piece.TROLL)
+            if line_length < 2:
+                continue
+            for nx, ny in grid.get_empty_ray(x, y, ix, iy)[:line_length]:
+                code = shove_base | nx << 2 * _LOC_BITS | ny << 3 * _LOC_BITS
+                actions.extend(code | capture << _CAPTURE_SHIFT
+                               for capture in self._capture_masks(grid.get_adjacent_mask(nx, ny, Piece.DWARF)))
+        return actions
+
+    def iter_actions(self) -> 'Generator[Action]':
+        """
+        Yield the same actions as valid_actions, without building the list up front:
+        actions capturing the most pieces first, then smaller captures, then actions without a capture.
+        The capturing opportunities are found when iteration starts, the actions themselves
+        (eg. one per subset of the dwarves a shove lands next to) are only built as they're yielded.
+        The state must not be changed while iterating.
+        """
+        # (most pieces capturable, from location, to location, movetype, capturable locations)
+        captures = []
+        starts = list(self._dwarves() if self.turn is Piece.DWARF else self._trolls())
+        for x, y in starts:
+            if self.turn is Piece.DWARF:
+                if self.has_any_action((x, y)):
+                    captures.extend((1, (x, y), action.to_loc, MoveType.DWARF_HURL, [action.to_loc])
+                                    for action in self._dwarf_hurls_from_location(x, y))
+                continue
+            for ix, iy in DIRECTIONS:
+                nx, ny = x + ix, y + iy
+                if self.grid.get_piece(nx, ny) == Piece.EMPTY:
+                    adj_dwarves = self.grid.get_adjacent(nx, ny, Piece.DWARF)
+                    if len(adj_dwarves) > 0:
+                        captures.append((1, (x, y), (nx, ny), MoveType.TROLL_MOVE, adj_dwarves))
+            if self.has_any_action((x, y)):
+                for nx, ny in self._troll_shove_squares(x, y):
+                    adj_dwarves = self.grid.get_adjacent(nx, ny, Piece.DWARF)
+                    if len(adj_dwarves) > 0:
+                        captures.append((len(adj_dwarves), (x, y), (nx, ny),
+                                         MoveType.TROLL_SHOVE, adj_dwarves))
+
+        most = max((capture[0] for capture in captures), default=0)
+        for size in range(most, 0, -1):
+            for largest, from_loc, to_loc, movetype, capturable in captures:
+                if largest == size or (largest > size and not self.max_captures_only):
+                    for capture in combinations(capturable, size):
+                        yield Action(from_loc, to_loc, set(capture), movetype)
+
+        # actions without a capture
+        for x, y in starts:
+            if self.turn is Piece.DWARF:
+                yield from self._dwarf_moves_from_location(x, y)
+                continue
+            for ix, iy in DIRECTIONS:
+                nx, ny = x + ix, y + iy
+                if (self.grid.get_piece(nx, ny) == Piece.EMPTY and (not self.max_captures_only
+                        or len(self.grid.get_adjacent(nx, ny, Piece.DWARF)) == 0)):
+                    yield Action((x, y), (nx, ny), set(), MoveType.TROLL_MOVE)
+
+    def count_actions(self) -> int:
+        """
+        @return: len(valid_actions()), counted without creating any actions
+        """
+        count = 0
+        grid = self.grid
+        if self.turn is Piece.DWARF:
+            for x, y in self._dwarves():
+                moves = 0
+                hurls = 0
+                for ix, iy in DIRECTIONS:
+                    steps = len(grid.get_empty_ray(x, y, ix, iy)) + 1
+                    moves += steps - 1
+                    if (grid.get_piece(x + steps * ix, y + steps * iy) == Piece.TROLL
+                            and steps <= self._get_line_length(x, y, -ix, -iy, Piece.DWARF)):
+                        hurls += 1
+                count += moves + hurls if moves > 0 else 0
+        else:
+            for x, y in self._trolls():
+                if not self.has_any_action((x, y)):
+                    continue
+                for nx, ny in grid.get_adjacent(x, y, Piece.EMPTY):
+                    adjacent = len(grid.get_adjacent(nx, ny, Piece.DWARF))
+                    count += max(adjacent, 1) if self.max_captures_only else 1 + adjacent
+                for nx, ny in self._troll_shove_squares(x, y):
+                    count += len(self._capture_masks(grid.get_adjacent_mask(nx, ny, Piece.DWARF)))
+        return count
+
+    def is_legal(self, action) -> bool:
+        """
+        Check an action against the rules, only looking at the squares it involves:
+        the piece moved, the line it moves along, the line behind it and the pieces captured.
+        @param action: an Action, PackedAction or packed int
+        @return: True if the action is in valid_actions()
+        """
+        try:
+            if isinstance(action, int):
+                from_loc, to_loc, capture = unpack_locations(action)
+                movetype = unpack_movetype(action)
+            else:
+                from_loc, to_loc, capture, movetype = (action.from_loc, action.to_loc,
+                                                       action.capture, action.movetype)
+            (x, y), (tx, ty) = from_loc, to_loc
+            capture = set(capture)
+        except (TypeError, ValueError, AttributeError):
+            # eg. an unfinished action with no locations
+            return False
+        grid = self.grid
+        piece = grid.get_piece(x, y)
+        if piece != self.turn or movetype not in (
+                (MoveType.DWARF_MOVE, MoveType.DWARF_HURL) if piece == Piece.DWARF
+                else (MoveType.TROLL_MOVE, MoveType.TROLL_SHOVE)):
+            return False
+        # the action must move along one of the 8 directions
+        dx, dy = tx - x, ty - y
+        steps = max(abs(dx), abs(dy))
+        if steps == 0 or (dx != 0 and dy != 0 and abs(dx) != abs(dy)):
+            return False
+        ix, iy = dx // steps, dy // steps
+        # squares it can travel over (to_loc is the last of them, except for a hurl)
+        ray_length = len(grid.get_empty_ray(x, y, ix, iy))
+
+        if movetype == MoveType.DWARF_MOVE:
+            return len(capture) == 0 and steps <= ray_length
+        if movetype == MoveType.DWARF_HURL:
+            return (capture == {(tx, ty)} and ray_length == steps - 1
+                    and grid.get_piece(tx, ty) == Piece.TROLL
+                    and steps <= self._get_line_length(x, y, -ix, -iy, Piece.DWARF)
+                    and self.has_any_action((x, y)))
+
+        # troll moves and shoves capture a set of dwarves next to where they land
+        mask = 0
+        for a, b in capture:
+            direction = (a - tx, b - ty)
+            if direction not in DIRECTION_INDEX or grid.get_piece(a, b) != Piece.DWARF:
+                return False
+            mask |= 1 << DIRECTION_INDEX[direction]
+        adjacent = grid.get_adjacent_mask(tx, ty, Piece.DWARF)
+        if movetype == MoveType.TROLL_MOVE:
+            if self.max_captures_only and adjacent:
+                return steps == 1 and ray_length >= 1 and len(capture) == 1
+            return steps == 1 and ray_length >= 1 and len(capture) <= 1
+        line_length = self._get_line_length(x, y, -ix, -iy, Piece.TROLL)
+        return (steps <= ray_length and 2 <= line_length and steps <= line_length
+                and mask in self._capture_masks(adjacent) and self.has_any_action((x, y)))
+
+    def has_any_action(self, loc=None) -> bool:
+        """
+        A piece can act if it can move, every hurl and shove also needs a move to be possible.
+        @param loc: (x, y) of a dwarf or troll. If not given, all the pieces of the player to move are checked
+        @return: True if the piece at loc (or any piece of the player to move) has a valid action
+        """
+        if loc is None:
+            starts = self._dwarves() if self.turn is Piece.DWARF else self._trolls()
+            return any(self.has_any_action(start) for start in starts)
+        x, y = loc
+        if self.grid.get_piece(x, y) not in (Piece.DWARF, Piece.TROLL):
+            return False
+        # both pieces can move (at least) one square to any empty neighbour
+        return len(self.grid.get_adjacent(x, y, Piece.EMPTY)) > 0
+
+    def _troll_shove_squares(self, x, y) -> 'Generator[tuple]':
+        """
+        @return: the squares the troll at (x, y) could be shoved to (whether or not there's a dwarf to capture)
+        """
+        for ix, iy in DIRECTIONS:
+            line_length = self._get_line_length(x, y, -ix, -iy, Piece.TROLL)
+            if line_length >= 2:
+                yield from self.grid.get_empty_ray(x, y, ix, iy)[:line_length]
+
     def get_subsequent_states(self):
         # TODO yield new boards without creating new states or grids
         # TODO ie detach data structures from the logic
@@ -248,17 +823,11 @@ class ThudGameState(GameStateTemplate):
         """
 
         return_list = []
-        increments = [(x, y) for x in [1, 0, -1]
-                      for y in [1, 0, -1] if (x, y) != (0, 0)]
         # in each direction, add increment until non-empty location is found
-        for ix, iy in increments:
-            nx, ny = x + ix, y + iy
-            piece = self.grid.get_piece(nx, ny)
-            while piece == Piece.EMPTY:
-                return_list.append(
-                    Action((x, y), (nx, ny), set(), MoveType.DWARF_MOVE))
-                nx, ny = nx + ix, ny + iy
-                piece = self.grid.get_piece(nx, ny)
+        for ix, iy in DIRECTIONS:
+            return_list.extend(
+                Action((x, y), (nx, ny), set(), MoveType.DWARF_MOVE)
+                for nx, ny in self.grid.get_empty_ray(x, y, ix, iy))
         return return_list
 
     def _dwarf_hurls_from_location(self, x, y) -> 'list[Action]':
@@ -271,21 +840,16 @@ class ThudGameState(GameStateTemplate):
         """
 
         return_list = []
-        increments = [(x, y) for x in [1, 0, -1]
-                      for y in [1, 0, -1] if (x, y) != (0, 0)]
-        for ix, iy in increments:
+        for ix, iy in DIRECTIONS:
             line_ix, line_iy = -ix, -iy
             length = self._get_line_length(x, y, line_ix, line_iy, Piece.DWARF)
-            nx, ny = x, y
-            for _ in range(length):
-                nx, ny = nx + ix, ny + iy
-                piece = self.grid.get_piece(nx, ny)
-                if piece == Piece.TROLL:
-                    return_list.append(
-                        Action((x, y), (nx, ny), {(nx, ny)}, MoveType.DWARF_HURL))
-                    break
-                elif piece != Piece.EMPTY:
-                    break
+            # the dwarf can travel over empty locations and land on the first troll
+            # as long as the troll is no further away than the length of the line
+            steps = len(self.grid.get_empty_ray(x, y, ix, iy)) + 1
+            nx, ny = x + steps * ix, y + steps * iy
+            if steps <= length and self.grid.get_piece(nx, ny) == Piece.TROLL:
+                return_list.append(
+                    Action((x, y), (nx, ny), {(nx, ny)}, MoveType.DWARF_HURL))
         return return_list
 
     def _troll_moves_from_location(self, x, y) -> 'list[Action]':
@@ -293,19 +857,18 @@ class ThudGameState(GameStateTemplate):
         get troll 'normal moves' - ie one step in any direction.
         the troll can capture one dwarf on its move if the dwarf is adjacent to the start location
         """
-        incremenents = [(x, y) for x in [-1, 0, 1]
-                        for y in [-1, 0, 1] if (x, y) != (0, 0)]
         return_list = []
-        for ix, iy in incremenents:
+        for ix, iy in DIRECTIONS:
             nx, ny = x + ix, y + iy
             if self.grid.get_piece(nx, ny) == Piece.EMPTY:
+                adj_dwarves = self.grid.get_adjacent(nx, ny, Piece.DWARF)
                 return_list.extend(
                     (Action((x, y), (nx, ny), {(a, b)}, MoveType.TROLL_MOVE)
-                     for (a, b) in self.grid.get_adj(nx, ny)
-                     if self.grid.get_piece(a, b) == Piece.DWARF))
+                     for (a, b) in adj_dwarves))
                 # can chose not to capture anything
-                return_list.append(
-                    Action((x, y), (nx, ny), set(), MoveType.TROLL_MOVE))
+                if not self.max_captures_only or len(adj_dwarves) == 0:
+                    return_list.append(
+                        Action((x, y), (nx, ny), set(), MoveType.TROLL_MOVE))
 
         return return_list
 
@@ -314,34 +877,38 @@ class ThudGameState(GameStateTemplate):
         get the trolls 'shove moves'
         to shove, the trolls require a line of trolls behind
         trolls can capture 1+ adjacent dwarves when performing a shove
+        (all of them if max_captures_only), the subsets are looked up in SUBSETS
         """
-        incremenents = [(x, y) for x in [-1, 0, 1]
-                        for y in [-1, 0, 1] if (x, y) != (0, 0)]
         return_list = []
-        for ix, iy in incremenents:
+        for ix, iy in DIRECTIONS:
             line_length = self._get_line_length(x, y, -ix, -iy, Piece.TROLL)
             if line_length < 2:
                 # Don't allow hurls of a single troll
                 continue
-            nx, ny = x, y
-            for _ in range(line_length):
-                nx, ny = nx + ix, ny + iy
-                piece = self.grid.get_piece(nx, ny)
-                if piece != Piece.EMPTY:
-                    break
-                else:
-                    adj_dwarves = [
-                        (a, b) for (a, b)
-                        in self.grid.get_adj(nx, ny)
-                        if self.grid.get_piece(a, b) == Piece.DWARF]
-                    if len(adj_dwarves) > 0:
-                        return_list.extend((
-                            Action((x, y), (nx, ny), set(
-                                capture), MoveType.TROLL_SHOVE)
-                            for capture in powerset(adj_dwarves)
-                            if capture is not []))
+            # the troll can be shoved over empty locations, up to the length of the line
+            for nx, ny in self.grid.get_empty_ray(x, y, ix, iy)[:line_length]:
+                mask = self.grid.get_adjacent_mask(nx, ny, Piece.DWARF)
+                return_list.extend((
+                    Action((x, y), (nx, ny), self._mask_locations(nx, ny, capture),
+                           MoveType.TROLL_SHOVE)
+                    for capture in self._capture_masks(mask)))
         return return_list
 
+    def _capture_masks(self, mask) -> 'tuple[int]':
+        """
+        @param mask: neighbour mask of the dwarves next to a shove's landing square
+        @return: the masks of the dwarves a shove there can capture (none if mask is 0)
+        """
+        if self.max_captures_only:
+            return (mask,) if mask else ()
+        return SUBSETS[mask]
+
+    def _mask_locations(self, x, y, mask) -> set:
+        """
+        @return: the set of locations next to (x, y) in the neighbour mask
+        """
+        return {(x + ix, y + iy) for ix, iy in MASK_DIRECTIONS[mask]}
+
     def _get_line_length(self, x, y, ix, iy, piece_type) -> int:
         """
         Calculates the strength of the line begind the piece at x,y
@@ -353,28 +920,67 @@ class ThudGameState(GameStateTemplate):
         if (piece_type in (Piece.EMPTY, Piece.NON_PLAYABLE)
                 or self.grid.get_piece(x, y) != piece_type or (ix, iy) == (0, 0)):
             return 0
-        length = 0
-        piece = piece_type
-        while piece == piece_type:
-            length += 1
-            x, y = x + ix, y + iy
-
-            piece = self.grid.get_piece(x, y)
-        return length
+        return self.grid.get_line_length(x, y, ix, iy, piece_type)
 
     def take_action_on_state(self, action: Action) -> 'ThudGameState':
         """
         Act directly on a state and return the (modified) game state
         """
-        from_x, from_y = action.from_loc
-        to_x, to_y = action.to_loc
-        capture = action.capture
-        for x, y in capture:
-            self.grid.remove_piece(x, y)
+        self._apply(action)
+        return self
+
+    def make(self, action: Action) -> None:
+        """
+        Act directly on this state, keeping an undo record so unmake() can restore it.
+        Allows a search to walk the game tree on a single state without copying it.
+        """
+        self._undo_stack.append(self._apply(action))
+
+    def unmake(self) -> Action:
+        """
+        Undo the last action performed with make()
+        @return: the action which was undone
+        """
+        action, (from_x, from_y), (to_x, to_y), moved_piece, captured, turn_number, prev_action, forgotten = \
+            self._undo_stack.pop()
+        self.grid.remove_piece(to_x, to_y)
+        self.grid.set_piece(from_x, from_y, moved_piece)
+        for x, y, piece in captured:
+            self.grid.set_piece(x, y, piece)
+        self.turn_number = turn_number
+        self.turn = Piece.DWARF if self.turn_number % 2 > 0 else Piece.TROLL
+        self.prev_action = prev_action
+        if self.recent_history is not None:
+            self.recent_history.pop()
+            if forgotten is not None:
+                self.recent_history.appendleft(forgotten)
+        return action
+
+    def _apply(self, action: Action) -> tuple:
+        """
+        Perform the action (an Action, PackedAction or packed int) on this state
+        @return: undo record = (action, from location, to location, moved piece,
+            [(x, y, captured piece)], previous turn number, previous action,
+            the entry pushed out of recent_history or None)
+        """
+        if type(action) is int:
+            from_loc, to_loc, capture = unpack_locations(action)
+        else:
+            from_loc, to_loc, capture = action.from_loc, action.to_loc, action.capture
+        (from_x, from_y), (to_x, to_y) = from_loc, to_loc
+        forgotten = None
+        if self.recent_history is not None:
+            if len(self.recent_history) == self.history_length:
+                forgotten = self.recent_history[0]
+            self.recent_history.append((self.zobrist_key, action))
+        moved_piece = self.grid.get_piece(from_x, from_y)
+        captured = [(x, y, self.grid.remove_piece(x, y)) for x, y in capture]
         self.grid.move_piece(from_x, from_y, to_x, to_y)
+        record = (action, from_loc, to_loc, moved_piece, captured, self.turn_number, self.prev_action,
+                  forgotten)
         self._next_move()
         self.prev_action = action
-        return self
+        return record
 
     def take_action(self, action: 'Action') -> 'ThudGameState':
         """
@@ -382,7 +988,8 @@ class ThudGameState(GameStateTemplate):
         @param: action as triple: ((start loc), (end loc), capture list)
         """
         next_state = self.deepcopy()
-        next_state.previous_state = self
+        if self.history_policy == HistoryPolicy.FULL:
+            next_state.previous_state = self
         next_state.take_action_on_state(action)
         next_state.prev_action = action
         return next_state
@@ -394,12 +1001,20 @@ class ThudGameState(GameStateTemplate):
         self.turn_number += 1
         self.turn = self.turn = Piece.DWARF if self.turn_number % 2 > 0 else Piece.TROLL
 
-    def deepcopy(self):
+    def deepcopy(self, history_policy: HistoryPolicy = None, history_length=None):
         """
         Return deepcopy of this state
+        @param history_policy: the HistoryPolicy of the copy, by default the same as this state's.
+            eg. a search can copy the game's state with HistoryPolicy.NONE so its nodes don't keep the game alive
+        @param history_length: number of turns remembered by the copy with HistoryPolicy.RING,
+            by default the same as this state's
         """
         return ThudGameState(grid=self.grid.deepcopy(), turn_number=self.turn_number,
-                             previous_state=self.previous_state)
+                             previous_state=self.previous_state, turns_per_game=self.turns_per_game,
+                             max_captures_only=self.max_captures_only,
+                             history_policy=history_policy or self.history_policy,
+                             history_length=history_length or self.history_length,
+                             recent_history=self.recent_history or ())
 
     def get_locations(self, piece_type) -> 'list[tuple]':
         """
@@ -439,13 +1054,11 @@ class ThudGameState(GameStateTemplate):
             return [{end_loc}]
         elif movetype == MoveType.TROLL_MOVE:
             x, y = end_loc
-            return [{(a, b)} for (a, b) in self.grid.get_adj(x, y) if self.grid.get_piece(a, b) == Piece.DWARF]
+            return [{(a, b)} for (a, b) in self.grid.get_adjacent(x, y, Piece.DWARF)]
         elif movetype == MoveType.TROLL_SHOVE:
             x, y = end_loc
-            full_set = powerset(
-                [(a, b) for (a, b) in self.grid.get_adj(x, y) if self.grid.get_piece(a, b) == Piece.DWARF])
-            full_set.remove([])
-            return [set(capture_list) for capture_list in full_set]
+            return [self._mask_locations(x, y, capture)
+                    for capture in self._capture_masks(self.grid.get_adjacent_mask(x, y, Piece.DWARF))]
 
     def game_over(self) -> bool:
         """
@@ -454,31 +1067,44 @@ class ThudGameState(GameStateTemplate):
         @return: True if one piece has no more pieces. Else False
         """
 
-        return self.turn_number > self.turns_per_game or len(self._dwarves()) == 0 or len(self._trolls()) == 0
+        return (self.turn_number > self.turns_per_game
+                or self.grid.count(Piece.DWARF) == 0 or self.grid.count(Piece.TROLL) == 0)
 
     def winner(self) -> Piece:
         """
         @return: the Piece with the highest score.
         In case of a draw return 'draw'.
         """
-        d_score = self._dwarf_score
-        t_score = self._troll_score
-        return Piece.DWARF if d_score > t_score else Piece.TROLL if t_score > d_score else 'draw'
+        material = self.material
+        return Piece.DWARF if material > 0 else Piece.TROLL if material < 0 else 'draw'
 
-    def get_representation(self):
+    def get_representation(self, out=None):
         """
         Return representation of this state as a 3d np array.
         1) 15x15 grid representing dwarf locations
         2) 15x15 grid representing troll locations
         3) 15x15 grid representing who's turn it si
-        """
-        val = 1 if self.turn == Piece.DWARF else 0
-        dx, dy = self.grid.dimensions
-        pieces_arrays = self.grid.get_representation()
-        pieces_arrays.append([[val for x in range(dx)] for _ in range(dy)])
-        final_array = np.array(pieces_arrays)
-        final_array = np.expand_dims(final_array, 0)
-        return final_array
+        @param out: preallocated (3, 15, 15) array to write the planes into, see stack_representations
+        @return: the planes with a leading batch axis, ie. shape (1, 3, 15, 15)
+        """
+        if out is None:
+            out = np.empty((3, *self.grid.dimensions), dtype=np.int8)
+        self.grid.get_representation(out[:2])
+        out[2] = 1 if self.turn == Piece.DWARF else 0
+        return out[None]
+
+    def history(self) -> 'list[ThudGameState]':
+        """
+        @return: the states of the game up to this one, following previous_state, oldest first.
+        Only states with HistoryPolicy.FULL keep their previous states, otherwise this is [self]
+        """
+        states = []
+        state = self
+        while state is not None:
+            states.append(state)
+            state = state.previous_state
+        states.reverse()
+        return states
 
     def __eq__(self, o: object) -> bool:
         if not isinstance(o, ThudGameState):
@@ -494,11 +1120,27 @@ class ThudGameState(GameStateTemplate):
         @param piece: which piece the result is for 
         @return: the pieces score vs the opponents score in this state
         """
-        return piece.value * (self._dwarf_score - self._troll_score)
+        return piece.value * self.material
 
     def get_player_info(self, piece)-> str:
         info = []
         if piece == Piece.DWARF:
             info = [
                 'DWARF', 
-                '']
\ No newline at end of file
+                '']
+
+
+def stack_representations(states, out=None) -> np.ndarray:
+    """
+    Stack the representations (see ThudGameState.get_representation) of many states,
+    eg. a batch of positions or the history() of a game, into one contiguous array.
+    @param states: sequence of states on boards of the same dimensions
+    @param out: preallocated (len(states), 3, x dimension, y dimension) array to write into
+    @return: out, or a new int8 array if out wasn't given
+    """
+    if out is None:
+        dimensions = states[0].grid.dimensions if len(states) > 0 else (0, 0)
+        out = np.empty((len(states), 3, *dimensions), dtype=np.int8)
+    for i, state in enumerate(states):
+        state.get_representation(out[i])
+    return out
@@ -0,0 +1,135 @@
+from .enums import Piece
+from .state import Action, ThudGameState, pack_action, unpack_action
+from .zobrist import SIDE_KEY, board_key
+
+"""
+Symmetries of the thud board.
+The standard board is unchanged by the 8 rotations and reflections of the square (the group D4),
+so a position and its 7 images have the same value and the same actions, up to the same transform.
+Mapping every position to a canonical image lets transposition tables, opening books and
+training data share one entry between symmetric positions.
+
+A symmetry is an int from 0 to 7, applied to a location (x, y) as:
+- bit 2 (TRANSPOSE): swap x and y
+- bit 0 (FLIP_X): then x -> rows + 1 - x
+- bit 1 (FLIP_Y): then y -> columns + 1 - y
+Symmetry 0 is the identity. Transposing needs a square board.
+"""
+
+FLIP_X = 1
+FLIP_Y = 2
+TRANSPOSE = 4
+SYMMETRIES = tuple(range(8))
+
+
+def inverse(symmetry: int) -> int:
+    """
+    @return: the symmetry undoing this one
+    """
+    if symmetry & TRANSPOSE:
+        # flipping x after transposing is the same as flipping y before it
+        return TRANSPOSE | (symmetry & FLIP_X) << 1 | (symmetry & FLIP_Y) >> 1
+    return symmetry
+
+
+def transform_location(location, symmetry, dimensions) -> tuple:
+    """
+    @param location: (x, y), 1 indexed
+    @param dimensions: (rows, columns) of the board
+    @return: the location (x, y) is moved to by the symmetry
+    """
+    x, y = location
+    if symmetry & TRANSPOSE:
+        x, y = y, x
+    if symmetry & FLIP_X:
+        x = dimensions[0] + 1 - x
+    if symmetry & FLIP_Y:
+        y = dimensions[1] + 1 - y
+    return (x, y)
+
+
+def transform_action(action, symmetry, dimensions):
+    """
+    Map an action of a position to the same action in the position's image.
+    Use inverse(symmetry) to map an action found in a canonical position back.
+    @param action: an Action or a packed action
+    @return: the transformed action, packed if the input was
+    """
+    if isinstance(action, int):
+        return pack_action(transform_action(unpack_action(action), symmetry, dimensions))
+    return Action(transform_location(action.from_loc, symmetry, dimensions),
+                  transform_location(action.to_loc, symmetry, dimensions),
+                  {transform_location(loc, symmetry, dimensions) for loc in action.capture},
+                  action.movetype)
+
+
+# playable layout -> symmetries leaving it unchanged
+_layout_symmetries = {}
+
+
+def board_symmetries(grid) -> 'tuple[int]':
+    """
+    @return: the symmetries that map the playable squares of the grid onto themselves, all 8 for the
+        standard board. Only these give images that are positions of the same game.
+    """
+    dimensions = tuple(grid.dimensions)
+    non_playable = frozenset(grid.get_piece_list(Piece.NON_PLAYABLE))
+    key = (dimensions, non_playable)
+    symmetries = _layout_symmetries.get(key)
+    if symmetries is None:
+        symmetries = _layout_symmetries[key] = tuple(
+            symmetry for symmetry in SYMMETRIES
+            if (not symmetry & TRANSPOSE or dimensions[0] == dimensions[1])
+            and {transform_location(loc, symmetry, dimensions) for loc in non_playable} == non_playable)
+    return symmetries
+
+
+def _image(state, symmetry) -> 'tuple[tuple, tuple]':
+    """ @return: (sorted dwarf locations, sorted troll locations) of the image of the state """
+    dimensions = state.grid.dimensions
+    return tuple(tuple(sorted(transform_location(loc, symmetry, dimensions) for loc in state.get_locations(piece)))
+                 for piece in (Piece.DWARF, Piece.TROLL))
+
+
+def canonical_symmetry(state) -> int:
+    """
+    The canonical image of a position is the one whose sorted (dwarf locations, troll locations)
+    is smallest, so symmetric positions have the same canonical image.
+    @return: the symmetry mapping the state to its canonical image
+    """
+    return min(board_symmetries(state.grid), key=lambda symmetry: _image(state, symmetry))
+
+
+def canonical_key(state) -> int:
+    """
+    @return: the zobrist key of the canonical image of the state, the same for all symmetric positions
+    """
+    dwarves, trolls = _image(state, canonical_symmetry(state))
+    return board_key(dwarves, trolls) ^ (SIDE_KEY if state.turn == Piece.TROLL else 0)
+
+
+def transform_state(state, symmetry) -> ThudGameState:
+    """
+    @return: a new state, with no history, whose board is the image of the state's board
+    """
+    grid = state.grid
+    dimensions = tuple(grid.dimensions)
+    board = [[Piece.EMPTY] * dimensions[1] for _ in range(dimensions[0])]
+    for piece in (Piece.DWARF, Piece.TROLL, Piece.NON_PLAYABLE):
+        for loc in grid.get_piece_list(piece):
+            x, y = transform_location(loc, symmetry, dimensions)
+            board[x - 1][y - 1] = piece
+    image = type(grid)()
+    image.board_from_template(board)
+    return ThudGameState(grid=image, turn_number=state.turn_number, turns_per_game=state.turns_per_game,
+                         max_captures_only=state.max_captures_only)
+
+
+def canonical_form(state) -> 'tuple[ThudGameState, int]':
+    """
+    @return: (the canonical image of the state, the symmetry mapping the state to it).
+        An action chosen in the image is mapped back with
+        transform_action(action, inverse(symmetry), dimensions)
+    """
+    symmetry = canonical_symmetry(state)
+    return transform_state(state, symmetry), symmetry
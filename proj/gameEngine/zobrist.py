@@ -0,0 +1,58 @@
+from .enums import Piece
+
+"""
+Zobrist hashing for thud positions.
+Every (piece, location) pair has a fixed random 64 bit key. The key of a board is the xor
+of the keys of all the dwarves and trolls on it, so moving or removing a piece only needs
+the keys of the locations that changed. SIDE_KEY is added when the trolls are to move.
+
+Keys are derived from the piece and location (not drawn from a shared random generator),
+so they're the same in every process and don't depend on the order they're first used in.
+"""
+
+_MASK = (1 << 64) - 1
+
+
+def _splitmix64(seed: int) -> int:
+    """ mix a seed into a well distributed 64 bit number """
+    z = (seed + 0x9E3779B97F4A7C15) & _MASK
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK
+    return z ^ (z >> 31)
+
+
+SIDE_KEY = _splitmix64(0)
+
+# (piece, x, y) -> key, filled in as locations are used
+_keys = {}
+
+
+def piece_key(piece: Piece, x: int, y: int) -> int:
+    """
+    @return: the key of the piece at (x, y). EMPTY and NON_PLAYABLE locations have key 0
+    """
+    try:
+        return _keys[(piece, x, y)]
+    except KeyError:
+        if piece == Piece.DWARF:
+            key = _splitmix64((x << 16 | y) << 1)
+        elif piece == Piece.TROLL:
+            key = _splitmix64((x << 16 | y) << 1 | 1)
+        else:
+            key = 0
+        _keys[(piece, x, y)] = key
+        return key
+
+
+def board_key(dwarves, trolls) -> int:
+    """
+    @param dwarves: locations of the dwarves
+    @param trolls: locations of the trolls
+    @return: the key of a board with those pieces on it
+    """
+    key = 0
+    for x, y in dwarves:
+        key ^= piece_key(Piece.DWARF, x, y)
+    for x, y in trolls:
+        key ^= piece_key(Piece.TROLL, x, y)
+    return key
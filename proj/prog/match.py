@@ -1,8 +1,8 @@
 
 import time
-from proj.gameEngine.state import ThudGameState
+from proj.gameEngine.state import ThudGameState, as_action
 from .matchStats import MatchStats
-from proj.gameEngine.enums import Piece
+from proj.gameEngine.enums import HistoryPolicy, Piece
 from proj.userInterfaces.userInterface import UserInterfaceTemplate
 
 """=== code for a match ==="""
@@ -39,12 +39,17 @@ def play_match(total_games, player1, player2, ui: UserInterfaceTemplate, game_le
     ui.start_message(welcome_message)
     dwarf_player = player1
     troll_player = player2
-    for game_number in range(1, total_games + 1):
-        __play_game(dwarf_player=dwarf_player, troll_player=troll_player, 
-                    ui=ui, game_length=game_length, game_number=game_number, 
-                    total_games=total_games, wins=wins,  
-                    stats=stats)
-        dwarf_player, troll_player = troll_player, dwarf_player
+    try:
+        for game_number in range(1, total_games + 1):
+            __play_game(dwarf_player=dwarf_player, troll_player=troll_player,
+                        ui=ui, game_length=game_length, game_number=game_number,
+                        total_games=total_games, wins=wins,
+                        stats=stats)
+            dwarf_player, troll_player = troll_player, dwarf_player
+    finally:
+        # eg. the worker processes of a root parallel MCTS agent
+        player1.close()
+        player2.close()
     ui.end_of_match(wins, total_games)
     __save_stats(stats)
     return wins
@@ -66,8 +71,8 @@ def __play_game(dwarf_player, troll_player, ui: UserInterfaceTemplate,
     @param total_games: the number of games to be played
     @param wins: win dictionary
     """
-    # initial state
-    state = ThudGameState(turns_per_game=game_length)
+    # initial state, keeping every state of the game for the ui
+    state = ThudGameState(turns_per_game=game_length, history_policy=HistoryPolicy.FULL)
     # create players dictionary
     players = {Piece.DWARF: dwarf_player,
                Piece.TROLL: troll_player, 'draw': 'draw'}
@@ -81,8 +86,9 @@ def __play_game(dwarf_player, troll_player, ui: UserInterfaceTemplate,
                       best_of=total_games, wins=wins, dwarf_player=dwarf_player,
                       troll_player=troll_player, prev_action=action)
         player = players[state.turn]
-        action = player.act(state, game_number, wins, stats)
-        if action not in state.valid_actions(): 
+        # agents may return packed actions, the ui and the game record use Action
+        action = as_action(player.act(state, game_number, wins, stats))
+        if not state.is_legal(action):
             # if this action is invalid, don't allow the action to take place. 
             # instead continue, requiring a new action to be taken. 
             ui.display_invalid_action(action)
@@ -0,0 +1,43 @@
+"""
+Agent parameters given on the command line, eg. -p "1: max_time=5, reuse_tree=false; 2: max_depth=3"
+"""
+
+_CONSTANTS = {'true': True, 'false': False, 'none': None}
+
+
+def get_params(parameter_string):
+    if parameter_string == '': return {},{}
+    agent1params = agent2params = {}
+    parameter_string.strip()
+    params = parameter_string.split(';')
+    for param in params:
+        split_params = param.split(':')
+        if split_params[0].replace(' ', '') == '1':
+            agent1params = string_to_kwargs(split_params[1])
+        elif split_params[0].replace(' ', '') == '2':
+            agent2params = string_to_kwargs(split_params[1])
+    
+    return agent1params, agent2params
+    
+def string_to_kwargs(string):
+    kwargs = {}
+    if string == '': return kwargs
+    params = string.split(',')
+    for param in params:
+        name,p = tuple(param.split('='))
+        name = name.strip()
+        p = p.strip()
+        # true/false and none are python values, eg. reuse_tree=false
+        if p.lower() in _CONSTANTS:
+            kwargs[name] = _CONSTANTS[p.lower()]
+            continue
+        # ints stay ints, eg. workers=4 or batch_size=64
+        for convert in (int, float):
+            try:
+                kwargs[name] = convert(p)
+                break
+            except ValueError:
+                continue
+        else:
+            kwargs[name] = p
+    return kwargs
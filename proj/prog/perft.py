@@ -0,0 +1,248 @@
+import time
+from optparse import OptionParser
+
+from proj.gameEngine.batchPlayout import BatchPlayout
+from proj.gameEngine.bitboardGrid import BitboardGrid
+from proj.gameEngine.enums import Piece
+from proj.gameEngine.grid import Grid
+from proj.gameEngine.state import ThudGameState
+
+"""
+Perft: count the leaf nodes of the game tree to a fixed depth.
+The counts only depend on the rules, so they're a regression test for the move generator
+(see proj/test/testPerft.py) and, timed, a benchmark of move generation and move making.
+
+USAGE:      python -m proj.prog.perft <options>
+"""
+
+# (turn number, board) of positions from random games with plenty of captures available.
+# d = dwarf, T = troll, . = empty, - = non playable
+MIDGAME_POSITIONS = [
+    (40, ['-----d..d.-----',
+          '----d.....d----',
+          '---d...d..d.---',
+          '--d.........d--',
+          '-.............-',
+          '.....T........d',
+          '....d...T......',
+          '......T-.......',
+          'd....T..T......',
+          'dd.............',
+          '-d.....T......-',
+          '--..........d--',
+          '---.......T.---',
+          '----d.d....----',
+          '-----.d.dd-----']),
+    (40, ['-----.d.dd-----',
+          '----......d----',
+          '---..T......---',
+          '--..........d--',
+          '-d..d........d-',
+          '...............',
+          'd....TT.T.....d',
+          '....T..-.......',
+          'd......T....d.d',
+          '.............dd',
+          '-..........d..-',
+          '--..d........--',
+          '---d...d...d---',
+          '----......d----',
+          '-----dd..d-----']),
+    (21, ['-----dd...-----',
+          '----....d..----',
+          '---....d...d---',
+          '--d..T......d--',
+          '-d...........d-',
+          '.........Td...d',
+          'd...dT........d',
+          '.......-T.d....',
+          'd....TT.......d',
+          'd.......T......',
+          '-d.d.........d-',
+          '--d.........d--',
+          '---d.......d---',
+          '----dd....d----',
+          '-----.d.dd-----']),
+]
+
+_SYMBOLS = {'d': Piece.DWARF, 'T': Piece.TROLL, '.': Piece.EMPTY, '-': Piece.NON_PLAYABLE}
+
+
+def position(turn_number, rows, grid_type=Grid) -> ThudGameState:
+    """
+    @param rows: the board as strings, see MIDGAME_POSITIONS
+    @return: a state with that board and turn number
+    """
+    grid = grid_type()
+    grid.board_from_template([[_SYMBOLS[s] for s in row] for row in rows])
+    return ThudGameState(grid=grid, turn_number=turn_number)
+
+
+"""
+Perft functions, one per way of walking the tree. Each takes a state and a depth and
+returns the number of leaf nodes. A game over position before the full depth has no
+children, so it adds nothing (like checkmate in chess perft).
+"""
+
+
+def perft_take_action(state, depth) -> int:
+    """ walk the tree with valid_actions and take_action, a new state per node """
+    if depth == 0:
+        return 1
+    if state.game_over():
+        return 0
+    return sum(perft_take_action(state.take_action(action), depth - 1)
+               for action in state.valid_actions())
+
+
+def perft_take_action_on_state(state, depth) -> int:
+    """ walk the tree with valid_actions, copying the state and acting on the copy in place """
+    if depth == 0:
+        return 1
+    if state.game_over():
+        return 0
+    return sum(perft_take_action_on_state(state.deepcopy().take_action_on_state(action), depth - 1)
+               for action in state.valid_actions())
+
+
+def perft_make(state, depth) -> int:
+    """ walk the tree on one state with valid_packed_actions, make and unmake """
+    if depth == 0:
+        return 1
+    if state.game_over():
+        return 0
+    nodes = 0
+    for action in state.valid_packed_actions():
+        state.make(action)
+        nodes += perft_make(state, depth - 1)
+        state.unmake()
+    return nodes
+
+
+def perft_count(state, depth) -> int:
+    """ like perft_make, but the last ply is counted with count_actions instead of being made """
+    if depth == 0:
+        return 1
+    if state.game_over():
+        return 0
+    if depth == 1:
+        return state.count_actions()
+    nodes = 0
+    for action in state.valid_packed_actions():
+        state.make(action)
+        nodes += perft_count(state, depth - 1)
+        state.unmake()
+    return nodes
+
+
+_batch_engines = {}
+
+
+def perft_batch(state, depth) -> int:
+    """ like perft_make, but the last ply is counted by summing the action weights of a BatchPlayout """
+    if depth == 0:
+        return 1
+    if state.game_over():
+        return 0
+    if depth == 1:
+        key = (state.turns_per_game, state.max_captures_only)
+        engine = _batch_engines.get(key)
+        if engine is None:
+            engine = _batch_engines[key] = BatchPlayout(turns_per_game=state.turns_per_game,
+                                                        max_captures_only=state.max_captures_only)
+        boards, _ = engine.load([state])
+        sources = engine._sources(boards, state.turn)
+        if state.turn == Piece.DWARF:
+            weights, _ = engine.dwarf_weights(boards, sources)
+        else:
+            weights, _, _ = engine.troll_weights(boards, sources)
+        return int(weights.sum())
+    nodes = 0
+    for action in state.valid_packed_actions():
+        state.make(action)
+        nodes += perft_batch(state, depth - 1)
+        state.unmake()
+    return nodes
+
+
+# name -> (perft function, grid type). 'reference' is the original way of walking the tree
+ENGINES = {
+    'reference': (perft_take_action, Grid),
+    'take_action_on_state': (perft_take_action_on_state, Grid),
+    'make': (perft_make, Grid),
+    'count': (perft_count, Grid),
+    'bitboard': (perft_take_action, BitboardGrid),
+    'bitboard_make': (perft_make, BitboardGrid),
+    'batch': (perft_batch, Grid),
+}
+
+
+def positions(grid_type=Grid) -> 'list[ThudGameState]':
+    """ @return: the start position followed by the MIDGAME_POSITIONS """
+    start = ThudGameState(grid_type=grid_type)
+    return [start] + [position(turn_number, rows, grid_type) for turn_number, rows in MIDGAME_POSITIONS]
+
+
+def run(engine, depth, state_index=None) -> 'list[tuple[int, float]]':
+    """
+    @param engine: name of the engine in ENGINES
+    @param state_index: index of the position to use in positions(), all of them if None
+    @return: (nodes, seconds taken) per position
+    """
+    perft, grid_type = ENGINES[engine]
+    states = positions(grid_type)
+    if state_index is not None:
+        states = [states[state_index]]
+    results = []
+    for state in states:
+        start = time.perf_counter()
+        nodes = perft(state, depth)
+        results.append((nodes, time.perf_counter() - start))
+    return results
+
+
+def cross_check(depth, engines=None, state_index=None) -> 'list[str]':
+    """
+    Compare the node counts of every engine with the reference engine
+    @return: list of the differences found, empty if all the engines agree
+    """
+    engines = engines or [name for name in ENGINES if name != 'reference']
+    reference = [nodes for nodes, _ in run('reference', depth, state_index)]
+    errors = []
+    for engine in engines:
+        counts = [nodes for nodes, _ in run(engine, depth, state_index)]
+        for i, (expected, nodes) in enumerate(zip(reference, counts)):
+            if nodes != expected:
+                errors.append(f'{engine}: position {i} depth {depth}: {nodes} nodes, reference has {expected}')
+    return errors
+
+
+def CLI():
+    parser = OptionParser('USAGE:      python -m proj.prog.perft <options>')
+    parser.add_option('-d', '--depth', dest='depth', type=int, default=2,
+                      help='depth to count leaf nodes to [default: %default]')
+    parser.add_option('-e', '--engines', dest='engines', type=str, default='',
+                      help="comma separated engines to time, from: " + ', '.join(ENGINES) + " [default: all]")
+    parser.add_option('-s', '--position', dest='position', type=int, default=None,
+                      help='only use this position, 0 = start, 1+ = stored midgame positions')
+    parser.add_option('-c', '--check', dest='check', action='store_true', default=False,
+                      help='cross check the node counts of the engines against the reference engine')
+    options, other = parser.parse_args()
+    if len(other) != 0:
+        raise Exception(f"""CLI can't understand {str(other)}""")
+    engines = [engine.strip() for engine in options.engines.split(',') if engine.strip()] or list(ENGINES)
+
+    if options.check:
+        errors = cross_check(options.depth, [e for e in engines if e != 'reference'], options.position)
+        print('\n'.join(errors) if errors else f'all engines agree to depth {options.depth}')
+        return
+
+    for engine in engines:
+        for i, (nodes, seconds) in enumerate(run(engine, options.depth, options.position)):
+            index = i if options.position is None else options.position
+            print(f'{engine:>22} position {index} depth {options.depth}: '
+                  f'{nodes:>9} nodes {seconds:8.3f}s {nodes / max(seconds, 1e-9):>10.0f} nodes/s')
+
+
+if __name__ == '__main__':
+    CLI()
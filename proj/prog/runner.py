@@ -4,6 +4,7 @@ import pstats
 
 from proj.agents.GUIAgent import GUIAgent
 from proj.prog.match import play_match
+from proj.prog.params import get_params, string_to_kwargs
 from proj.userInterfaces.GUI import GUI
 from proj.userInterfaces.userInterface import TerminalUI, QuietUI
 from optparse import OptionParser
@@ -33,7 +34,8 @@ def CLI():
                       help='quiet setting will minimise board displays from the terminal UI ')
     parser.add_option('-p', '--parameters', dest='parameters', type=str, default='',
                       help=("Add parameters for agents. agent 1 using '1: x=1 ...' & agent 2 using '2: y=2 ... '. Seperate agents with ';'."
-                            + " Seperate parameters with ','. Please note: only numbers or strings can be input with this option"))
+                            + " Seperate parameters with ','. Please note: only numbers or strings can be input with this option."
+                            + " eg. '1: iterations=2000, seed=1; 2: nodes=50000' gives both agents a fixed search budget"))
     options, other = parser.parse_args()
     if len(other) != 0:
         raise Exception(f"""CLI can't understand {str(other)}""")
@@ -116,32 +118,3 @@ def load_agent(agentClassName: str):
         except AttributeError:
             continue
     raise Exception(f'No agent name {agentClassName} found in {prefix} module')
-
-
-def get_params(parameter_string):
-    if parameter_string == '': return {},{}
-    agent1params = agent2params = {}
-    parameter_string.strip()
-    params = parameter_string.split(';')
-    for param in params:
-        split_params = param.split(':')
-        if split_params[0].replace(' ', '') == '1':
-            agent1params = string_to_kwargs(split_params[1])
-        elif split_params[0].replace(' ', '') == '2':
-            agent2params = string_to_kwargs(split_params[1])
-    
-    return agent1params, agent2params
-    
-def string_to_kwargs(string):
-    kwargs = {}
-    if string == '': return kwargs
-    params = string.split(',')
-    for param in params:
-        name,p = tuple(param.split('='))
-        name = name.strip()
-        p = p.strip()
-        try:
-            kwargs[name] = float(p)
-        except ValueError as e:
-            kwargs[name] = p
-    return kwargs
@@ -0,0 +1,43 @@
+import os
+import tempfile
+import unittest
+
+from ..gameEngine.enums import Piece
+from ..gameEngine.grid import Grid
+from ..gameEngine.state import ThudGameState
+
+"""
+Positions and set up shared by the search tests
+"""
+
+
+def small_state(non_playable=(), turns_per_game=8) -> ThudGameState:
+    """
+    @param non_playable: (x, y) locations made non playable
+    @return: the start of a game on a 4x5 board with 2 dwarves and a troll,
+        small enough for a short search to expand the opponent's replies
+    """
+    E, D, T = Piece.EMPTY, Piece.DWARF, Piece.TROLL
+    board = [[D, E, E, E, D],
+             [E, E, E, E, E],
+             [E, E, E, E, E],
+             [E, E, T, E, E]]
+    for x, y in non_playable:
+        board[x - 1][y - 1] = Piece.NON_PLAYABLE
+    grid = Grid()
+    grid.board_from_template(board)
+    return ThudGameState(grid=grid, turns_per_game=turns_per_game)
+
+
+class SearchTestCase(unittest.TestCase):
+    """
+    Test case with a small_state and a temporary file for the stats agents save after a search
+    """
+
+    def setUp(self) -> None:
+        self.state = small_state()
+        handle, self.save_file_path = tempfile.mkstemp()
+        os.close(handle)
+
+    def tearDown(self) -> None:
+        os.remove(self.save_file_path)
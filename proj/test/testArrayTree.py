@@ -0,0 +1,55 @@
+
+from ..agents.MCTSAgent import MCTSArrayAgent
+from ..agents.helper_files.arrayTree import ArrayTree
+from ..prog.matchStats import MatchStats
+from .fixtures import SearchTestCase
+
+
+class TestArrayTree(SearchTestCase):
+
+    def test_tree(self):
+        tree = ArrayTree(capacity=2)
+        tree.add_children(0, [10, 11, 12])
+        self.assertEqual(list(tree.children(0)), [1, 2, 3])
+        self.assertEqual(tree.select_child(0, 2), 1, 'unvisited children first, in order')
+        tree.add_children(2, [20, 21])
+        self.assertEqual(len(tree), 6)
+        self.assertEqual(tree.path(5), [11, 21])
+        self.assertEqual(list(tree.depth[:6]), [0, 1, 1, 1, 2, 2])
+        tree.backup(5, 1)
+        tree.backup(1, -1)
+        tree.backup(3, 0.5)
+        self.assertEqual((tree.n[0], tree.total[0]), (3, 0.5))
+        self.assertEqual(tree.q(2), 1)
+        self.assertEqual(tree.select_child(0, 0), 2, 'highest average once all are visited')
+        self.assertEqual(tree.select_child(0, 100), 2)
+        tree.backup(1, -1)
+        self.assertEqual(tree.best_child(0), 1)
+        self.assertFalse(tree.is_expanded(4))
+        tree.add_children(4, [])
+        self.assertTrue(tree.is_expanded(4))
+        self.assertEqual(list(tree.children(4)), [])
+
+    def test_search(self):
+        agent = MCTSArrayAgent('player1', 'MCTSArrayAgent', self.save_file_path, max_time=0.3)
+        stats = MatchStats(1, 'player1', 'player2')
+        action = agent.act(self.state, 1, {}, stats)
+        self.assertTrue(self.state.is_legal(action))
+        tree = agent.MCTS.tree
+        # the search stats also count the update recording the search time
+        self.assertEqual(tree.n[0] + 1, agent.MCTS.nodes_searched)
+        self.assertEqual(stats.total_nodes_searched_player1, agent.MCTS.nodes_searched)
+        self.assertEqual(sum(tree.n[child] for child in tree.children(0)), tree.n[0])
+        self.assertGreater(tree.depth[:len(tree)].max(), 1)
+        # 34 bytes per node, allocated in doubling blocks
+        self.assertLessEqual(tree.nbytes, 2 * 34 * len(tree) + 34 * 1024)
+
+    def test_unsupported_options(self):
+        """ options the array search can't use are refused, not ignored """
+        for option in ({'workers': 2}, {'rave': 10}, {'transposition_table_size': 100}, {'batch_size': 4},
+                       {'reuse_tree': True}, {'incremental': True}):
+            with self.assertRaises(ValueError):
+                MCTSArrayAgent('player1', 'MCTSArrayAgent', self.save_file_path, max_time=0.1, **option)
+        agent = MCTSArrayAgent('player1', 'MCTSArrayAgent', self.save_file_path, max_time=0.1, leaf_rollouts=2,
+                               fast_rollouts=True)
+        self.assertFalse(agent.reuse_tree)
@@ -0,0 +1,67 @@
+import os
+import random
+import tempfile
+import unittest
+
+import numpy as np
+
+from ..agents.MCTSAgent import MCTSBatchAgent
+from ..gameEngine.batchPlayout import BatchPlayout
+from ..gameEngine.enums import Piece
+from ..gameEngine.state import ThudGameState
+from .fixtures import small_state
+
+
+class TestBatchPlayout(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.engine = BatchPlayout(seed=0)
+        rng = random.Random(0)
+        self.states = []
+        state = ThudGameState()
+        while not state.game_over():
+            self.states.append(state)
+            state = state.take_action(rng.choice(state.valid_actions()))
+
+    def test_action_count(self):
+        """ the total weight of a board must be its number of valid actions """
+        boards, _ = self.engine.load(self.states)
+        for board, state in zip(boards, self.states):
+            board = board[None, :]
+            if state.turn == Piece.DWARF:
+                weights, _ = self.engine.dwarf_weights(board, self.engine._sources(board, Piece.DWARF))
+            else:
+                weights, _, _ = self.engine.troll_weights(board, self.engine._sources(board, Piece.TROLL))
+            self.assertEqual(weights.sum(), len(state.valid_actions()))
+
+    def test_step(self):
+        """ a step must make one of the valid actions on every board """
+        boards, turns = self.engine.load(self.states)
+        self.engine.step(boards, turns)
+        for board, turn, state in zip(boards, turns, self.states):
+            next_boards, _ = self.engine.load([state.take_action(a) for a in state.valid_actions()])
+            self.assertTrue((next_boards == board).all(axis=1).any())
+            self.assertEqual(turn, state.turn_number + 1)
+
+    def test_simulate(self):
+        results = self.engine.simulate(self.states[-3:], [Piece.DWARF, Piece.TROLL, Piece.DWARF])
+        self.assertEqual(results.shape, (3,))
+        boards, turns = self.engine.playout(*self.engine.load(self.states[:5]))
+        self.assertTrue(self.engine.game_over(boards, turns).all())
+        self.assertTrue(np.array_equal(self.engine.results(boards, Piece.TROLL),
+                                       -self.engine.results(boards, Piece.DWARF)))
+
+    def test_agent_engine_layout(self):
+        """ the agent's engine is rebuilt for another layout of the same size """
+        states = [small_state(), small_state(non_playable=[(3, 5)])]
+        handle, save_file_path = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            agent = MCTSBatchAgent('player1', 'MCTSBatchAgent', save_file_path, iterations=1, seed=1)
+            agent.batch_simulation_policy([states[0]], [Piece.DWARF])
+            engine = agent.playout_engine
+            agent.batch_simulation_policy([states[1]], [Piece.DWARF])
+            self.assertIsNot(agent.playout_engine, engine)
+            self.assertFalse(agent.playout_engine.playable[agent.playout_engine._index(3, 5)])
+        finally:
+            os.remove(save_file_path)
@@ -0,0 +1,107 @@
+import random
+import unittest
+
+from ..gameEngine.bitboardGrid import BitboardGrid
+from ..gameEngine.enums import Piece
+from ..gameEngine.grid import Grid
+from ..gameEngine.state import ThudGameState
+from ..prog.perft import positions
+
+
+class TestBitboardGrid(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.grid = BitboardGrid()
+        self.grid.create_start_standard_board()
+        self.reference = Grid()
+        self.reference.create_start_standard_board()
+
+    def test_standard_grid_dimensions(self):
+        self.assertEqual(self.grid.dimensions, (15, 15))
+
+    def test_same_pieces_as_grid(self):
+        for x in range(-1, 17):
+            for y in range(-1, 17):
+                self.assertEqual(self.grid.get_piece(x, y),
+                                 self.reference.get_piece(x, y), (x, y))
+        for piece in Piece:
+            self.assertEqual(sorted(self.grid.get_piece_list(piece)),
+                             sorted(self.reference.get_piece_list(piece)), piece)
+
+    def test_set_and_move_piece(self):
+        self.assertEqual(self.grid.set_piece(4, 3, Piece.EMPTY), Piece.DWARF)
+        self.assertEqual(self.grid.set_piece(1, 1, Piece.DWARF), Piece.NON_PLAYABLE)
+        self.assertEqual(self.grid.get_piece(1, 1), Piece.NON_PLAYABLE)
+        self.assertEqual(self.grid.move_piece(1, 9, 9, 7), Piece.TROLL)
+        self.assertEqual(self.grid.get_piece(9, 7), Piece.DWARF)
+        self.assertEqual(self.grid.get_piece(1, 9), Piece.EMPTY)
+        self.assertEqual(self.grid.move_piece(2, 2, 7, 6), Piece.NON_PLAYABLE)
+
+    def test_rays_dont_wrap(self):
+        """ shifting off the edge of a row must not reach the next row """
+        self.grid.board_from_template([
+            [Piece.EMPTY, Piece.EMPTY, Piece.DWARF],
+            [Piece.EMPTY, Piece.EMPTY, Piece.EMPTY],
+            [Piece.TROLL, Piece.EMPTY, Piece.EMPTY]
+        ])
+        self.assertEqual(self.grid.get_empty_ray(1, 3, 0, 1), [])
+        self.assertEqual(self.grid.get_empty_ray(1, 3, 0, -1), [(1, 2), (1, 1)])
+        self.assertEqual(self.grid.get_empty_ray(1, 3, 1, -1), [(2, 2)])
+        self.assertEqual(self.grid.get_adjacent(2, 1, Piece.TROLL), [(3, 1)])
+        self.assertEqual(self.grid.get_adjacent(2, 1, Piece.DWARF), [])
+
+    def test_copy(self):
+        new_grid = self.grid.deepcopy()
+        self.assertEqual(self.grid, new_grid)
+        new_grid.set_piece(10, 10, Piece.DWARF)
+        self.assertNotEqual(self.grid.get_piece(10, 10), new_grid.get_piece(10, 10))
+
+    def action_keys(self, state):
+        return sorted((a.from_loc, a.to_loc, sorted(a.capture), a.movetype.value)
+                      for a in state.valid_actions())
+
+    def test_same_actions_as_grid(self):
+        """ play random games on both grids and check the valid actions always match """
+        rng = random.Random(0)
+        state = ThudGameState(grid_type=Grid)
+        bit_state = ThudGameState(grid_type=BitboardGrid)
+        while not state.game_over():
+            self.assertEqual(self.action_keys(state), self.action_keys(bit_state))
+            action = rng.choice(state.valid_actions())
+            state = state.take_action(action)
+            bit_state = bit_state.take_action(action)
+            self.assertEqual(state.score(Piece.DWARF), bit_state.score(Piece.DWARF))
+            self.assertEqual(state.score(Piece.TROLL), bit_state.score(Piece.TROLL))
+
+    def test_same_packed_actions_as_grid(self):
+        """ the set-wise move generation finds the same packed actions, in both capture modes """
+        for max_captures_only in (False, True):
+            rng = random.Random(1)
+            for state, bit_state in zip(positions(Grid), positions(BitboardGrid)):
+                state.max_captures_only = bit_state.max_captures_only = max_captures_only
+                for _ in range(20):
+                    if state.game_over():
+                        break
+                    actions = state.valid_packed_actions()
+                    self.assertEqual(sorted(actions), sorted(bit_state.valid_packed_actions()))
+                    action = rng.choice(actions)
+                    state.make(action)
+                    bit_state.make(action)
+
+    def test_rays_and_lines(self):
+        self.grid.board_from_template([
+            [Piece.DWARF, Piece.DWARF, Piece.DWARF, Piece.EMPTY],
+            [Piece.EMPTY, Piece.EMPTY, Piece.EMPTY, Piece.EMPTY],
+            [Piece.TROLL, Piece.EMPTY, Piece.NON_PLAYABLE, Piece.EMPTY]
+        ])
+        bits = self.grid._locations
+        self.assertEqual([bits(ray) for ray in self.grid.rays(self.grid.dwarves, 1, 0)],
+                         [[(2, 1), (2, 2), (2, 3)], [(3, 2)]])
+        self.assertEqual([bits(ray) for ray in self.grid.rays(self.grid.dwarves, 1, 0, length=1)],
+                         [[(2, 1), (2, 2), (2, 3)]])
+        self.assertEqual([bits(line) for line in self.grid.lines(self.grid.dwarves, 0, 1)],
+                         [[(1, 1), (1, 2), (1, 3)], [(1, 1), (1, 2)], [(1, 1)]])
+        planes = self.grid.adjacent_planes(Piece.TROLL)
+        for x, y in [(2, 1), (2, 2), (3, 2), (2, 4)]:
+            mask = sum(1 << i for i, plane in enumerate(planes) if plane >> self.grid._index(x, y) & 1)
+            self.assertEqual(mask, self.grid.get_adjacent_mask(x, y, Piece.TROLL), (x, y))
@@ -1,8 +1,11 @@
 
 import unittest
+from itertools import combinations
 
-from ..gameEngine.enums import Piece
-from ..gameEngine.state import Action, ThudGameState, MoveType
+from ..gameEngine.boardTables import SUBSETS
+from ..gameEngine.enums import HistoryPolicy, Piece
+from ..gameEngine.state import (Action, ThudGameState, MoveType, PackedAction, as_action, pack_action,
+                                stack_representations)
 
 
 class TestGameState(unittest.TestCase):
@@ -266,3 +269,182 @@ class TestGameState(unittest.TestCase):
     #     self.assertTrue(accepted)
     #     self.assertEqual(self.state.grid.get_piece(5,6), Piece.DWARF)
     #     self.assertNotEqual(self.state.grid.get_piece(5,2), Piece.DWARF)
+
+    def test_make_unmake(self):
+        """ making then unmaking actions must restore the state exactly """
+        start = self.state.deepcopy()
+        hurl = Action((7, 1), (7, 7), {(7, 7)}, MoveType.DWARF_HURL)
+        self.state.make(hurl)
+        self.assertEqual(self.state, start.take_action(hurl))
+        self.assertEqual(self.state.grid.get_piece(7, 7), Piece.DWARF)
+        self.assertEqual(self.state.turn, Piece.TROLL)
+        troll_action = self.state.valid_actions()[0]
+        self.state.make(troll_action)
+        self.assertEqual(self.state.unmake(), troll_action)
+        self.assertEqual(self.state.unmake(), hurl)
+        self.assertEqual(self.state, start)
+        self.assertEqual(self.state.grid.get_piece(7, 7), Piece.TROLL)
+        self.assertEqual(self.state.prev_action, None)
+
+    def test_zobrist_key(self):
+        """ the incrementally updated key must match a key computed from scratch """
+        start_key = self.state.zobrist_key
+        for action in self.state.valid_actions()[:3] + [
+                Action((7, 1), (7, 7), {(7, 7)}, MoveType.DWARF_HURL)]:
+            self.state.make(action)
+            scratch = ThudGameState(grid=self.state.grid.deepcopy(), turn_number=self.state.turn_number)
+            scratch.grid.board_from_template([row[:] for row in scratch.grid.board])
+            self.assertEqual(self.state.zobrist_key, scratch.zobrist_key)
+            self.assertNotEqual(self.state.zobrist_key, start_key)
+            self.state.unmake()
+        self.assertEqual(self.state.zobrist_key, start_key)
+        self.state._next_move()
+        self.assertNotEqual(self.state.zobrist_key, start_key, 'side to move is hashed')
+
+    def test_packed_actions(self):
+        """ packed actions must describe the same actions as valid_actions and convert back unchanged """
+        hurl = Action((7, 1), (7, 7), {(7, 7)}, MoveType.DWARF_HURL)
+        self.assertEqual(as_action(pack_action(hurl)), hurl)
+        for state in [self.state, self.state.take_action(self.state.valid_actions()[0])]:
+            actions = state.valid_actions()
+            packed = state.valid_packed_actions()
+            self.assertEqual(sorted(packed), sorted(pack_action(action) for action in actions))
+            for action in actions:
+                self.assertEqual(as_action(pack_action(action)), action)
+                self.assertEqual(PackedAction.from_action(action), action)
+                self.assertEqual(hash(PackedAction.from_action(action)), hash(action))
+        code = packed[0]
+        self.assertEqual(state.take_action(code), state.take_action(as_action(code)))
+
+    def test_representation(self):
+        representation = self.state.get_representation()
+        self.assertEqual(representation.shape, (1, 3, 15, 15))
+        self.assertEqual(representation[0, 0].sum(), 32)
+        self.assertEqual(representation[0, 1].sum(), 8)
+        self.assertEqual(representation[0, 0, 0, 5], 1, 'dwarf at (1, 6)')
+        self.assertEqual(representation[0, 1, 6, 6], 1, 'troll at (7, 7)')
+        self.assertTrue((representation[0, 2] == 1).all(), 'dwarves to move')
+
+        full_history = self.state.deepcopy(history_policy=HistoryPolicy.FULL)
+        next_state = full_history.take_action(Action((1, 6), (2, 6), set(), MoveType.DWARF_MOVE))
+        history = stack_representations(next_state.history())
+        self.assertEqual(history.shape, (2, 3, 15, 15))
+        self.assertTrue((history[0] == representation[0]).all())
+        self.assertEqual(history[1, 0, 1, 5], 1)
+        self.assertEqual(history[1, 0, 0, 5], 0)
+        self.assertTrue((history[1, 2] == 0).all(), 'trolls to move')
+
+    def test_iter_and_count_actions(self):
+        """ iter_actions yields the valid actions, biggest captures first, and count_actions counts them """
+        troll_state = self.state.take_action(Action((7, 1), (7, 5), set(), MoveType.DWARF_MOVE))
+        for state in [self.state, troll_state]:
+            actions = list(state.iter_actions())
+            self.assertEqual(sorted(map(pack_action, actions)),
+                             sorted(map(pack_action, state.valid_actions())))
+            sizes = [len(a.capture) for a in actions]
+            self.assertEqual(sizes, sorted(sizes, reverse=True))
+            self.assertEqual(state.count_actions(), len(actions))
+            for loc in state.get_locations(state.turn):
+                self.assertEqual(state.has_any_action(loc), len(state.get_actions_from_loc(*loc)) > 0)
+        self.assertEqual(len(next(troll_state.iter_actions()).capture), 1, 'troll can capture (7, 5)')
+        self.assertFalse(self.state.has_any_action((8, 8)), 'no piece at the centre')
+
+    def test_shove_captures(self):
+        """ shoves capture a non empty subset of the adjacent dwarves, or all of them in max_captures_only mode """
+        self.assertEqual(len(SUBSETS[0b1011]), 7)
+        self.assertEqual(SUBSETS[0], ())
+        template = [
+            [Piece.EMPTY, Piece.EMPTY, Piece.EMPTY, Piece.EMPTY],
+            [Piece.EMPTY, Piece.EMPTY, Piece.DWARF, Piece.DWARF],
+            [Piece.TROLL, Piece.TROLL, Piece.EMPTY, Piece.EMPTY],
+            [Piece.EMPTY, Piece.EMPTY, Piece.EMPTY, Piece.DWARF],
+        ]
+        self.state.grid.board_from_template(template)
+        self.state.turn = Piece.TROLL
+        for max_captures_only, shoves, moves in [(False, 7, 16), (True, 1, 12)]:
+            self.state.max_captures_only = max_captures_only
+            actions = self.state.valid_actions()
+            shove_captures = [a.capture for a in actions
+                              if a.movetype == MoveType.TROLL_SHOVE and a.to_loc == (3, 3)]
+            self.assertEqual(len(shove_captures), shoves)
+            self.assertIn({(2, 3), (2, 4), (4, 4)}, shove_captures)
+            self.assertNotIn(set(), shove_captures)
+            self.assertEqual(len([a for a in actions if a.movetype == MoveType.TROLL_MOVE]), moves)
+            self.assertEqual(self.state.count_actions(), len(actions))
+            self.assertEqual(self.state.get_capture_sets((3, 3), MoveType.TROLL_SHOVE), shove_captures)
+
+    def test_history_policy(self):
+        actions = [Action((1, 6), (2, 6), set(), MoveType.DWARF_MOVE),
+                   Action((7, 7), (6, 6), set(), MoveType.TROLL_MOVE),
+                   Action((2, 6), (3, 6), set(), MoveType.DWARF_MOVE)]
+        none = self.state.take_action(actions[0])
+        self.assertIsNone(none.previous_state, 'no history by default')
+
+        full = self.state.deepcopy(history_policy=HistoryPolicy.FULL)
+        ring = ThudGameState(history_policy=HistoryPolicy.RING, history_length=2)
+        keys = []
+        for action in actions:
+            keys.append(ring.zobrist_key)
+            full = full.take_action(action)
+            ring = ring.take_action(action)
+        self.assertEqual(len(full.history()), 4)
+        self.assertIsNone(full.deepcopy(history_policy=HistoryPolicy.NONE).previous_state)
+        self.assertIsNone(ring.previous_state)
+        self.assertEqual(list(ring.recent_history), list(zip(keys[1:], actions[1:])))
+
+        # unmake brings back the entry pushed out of the ring
+        before = list(ring.recent_history)
+        ring.make(Action((6, 6), (7, 7), set(), MoveType.TROLL_MOVE))
+        self.assertEqual(ring.recent_history[0], before[1])
+        ring.unmake()
+        self.assertEqual(list(ring.recent_history), before)
+
+    def test_features(self):
+        features = self.state.features()
+        self.assertEqual((features['dwarves'], features['trolls'], features['material']), (32, 8, 0))
+        self.assertEqual(features['turns_left'], 70)
+        hurl = Action((7, 1), (7, 7), {(7, 7)}, MoveType.DWARF_HURL)
+        self.state.make(hurl)
+        self.assertEqual(self.state.grid.count(Piece.TROLL), 7)
+        self.assertEqual(self.state.material, 4)
+        self.assertEqual(self.state.results(Piece.TROLL), -4)
+        self.assertEqual(self.state.winner(), Piece.DWARF)
+        self.state.unmake()
+        self.assertEqual(self.state.features(), features)
+        self.assertEqual(self.state.winner(), 'draw')
+
+    def test_is_legal(self):
+        """ is_legal agrees with valid_actions on every action a piece could try """
+        troll_state = self.state.take_action(Action((7, 1), (7, 5), set(), MoveType.DWARF_MOVE))
+        shove_state = self.state.deepcopy()
+        shove_state.grid.board_from_template([
+            [Piece.EMPTY, Piece.EMPTY, Piece.EMPTY, Piece.EMPTY],
+            [Piece.EMPTY, Piece.EMPTY, Piece.DWARF, Piece.DWARF],
+            [Piece.TROLL, Piece.TROLL, Piece.EMPTY, Piece.EMPTY],
+            [Piece.EMPTY, Piece.EMPTY, Piece.EMPTY, Piece.DWARF],
+        ])
+        shove_state.turn = Piece.TROLL
+        for state, max_captures_only in [(self.state, False), (troll_state, False),
+                                         (shove_state, False), (shove_state, True)]:
+            state.max_captures_only = max_captures_only
+            valid = set(state.valid_packed_actions())
+            legal = 0
+            x_dimension, y_dimension = len(state.grid.board), len(state.grid.board[0])
+            movetypes = ((MoveType.DWARF_MOVE, MoveType.DWARF_HURL) if state.turn == Piece.DWARF
+                         else (MoveType.TROLL_MOVE, MoveType.TROLL_SHOVE))
+            for from_loc in state.get_locations(state.turn):
+                for to_loc in [(x, y) for x in range(1, x_dimension + 1) for y in range(1, y_dimension + 1)]:
+                    adjacent = state.grid.get_adjacent(*to_loc, Piece.DWARF)
+                    captures = {frozenset(), frozenset([to_loc])}
+                    captures.update(frozenset(c) for size in range(1, len(adjacent) + 1)
+                                    for c in combinations(adjacent, size))
+                    for movetype in movetypes:
+                        for capture in captures:
+                            action = Action(from_loc, to_loc, set(capture), movetype)
+                            expected = pack_action(action) in valid
+                            self.assertEqual(state.is_legal(action), expected, str(action))
+                            self.assertEqual(state.is_legal(pack_action(action)), expected)
+                            legal += expected
+            self.assertEqual(legal, len(valid), 'every valid action was tried')
+        self.assertFalse(self.state.is_legal(Action((7, 1), (7, 5), set(), MoveType.TROLL_MOVE)))
+        self.assertFalse(self.state.is_legal(Action(None, None, set(), None)))
@@ -1,4 +1,5 @@
 import unittest
+from ..gameEngine.boardTables import DIRECTION_INDEX
 from ..gameEngine.grid import Grid
 from ..gameEngine.enums import Piece
 
@@ -174,3 +175,37 @@ class TestGrid(unittest.TestCase):
         self.assertEqual(self.grid.get_piece(
             1, 1), Piece.EMPTY, 'template correct')
         self.assertEqual(self.grid.get_piece(2, 2), Piece.EMPTY)
+
+    def test_tables(self):
+        """ rays stop at non playable locations and tables are shared by boards with the same layout """
+        self.assertIs(self.grid.tables, self.grid.deepcopy().tables)
+        other = Grid()
+        other.create_start_standard_board()
+        self.assertIs(self.grid.tables, other.tables)
+        rays = self.grid.tables.rays[(8, 6)]
+        self.assertEqual(rays[DIRECTION_INDEX[(0, 1)]], ((8, 7),), 'centre is not playable')
+        self.assertEqual(len(rays[DIRECTION_INDEX[(0, -1)]]), 5)
+        self.assertEqual(self.grid.tables.adjacent[(1, 6)], ((2, 7), (2, 6), (2, 5), (1, 7)))
+
+        template = [
+            [Piece.EMPTY, Piece.NON_PLAYABLE, Piece.EMPTY],
+            [Piece.DWARF, Piece.EMPTY, Piece.TROLL],
+            [Piece.TROLL, Piece.EMPTY, Piece.EMPTY]
+        ]
+        self.grid.board_from_template(template)
+        self.assertEqual(self.grid.get_empty_ray(1, 1, 0, 1), [])
+        self.assertEqual(self.grid.get_empty_ray(1, 3, 1, -1), [(2, 2)])
+        self.assertEqual(self.grid.get_line_length(2, 1, 1, 0, Piece.DWARF), 1)
+        self.assertEqual(self.grid.get_adjacent(2, 2, Piece.TROLL), [(3, 1), (2, 3)])
+
+    def test_slots(self):
+        """ after any sequence of changes each slot must point at its location in the piece list """
+        self.grid.move_piece(7, 7, 8, 6)
+        self.grid.remove_piece(1, 6)
+        self.grid.set_piece(10, 10, Piece.TROLL)
+        self.grid.deepcopy().set_piece(10, 11, Piece.DWARF)
+        for piece, locs in self.grid.pieces.items():
+            self.assertEqual(len(locs), len(self.grid.slots[piece]))
+            for i, loc in enumerate(locs):
+                self.assertEqual(self.grid.slots[piece][loc], i)
+                self.assertEqual(self.grid.get_piece(*loc), piece)
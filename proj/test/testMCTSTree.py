@@ -1,4 +1,225 @@
-import unittest
+import math
+import os
+import pickle
+import tempfile
 
-class TestGrid(unittest.TestCase):
-    pass
\ No newline at end of file
+from ..agents.MCTSAgent import MCTSBatchAgent, MCTSRandAgent, merge_root_stats, select_best_action
+from ..agents.helper_files.gameTreeNode import GameTreeNode
+from ..agents.randomAgent import RandomAgent
+from ..gameEngine.state import move_key, pack_action, unpack_locations
+from ..prog.match import play_match
+from ..prog.matchStats import MatchStats
+from ..userInterfaces.userInterface import QuietUI
+from .fixtures import SearchTestCase
+
+
+class TestMCTSTree(SearchTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.stats = MatchStats(1, 'player1', 'player2')
+
+    def test_find_node(self):
+        root = GameTreeNode(state=self.state, action=None, depth=0, parent=None)
+        child = root.expand_new_node()
+        self.assertIs(root.find_node(child.key), child)
+        self.assertIsNone(root.find_node(root.key))
+        self.assertFalse(child.is_root())
+        child.set_as_root()
+        self.assertTrue(child.is_root())
+        self.assertEqual(child.depth, 1)
+
+    def test_lazy_actions(self):
+        """ a node's actions are generated when it's first expanded, all at once or one at a time """
+        root = GameTreeNode(state=self.state, action=None, depth=0, parent=None)
+        self.assertIsNone(root._untried_actions)
+        child = root.expand_new_node()
+        self.assertIsNone(child._untried_actions, 'a new leaf has no actions')
+        self.assertEqual(len(root.unvisited_actions), self.state.count_actions() - 1)
+
+        root = GameTreeNode(state=self.state, action=None, depth=0, parent=None, incremental=True)
+        actions = []
+        while root.has_untried_actions():
+            self.assertLessEqual(len(root.unvisited_actions), 1)
+            actions.append(root.expand_new_node().action)
+        self.assertEqual(actions, [pack_action(action) for action in self.state.iter_actions()])
+        self.assertTrue(root.is_fully_expanded())
+        self.assertTrue(root.children[0].incremental)
+
+    def test_incremental_search(self):
+        """ a search expands the actions of each node one at a time from iter_actions, also in a kept tree """
+        agent = MCTSRandAgent('player1', 'MCTSRandAgent', self.save_file_path, iterations=150, seed=1,
+                              incremental=True)
+        action = agent.act(self.state, 1, {}, self.stats)
+        state = self.state.take_action(action)
+        reply = max(agent.root.children, key=lambda child: child.n)
+        first_search_state = reply._action_state
+        self.assertIsNotNone(first_search_state)
+        agent.act(state.take_action(reply.action), 1, {}, self.stats)
+        self.assertIsNot(reply._action_state, first_search_state, 'the kept node reads the new search state')
+
+        def check(node, state):
+            actions = [child.action for child in node.children] + node._untried_actions
+            self.assertEqual(len(set(actions)), len(actions))
+            self.assertLessEqual(set(actions), set(state.valid_packed_actions()))
+            captures = [len(unpack_locations(action)[2]) for action in actions]
+            self.assertEqual(captures, sorted(captures, reverse=True), 'biggest captures first')
+            for child in node.children:
+                self.assertTrue(child.incremental)
+                if child._untried_actions is not None:
+                    check(child, state.take_action(child.action))
+        check(reply, state.take_action(reply.action))
+
+    def test_ucb_child(self):
+        """ the vectorised UCB picks the same child as scoring the children one at a time """
+        agent = MCTSRandAgent('player1', 'MCTSRandAgent', self.save_file_path, max_time=0.2)
+        root = GameTreeNode(state=self.state, action=None, depth=0, parent=None)
+        agent.MCTS.search(root)
+        for node in [root] + root.children:
+            if len(node.children) > 0:
+                self.assertEqual(list(node.child_n[:len(node.children)]), [child.n for child in node.children])
+                self.assertIs(agent.MCTS.best_child(node), max(node.children, key=agent.MCTS.ucb))
+        child = root.children[0]
+        child.set_stats(0, 0)
+        self.assertIs(root.ucb_child(2), child, 'unvisited children first')
+
+    def test_reuse_tree(self):
+        """ the next search starts from the node of the opponent's reply, with its visits """
+        agent = MCTSRandAgent('player1', 'MCTSRandAgent', self.save_file_path, max_time=0.3)
+        action = agent.act(self.state, 1, {}, self.stats)
+        kept = agent.root
+        state = self.state.take_action(action)
+        self.assertTrue(kept.is_root())
+        self.assertEqual(kept.key, state.zobrist_key)
+
+        reply = max(kept.children, key=lambda child: child.n)
+        visits = reply.n
+        agent.act(state.take_action(reply.action), 1, {}, self.stats)
+        self.assertTrue(reply.is_root())
+        self.assertGreater(reply.n, visits)
+        self.assertIs(agent.root.parent, None)
+        self.assertEqual(agent.root.depth, 3)
+
+        # a new game starts a new tree
+        agent.act(self.state, 2, {}, self.stats)
+        self.assertEqual(agent.root.depth, 1)
+
+        agent = MCTSRandAgent('player1', 'MCTSRandAgent', self.save_file_path, max_time=0.1, reuse_tree=False)
+        agent.act(self.state, 1, {}, self.stats)
+        self.assertIsNone(agent.root)
+
+    def test_merge_root_stats(self):
+        merged = merge_root_stats([{1: (3, 1), 2: (5, -2)}, {1: (4, 4), 3: (1, 1)}])
+        self.assertEqual(merged, {1: (7, 5), 2: (5, -2), 3: (1, 1)})
+        self.assertEqual(select_best_action(merged), 1)
+
+    def test_root_parallel(self):
+        """ the action is chosen from the visits of every worker's search """
+        for agent_type in (MCTSRandAgent, MCTSBatchAgent):
+            agent = agent_type('player1', agent_type.__name__, self.save_file_path, max_time=0.3, workers=2)
+            stats = MatchStats(1, 'player1', 'player2')
+            try:
+                action = agent.act(self.state, 1, {}, stats)
+                self.assertTrue(self.state.is_legal(action))
+                # the worker's iterations are counted too
+                self.assertGreater(stats.total_nodes_searched_player1, agent.MCTS.nodes_searched)
+                copy = pickle.loads(pickle.dumps(agent))
+                self.assertIsNone(copy.root)
+                self.assertIsNone(copy.pool)
+            finally:
+                agent.close()
+
+    def test_match_closes_workers(self):
+        """ the worker processes are shut down when a match ends """
+        agent = MCTSRandAgent('player1', 'MCTSRandAgent', self.save_file_path, iterations=20, workers=2)
+        opponent = RandomAgent('player2', 'RandomAgent')
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            # the match appends its stats to results.txt in the working directory
+            os.chdir(directory)
+            try:
+                play_match(1, agent, opponent, QuietUI(), game_length=2)
+            finally:
+                os.chdir(cwd)
+        self.assertIsNone(agent.pool)
+
+    def test_leaf_rollouts(self):
+        """ each leaf is simulated leaf_rollouts times in one batch and backed up once """
+        for batch_size in (1, 3):
+            agent = MCTSRandAgent('player1', 'MCTSRandAgent', self.save_file_path, max_time=0.2,
+                                  batch_size=batch_size, leaf_rollouts=4)
+            batches = []
+            simulate = agent.MCTS.batch_simulation_policy
+
+            def counting_policy(states, pieces):
+                batches.append(len(states))
+                return simulate(states, pieces)
+            agent.MCTS.batch_simulation_policy = counting_policy
+            root = GameTreeNode(state=self.state, action=None, depth=0, parent=None)
+            agent.MCTS.search(root)
+            self.assertEqual(set(batches), {4 * batch_size})
+            self.assertEqual(root.n, len(batches) * batch_size)
+
+    def test_amaf(self):
+        """ a result counts once for each move played after a node by the node's side to move """
+        agent = MCTSRandAgent('player1', 'MCTSRandAgent', self.save_file_path, iterations=1, rave=10)
+        root = GameTreeNode(state=self.state, action=None, depth=0, parent=None)
+        child = root.expand_new_node()
+        leaf = child.expand_new_node()
+        root_keys = {move_key(action) for action in root.unvisited_actions}
+        dwarf_move = next(action for action in leaf.state.valid_packed_actions()
+                          if move_key(action) in root_keys)
+        troll_move = leaf.state.take_action(dwarf_move).valid_packed_actions()[0]
+        agent.MCTS.back_propogate_results(1, leaf, [dwarf_move, troll_move, dwarf_move])
+
+        self.assertEqual(root.amaf.q(child.action), 1)
+        self.assertEqual(root.amaf.n[root.amaf.slots[move_key(dwarf_move)]], 1)
+        self.assertIsNone(root.amaf.q(troll_move), 'the other side\'s moves are not counted')
+        self.assertEqual(child.amaf.q(leaf.action), 1)
+        self.assertIsNone(leaf.amaf, 'no stats before the actions are generated')
+
+    def test_rave(self):
+        """ RAVE selection blends each child's value with its move's AMAF value """
+        for fast_rollouts in (False, True):
+            agent = MCTSRandAgent('player1', 'MCTSRandAgent', self.save_file_path, iterations=300, seed=1,
+                                  rave=20, fast_rollouts=fast_rollouts)
+            mcts = agent.MCTS
+            root = GameTreeNode(state=self.state, action=None, depth=0, parent=None)
+            mcts.search(root)
+            # the moves of the simulations are counted as well as the ones in the tree
+            self.assertGreater(root.amaf.n.sum(), sum(child.n for child in root.children))
+
+            def rave_ucb(child):
+                amaf_q = child.parent.amaf.q(child.action)
+                beta = math.sqrt(20 / (3 * child.n + 20))
+                q = child.q if amaf_q is None else (1 - beta) * child.q + beta * amaf_q
+                return q + mcts.UCB_CONSTANT * math.sqrt(math.log(child.parent.n) / child.n)
+            for node in [root] + root.children:
+                if len(node.children) > 0 and all(child.n > 0 for child in node.children):
+                    self.assertIs(mcts.best_child(node), max(node.children, key=rave_ucb))
+
+    def test_rave_expansion(self):
+        """ with RAVE the AMAF values choose between expanding an untried action and going down to a child """
+        agent = MCTSRandAgent('player1', 'MCTSRandAgent', self.save_file_path, iterations=1, rave=20)
+        mcts = agent.MCTS
+        root = GameTreeNode(state=self.state, action=None, depth=0, parent=None)
+        state = self.state.deepcopy()
+        child = mcts.traverse(root, state)
+        state.unmake()
+        troll_move = self.state.take_action(child.action).valid_packed_actions()[0]
+        # an untried action played later in a good simulation
+        good = root.unvisited_actions[0]
+        mcts.back_propogate_results(-3, child)
+        mcts.back_propogate_results(5, child, [troll_move, good])
+        self.assertTrue(root.has_untried_actions(state))
+
+        new_child = mcts.traverse(root, state)
+        self.assertEqual(new_child.action, good, 'the untried action with the best AMAF value is expanded')
+        state.unmake()
+        mcts.back_propogate_results(-10, new_child)
+
+        # the first child now looks better than any untried action, so the search goes down to it
+        child.set_stats(child.n, 100)
+        node = mcts.traverse(root, state)
+        self.assertTrue(root.has_untried_actions(state))
+        self.assertIs(node.parent, child)
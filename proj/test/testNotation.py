@@ -0,0 +1,53 @@
+import unittest
+
+from ..gameEngine.bitboardGrid import BitboardGrid
+from ..gameEngine.enums import HistoryPolicy, Piece
+from ..gameEngine.grid import Grid
+from ..gameEngine.notation import from_bytes, from_text, size_in_bytes, to_bytes, to_text
+from ..gameEngine.state import ThudGameState
+from ..prog.perft import positions
+
+
+class TestNotation(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.state = ThudGameState()
+
+    def test_start_position(self):
+        text = to_text(self.state)
+        self.assertTrue(text.startswith('-----dd1dd-----/----d5d----/'))
+        self.assertTrue(text.endswith('/-----dd1dd----- d 1 70'))
+        self.assertIn('/d5TTT5d/6T-T6/', text)
+        self.assertEqual(len(to_bytes(self.state)), 63)
+        self.assertEqual(size_in_bytes(), 63)
+
+    def test_round_trip(self):
+        """ text and binary notation keep the board, the side to move and the turns """
+        for grid_type in (Grid, BitboardGrid):
+            for state in positions(grid_type):
+                state.turns_per_game = 80
+                for encode, decode in [(to_text, from_text), (to_bytes, from_bytes)]:
+                    copy = decode(encode(state))
+                    self.assertEqual(copy.grid.board, state.grid.board)
+                    self.assertEqual(copy.zobrist_key, state.zobrist_key)
+                    self.assertEqual((copy.turn, copy.turn_number, copy.turns_per_game),
+                                     (state.turn, state.turn_number, state.turns_per_game))
+                    self.assertEqual(encode(copy), encode(state))
+
+    def test_state_arguments(self):
+        state = from_bytes(to_bytes(self.state), grid_type=BitboardGrid, max_captures_only=True,
+                           history_policy=HistoryPolicy.FULL)
+        self.assertIsInstance(state.grid, BitboardGrid)
+        self.assertTrue(state.max_captures_only)
+        self.assertEqual(state.history_policy, HistoryPolicy.FULL)
+        self.assertEqual(state.grid.count(Piece.DWARF), 32)
+
+    def test_errors(self):
+        text = to_text(self.state)
+        for bad in [text.replace(' d 1 ', ' T 1 '), text.replace('dd1dd', 'dd1xd', 1),
+                    text.replace('dd1dd', 'dd2dd', 1), text.rsplit(' ', 1)[0]]:
+            with self.assertRaises(ValueError):
+                from_text(bad)
+        for bad in [to_bytes(self.state)[:-1], b'', b'\x0f', to_bytes(self.state)[:5]]:
+            with self.assertRaises(ValueError):
+                from_bytes(bad)
@@ -0,0 +1,18 @@
+import unittest
+
+from ..prog.perft import cross_check, run
+
+
+class TestPerft(unittest.TestCase):
+    """ node counts of the start position and the stored midgame positions """
+
+    def test_depth_1(self):
+        self.assertEqual([nodes for nodes, _ in run('reference', 1)], [656, 60, 48, 527])
+
+    def test_depth_2(self):
+        self.assertEqual([nodes for nodes, _ in run('count', 2)], [23072, 23821, 21741, 37749])
+
+    def test_engines_agree(self):
+        self.assertEqual(cross_check(1), [])
+        for position in (1, 2):
+            self.assertEqual(cross_check(2, ['make', 'bitboard_make', 'batch'], position), [])
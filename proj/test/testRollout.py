@@ -0,0 +1,131 @@
+import os
+import random
+import tempfile
+import unittest
+
+from ..agents.MCTSAgent import MCTSUnequalAgent
+from ..agents.helper_files.gameTreeNode import GameTreeNode
+from ..gameEngine.bitboardGrid import BitboardGrid
+from ..gameEngine.enums import HistoryPolicy, Piece
+from ..gameEngine.grid import Grid
+from ..gameEngine.rollout import RolloutEngine
+from ..gameEngine.state import ThudGameState
+from ..prog.matchStats import MatchStats
+from ..prog.perft import positions
+from .fixtures import small_state
+
+
+class TestRollout(unittest.TestCase):
+
+    def successors(self, state) -> set:
+        """ @return: the zobrist keys of the boards reached by the valid actions """
+        return {state.take_action(action).grid.zobrist_key for action in state.valid_packed_actions()}
+
+    def step(self, engine, state) -> int:
+        """ @return: the zobrist key of the board after one engine step from the state """
+        engine.load(state)
+        self.assertTrue(engine.step())
+        copy = state.deepcopy()
+        engine.store(copy)
+        self.assertEqual(copy.turn_number, state.turn_number + 1)
+        return copy.grid.zobrist_key
+
+    def test_steps_are_valid(self):
+        """ every action the engine makes is a valid action, in both capture modes """
+        rng = random.Random(2)
+        for max_captures_only in (False, True):
+            engine = RolloutEngine(seed=1, max_captures_only=max_captures_only)
+            for state in positions()[1:]:
+                state.max_captures_only = max_captures_only
+                for _ in range(10):
+                    successors = self.successors(state)
+                    for _ in range(10):
+                        self.assertIn(self.step(engine, state), successors)
+                    state = state.take_action(rng.choice(state.valid_packed_actions()))
+
+    def test_every_action_can_be_played(self):
+        state = positions()[1]
+        engine = RolloutEngine(seed=1)
+        played = {self.step(engine, state) for _ in range(5000)}
+        self.assertEqual(played, self.successors(state))
+
+    def test_playout(self):
+        engine = RolloutEngine(seed=1)
+        for grid_type in (Grid, BitboardGrid):
+            state = engine(ThudGameState(grid_type=grid_type))
+            self.assertTrue(state.game_over())
+            self.assertEqual(state.grid.count(Piece.TROLL), len(engine.pieces[2]))
+            self.assertEqual(state.material, len(engine.pieces[1]) - 4 * len(engine.pieces[2]))
+
+    def test_recorded_moves(self):
+        """ a state with a RING history gets the actions played, which replay the playout """
+        engine = RolloutEngine(seed=3)
+        start = ThudGameState(turns_per_game=30)
+        state = engine(start.deepcopy(history_policy=HistoryPolicy.RING, history_length=30))
+        self.assertEqual(len(state.recent_history), state.turn_number - start.turn_number)
+        replay = start.deepcopy()
+        for key, action in state.recent_history:
+            self.assertIsNone(key)
+            self.assertTrue(replay.is_legal(action))
+            replay.take_action_on_state(action)
+        self.assertEqual(replay.grid.zobrist_key, state.grid.zobrist_key)
+        self.assertIsNone(engine(start.deepcopy()).recent_history, 'nothing recorded without a history')
+
+    def test_engine_layout(self):
+        """ the agent's engine is rebuilt for another layout of the same size or other rules """
+        handle, save_file_path = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            agent = MCTSUnequalAgent('player1', 'MCTSUnequalAgent', save_file_path, iterations=1, seed=1)
+            open_board, blocked_board = small_state(), small_state(non_playable=[(3, 5)])
+            agent.rollout_policy(open_board.deepcopy())
+            engine = agent.rollout_engine
+            for _ in range(20):
+                state = agent.rollout_policy(blocked_board.deepcopy())
+                self.assertEqual(state.grid.get_piece(3, 5), Piece.NON_PLAYABLE)
+            self.assertIsNot(agent.rollout_engine, engine)
+            engine = agent.rollout_engine
+            state = blocked_board.deepcopy()
+            state.max_captures_only = True
+            agent.rollout_policy(state)
+            self.assertIsNot(agent.rollout_engine, engine)
+            self.assertTrue(agent.rollout_engine.max_captures_only)
+        finally:
+            os.remove(save_file_path)
+
+    def test_agent_batches(self):
+        """ fast_rollouts is used for leaf_rollouts and batches too """
+        handle, save_file_path = tempfile.mkstemp()
+        os.close(handle)
+        playouts = []
+        playout = RolloutEngine.playout
+
+        def counting_playout(engine, turns_per_game):
+            playouts.append(turns_per_game)
+            return playout(engine, turns_per_game)
+        RolloutEngine.playout = counting_playout
+        try:
+            for kwargs in ({'leaf_rollouts': 4}, {'batch_size': 3}):
+                agent = MCTSUnequalAgent('player1', 'MCTSUnequalAgent', save_file_path, iterations=6,
+                                         fast_rollouts=True, **kwargs)
+                slow = []
+                agent.simulation_policy = slow.append
+                playouts.clear()
+                agent.MCTS.search(GameTreeNode(state=small_state(), action=None, depth=0, parent=None))
+                self.assertEqual(slow, [])
+                self.assertEqual(len(playouts), agent.MCTS.budget.iterations_used * kwargs.get('leaf_rollouts', 1))
+        finally:
+            RolloutEngine.playout = playout
+            os.remove(save_file_path)
+
+    def test_agent(self):
+        handle, save_file_path = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            agent = MCTSUnequalAgent('player1', 'MCTSUnequalAgent', save_file_path, max_time=0.3, fast_rollouts=True)
+            state = ThudGameState(turns_per_game=20)
+            action = agent.act(state, 1, {}, MatchStats(1, 'player1', 'player2'))
+            self.assertTrue(state.is_legal(action))
+            self.assertIsNotNone(agent.rollout_engine)
+        finally:
+            os.remove(save_file_path)
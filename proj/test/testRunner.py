@@ -0,0 +1,23 @@
+from ..agents.MCTSAgent import MCTSRandAgent
+from ..agents.minimaxAgent import MiniMaxABAgent
+from ..prog.params import get_params, string_to_kwargs
+from .fixtures import SearchTestCase
+
+
+class TestRunner(SearchTestCase):
+
+    def test_string_to_kwargs(self):
+        kwargs = string_to_kwargs('workers=4, max_time=2.5, reuse_tree=False, incremental=true, seed=None, '
+                                  'save_file_path=out.txt')
+        self.assertEqual(kwargs, {'workers': 4, 'max_time': 2.5, 'reuse_tree': False, 'incremental': True,
+                                  'seed': None, 'save_file_path': 'out.txt'})
+        self.assertIs(type(kwargs['workers']), int)
+
+    def test_agent_switches(self):
+        """ false on the command line turns an option off """
+        args1, args2 = get_params(f'1: save_file_path={self.save_file_path}, reuse_tree=false, '
+                                  'max_captures_only=False; 2: max_captures_only=FALSE')
+        agent = MCTSRandAgent('player1', 'MCTSRandAgent', **args1)
+        self.assertFalse(agent.reuse_tree)
+        self.assertFalse(agent.max_captures_only)
+        self.assertFalse(MiniMaxABAgent('player2', 'MiniMaxABAgent', **args2).max_captures_only)
@@ -0,0 +1,71 @@
+import time
+
+from ..agents.MCTSAgent import MCTSRandAgent
+from ..agents.helper_files.gameTreeNode import GameTreeNode
+from ..agents.helper_files.searchBudget import SearchBudget
+from ..agents.minimaxAgent import MiniMaxABAgent
+from ..prog.matchStats import MatchStats
+from .fixtures import SearchTestCase
+
+
+class TestSearchBudget(SearchTestCase):
+
+    def test_limits(self):
+        budget = SearchBudget(iterations=3, nodes=10)
+        for _ in range(3):
+            self.assertFalse(budget.exhausted())
+            budget.spend(iterations=1, nodes=2)
+        self.assertTrue(budget.exhausted())
+        budget.start()
+        budget.spend(iterations=1, nodes=10)
+        self.assertTrue(budget.exhausted())
+
+    def test_clock_checks(self):
+        """ the clock is only read every check_every calls """
+        budget = SearchBudget(wall_time=0.01, check_every=4)
+        time.sleep(0.02)
+        self.assertEqual([budget.exhausted() for _ in range(5)], [False, False, False, True, True])
+        self.assertFalse(SearchBudget(cpu_time=10).exhausted())
+
+    def test_default_time(self):
+        self.assertEqual(SearchBudget.from_params().wall_time, 10)
+        self.assertIsNone(SearchBudget.from_params(iterations=100).wall_time)
+        self.assertEqual(SearchBudget.from_params(max_time=2, nodes=100).wall_time, 2)
+
+    def test_repeatable_mcts(self):
+        """ an iteration budget and a seed give the same search every time """
+        visits = []
+        for _ in range(2):
+            agent = MCTSRandAgent('player1', 'MCTSRandAgent', self.save_file_path, iterations=200, seed=1)
+            root = GameTreeNode(state=self.state, action=None, depth=0, parent=None)
+            agent.MCTS.search(root)
+            self.assertEqual(root.n, 200)
+            visits.append([(child.action, child.n, child.stats.total_results) for child in root.children])
+        self.assertEqual(visits[0], visits[1])
+
+    def tree_size(self, node) -> int:
+        return 1 + sum(self.tree_size(child) for child in node.children)
+
+    def test_mcts_nodes(self):
+        """ only nodes added to the tree are counted, not leaves simulated again at max_depth """
+        agent = MCTSRandAgent('player1', 'MCTSRandAgent', self.save_file_path, iterations=100, max_depth=1, seed=1)
+        root = GameTreeNode(state=self.state, action=None, depth=0, parent=None)
+        agent.MCTS.search(root)
+        budget = agent.MCTS.budget
+        self.assertEqual(budget.iterations_used, 100)
+        self.assertEqual(budget.nodes_used, self.state.count_actions())
+        self.assertEqual(len(root.children), self.state.count_actions())
+
+        for batch_size in (1, 4):
+            agent = MCTSRandAgent('player1', 'MCTSRandAgent', self.save_file_path, nodes=30, seed=1,
+                                  batch_size=batch_size)
+            root = GameTreeNode(state=self.state, action=None, depth=0, parent=None)
+            agent.MCTS.search(root)
+            self.assertEqual(agent.MCTS.budget.nodes_used, self.tree_size(root) - 1)
+
+    def test_minimax_nodes(self):
+        agent = MiniMaxABAgent('player1', 'MiniMaxABAgent', max_depth=3, nodes=50)
+        stats = MatchStats(1, 'player1', 'player2')
+        action = agent.act(self.state, 1, {}, stats)
+        self.assertTrue(self.state.is_legal(action))
+        self.assertEqual(stats.total_nodes_searched_player1, 50)
@@ -0,0 +1,59 @@
+import unittest
+
+from ..gameEngine.bitboardGrid import BitboardGrid
+from ..gameEngine.enums import Piece
+from ..gameEngine.state import Action, MoveType, ThudGameState, pack_action
+from ..gameEngine.symmetry import (SYMMETRIES, board_symmetries, canonical_form, canonical_key,
+                                   inverse, transform_action, transform_location, transform_state)
+from ..prog.perft import positions
+
+
+class TestSymmetry(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.state = ThudGameState()
+        self.dimensions = self.state.grid.dimensions
+
+    def test_inverse(self):
+        for symmetry in SYMMETRIES:
+            for loc in [(1, 6), (3, 12), (15, 9)]:
+                image = transform_location(loc, symmetry, self.dimensions)
+                self.assertEqual(transform_location(image, inverse(symmetry), self.dimensions), loc)
+
+    def test_start_board_is_symmetric(self):
+        self.assertEqual(board_symmetries(self.state.grid), SYMMETRIES)
+        for symmetry in SYMMETRIES:
+            self.assertEqual(transform_state(self.state, symmetry).grid, self.state.grid)
+
+    def test_symmetric_positions_share_a_key(self):
+        """ every image of a position has the same canonical form, and actions map between them """
+        state = positions()[1]
+        actions = sorted(state.valid_packed_actions())
+        canonical, to_canonical = canonical_form(state)
+        for symmetry in SYMMETRIES:
+            image = transform_state(state, symmetry)
+            self.assertEqual(canonical_key(image), canonical_key(state))
+            self.assertEqual(canonical_form(image)[0].zobrist_key, canonical.zobrist_key)
+            self.assertEqual(sorted(transform_action(action, symmetry, self.dimensions) for action in actions),
+                             sorted(image.valid_packed_actions()))
+        self.assertEqual(canonical_key(state), canonical.zobrist_key)
+        # an action chosen in the canonical position maps back to an action of the original
+        action = canonical.valid_packed_actions()[0]
+        self.assertIn(transform_action(action, inverse(to_canonical), self.dimensions), actions)
+        self.assertNotEqual(canonical_key(state), canonical_key(positions()[2]))
+
+    def test_transform_action(self):
+        hurl = Action((7, 1), (7, 7), {(7, 7)}, MoveType.DWARF_HURL)
+        image = transform_action(hurl, 4, self.dimensions)
+        self.assertEqual(image, Action((1, 7), (7, 7), {(7, 7)}, MoveType.DWARF_HURL))
+        self.assertEqual(transform_action(pack_action(hurl), 4, self.dimensions), pack_action(image))
+
+    def test_bitboard_and_layouts(self):
+        bitboard_state = ThudGameState(grid_type=BitboardGrid)
+        image = transform_state(bitboard_state, 3)
+        self.assertIsInstance(image.grid, BitboardGrid)
+        self.assertEqual(canonical_key(bitboard_state), canonical_key(self.state))
+        # a rectangular board can't be transposed
+        grid = BitboardGrid()
+        grid.board_from_template([[Piece.EMPTY] * 3, [Piece.DWARF, Piece.EMPTY, Piece.TROLL]])
+        self.assertEqual(board_symmetries(grid), (0, 1, 2, 3))
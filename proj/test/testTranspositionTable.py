@@ -0,0 +1,56 @@
+import math
+import unittest
+
+from ..agents.helper_files.transpositionTable import Bound, ReplacementPolicy, TranspositionTable
+from ..agents.minimaxAgent import MiniMaxSearch
+from ..gameEngine.enums import Piece
+from ..gameEngine.state import ThudGameState
+
+
+class TestTranspositionTable(unittest.TestCase):
+
+    def test_store_and_probe(self):
+        table = TranspositionTable(size=1000)
+        self.assertEqual(table.size, 1024)
+        self.assertIsNone(table.probe(5))
+        table.store(5, 2, 1.5, Bound.LOWER, 'action')
+        entry = table.probe(5)
+        self.assertEqual((entry.depth, entry.value, entry.bound, entry.action),
+                         (2, 1.5, Bound.LOWER, 'action'))
+        self.assertIsNone(table.probe(5 + 1024), 'same slot, different key')
+
+    def test_depth_preferred(self):
+        table = TranspositionTable(size=4)
+        table.store(1, 3, 'deep')
+        table.store(5, 1, 'shallow')
+        self.assertEqual(table.probe(1).value, 'deep', 'deeper entry kept')
+        self.assertEqual(table.probe(5).value, 'shallow', 'shallower entry in always-replace slot')
+        table.store(9, 1, 'newer')
+        self.assertIsNone(table.probe(5))
+        table.store(13, 4, 'deeper')
+        self.assertEqual(table.probe(13).value, 'deeper')
+
+    def test_always_replace(self):
+        table = TranspositionTable(size=4, policy=ReplacementPolicy.ALWAYS_REPLACE)
+        table.store(1, 3, 'deep')
+        table.store(5, 1, 'shallow')
+        self.assertIsNone(table.probe(1))
+        self.assertEqual(len(table), 1)
+
+    def test_minimax_same_value_with_table(self):
+        """ the table must not change the result of a search """
+        def value_fn(state):
+            return state.score(Piece.DWARF) - state.score(Piece.TROLL)
+
+        state = ThudGameState()
+        for action in [state.valid_actions()[0]]:
+            state = state.take_action(action)
+        for optimisation in (['AlphaBeta'], []):
+            plain = MiniMaxSearch(value_fn, state, 2, math.inf, optimisation)
+            with_table = MiniMaxSearch(value_fn, state, 2, math.inf, optimisation + ['TranspositionTable'])
+            plain.nodes_visited = with_table.nodes_visited = 0
+            plain.start = with_table.start = 0
+            plain.timeout = with_table.timeout = False
+            plain.pruned = with_table.pruned = 0
+            self.assertEqual(plain.get_maxi(0, -math.inf, math.inf)[0],
+                             with_table.get_maxi(0, -math.inf, math.inf)[0])